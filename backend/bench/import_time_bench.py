@@ -0,0 +1,101 @@
+"""
+Cold-start budget: how long a fresh interpreter takes to import the app and
+run its startup (schema check, warm-up, job workers). That is the delay a new
+autoscaled worker adds before it can serve.
+
+    cd backend
+    python -m bench.import_time_bench --runs 5 --import-budget 2.0 --startup-budget 1.0
+
+Every run is a new process against a freshly migrated throwaway database.
+Prints the medians and the slowest imports (python -X importtime) and exits
+non-zero when a median is over its budget, so it can gate CI.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+CHILD = """
+import asyncio, json, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+from core.lifecycle import shutdown, startup
+
+async def run():
+    begin = time.perf_counter()
+    await startup()
+    ready = time.perf_counter()
+    await shutdown()
+    return ready - begin
+
+print(json.dumps({"import": imported - start, "startup": asyncio.run(run())}))
+"""
+
+
+def slowest_imports(env, top):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(self_us), int(cumulative_us), name.strip()))
+    first_party = ("main", "core", "routes", "services", "models")
+    own = sum(self_us for self_us, _, name in rows if name.split(".")[0] in first_party)
+    return sorted(rows, reverse=True)[:top], own
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--import-budget", type=float, default=2.0, help="seconds, median")
+    parser.add_argument("--startup-budget", type=float, default=1.0, help="seconds, median")
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="notes-coldstart-")
+    env = {
+        **os.environ,
+        "SQLALCHEMY_DATABASE_URL": f"sqlite:///{workdir}/coldstart.db",
+        "NOTE_EVENTS_BUS_PATH": f"{workdir}/events.db",
+        "RATE_LIMIT_DB_PATH": f"{workdir}/rate-limits.db",
+    }
+    subprocess.run(
+        [sys.executable, "-c", "from core.database_sqlite import engine\n"
+                               "from core.migrate_sqlite import upgrade\n"
+                               "upgrade(engine, log=lambda message: None)"],
+        env=env, check=True,
+    )
+
+    runs = []
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, "-c", CHILD], env=env, capture_output=True, text=True, check=True)
+        runs.append(json.loads(output.stdout.strip().splitlines()[-1]))
+    import_s = statistics.median(run["import"] for run in runs)
+    startup_s = statistics.median(run["startup"] for run in runs)
+
+    slowest, own_us = slowest_imports(env, args.top)
+    print(f"{'module':<48}{'self ms':>10}{'cumul. ms':>12}")
+    for self_us, cumulative_us, name in slowest:
+        print(f"{name:<48}{self_us / 1000:>10.1f}{cumulative_us / 1000:>12.1f}")
+    print(f"\nfirst-party modules (self): {own_us / 1000:.1f} ms")
+    print(f"import  median {import_s * 1000:7.1f} ms  (budget {args.import_budget * 1000:.0f} ms)")
+    print(f"startup median {startup_s * 1000:7.1f} ms  (budget {args.startup_budget * 1000:.0f} ms)")
+
+    over = []
+    if import_s > args.import_budget:
+        over.append("import")
+    if startup_s > args.startup_budget:
+        over.append("startup")
+    if over:
+        print(f"OVER BUDGET: {', '.join(over)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""
+Latency/throughput benchmark for the API.
+
+Seeds a throwaway database with N tenants x M users x K notes, then drives
+the real app either in-process (httpx ASGI transport) or through uvicorn
+with concurrent clients, and reports p50/p95/p99 latency and RPS per
+endpoint. Results are written as JSON; pass --baseline to flag regressions.
+
+    cd backend
+    python -m bench.run_bench --tenants 5 --users 5 --notes 2000 --output bench.json
+    python -m bench.run_bench --mode uvicorn --workers 2 --baseline bench.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import httpx
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    # Nearest-rank
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+def summarize(latencies, errors, elapsed):
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": 1000 * percentile(latencies, 50),
+        "p95_ms": 1000 * percentile(latencies, 95),
+        "p99_ms": 1000 * percentile(latencies, 99),
+        "max_ms": 1000 * max(latencies, default=0.0),
+    }
+
+
+class Bench:
+    def __init__(self, client, args):
+        self.client = client
+        self.args = args
+        self.tokens = {}
+        self.admin_tokens = {}
+        self.created = []
+
+    async def run_phase(self, make_request, count):
+        latencies = []
+        errors = 0
+        queue = asyncio.Queue()
+        for i in range(count):
+            queue.put_nowait(i)
+
+        async def worker():
+            nonlocal errors
+            while True:
+                try:
+                    i = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                start = time.perf_counter()
+                try:
+                    response = await make_request(i)
+                    ok = response.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(self.args.concurrency)))
+        return summarize(latencies, errors, time.perf_counter() - start)
+
+    def user_for(self, i):
+        from core.seed_sqlite import bench_username
+        tenant = i % self.args.tenants
+        user = (i // self.args.tenants) % self.args.users
+        return tenant, bench_username(tenant, user)
+
+    def auth(self, token):
+        return {"Authorization": f"Bearer {token}"}
+
+    async def login(self, i):
+        tenant, username = self.user_for(i)
+        response = await self.client.post("/auth/login", json={"username": username, "password": "bench"})
+        if response.status_code == 200:
+            token = response.json()["access_token"]
+            self.tokens.setdefault(tenant, {})[username] = token
+            if username.endswith("_user0"):
+                self.admin_tokens[tenant] = token
+        return response
+
+    def token(self, i):
+        tenant = i % self.args.tenants
+        tokens = list(self.tokens[tenant].values())
+        return tenant, tokens[i % len(tokens)]
+
+    async def list_notes(self, i):
+        tenant, token = self.token(i)
+        return await self.client.get(
+            "/notes/", params={"tenant_id": f"bench{tenant}", "limit": self.args.page_size},
+            headers=self.auth(token),
+        )
+
+    async def create_note(self, i):
+        tenant, token = self.token(i)
+        response = await self.client.post("/notes/", json={
+            "title": f"bench create {i}",
+            "content": "created by the benchmark " * 8,
+            "tenant_id": f"bench{tenant}",
+            "owner": 1,
+        }, headers=self.auth(token))
+        if response.status_code == 200:
+            self.created.append((tenant, response.json()["id"]))
+        return response
+
+    async def update_note(self, i):
+        tenant, note_id = self.created[i % len(self.created)]
+        token = self.admin_tokens[tenant]
+        return await self.client.put(f"/notes/{note_id}", json={
+            "title": f"bench update {i}",
+            "content": "updated by the benchmark " * 8,
+            "tenant_id": f"bench{tenant}",
+            "owner": 1,
+        }, headers=self.auth(token))
+
+    async def delete_note(self, i):
+        tenant, note_id = self.created[i]
+        return await self.client.delete(f"/notes/{note_id}", headers=self.auth(self.admin_tokens[tenant]))
+
+    async def count_members(self, i):
+        tenant = i % self.args.tenants
+        return await self.client.get("/users/count-members", headers=self.auth(self.admin_tokens[tenant]))
+
+    async def run(self):
+        n = self.args.requests
+        results = {}
+        # Log every seeded user in at least once so the later phases have tokens
+        results["login"] = await self.run_phase(self.login, max(n, self.args.tenants * self.args.users))
+        results["list_notes"] = await self.run_phase(self.list_notes, n)
+        results["create_note"] = await self.run_phase(self.create_note, n)
+        if not self.created:
+            # update_note and delete_note work on the notes created above
+            raise RuntimeError(
+                f"create_note: all {results['create_note']['errors']} requests failed, "
+                "no notes to update or delete (quota or rate limits?)"
+            )
+        random.shuffle(self.created)
+        results["update_note"] = await self.run_phase(self.update_note, n)
+        results["delete_note"] = await self.run_phase(self.delete_note, len(self.created))
+        results["count_members"] = await self.run_phase(self.count_members, n)
+        return results
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for endpoint, current in results.items():
+        previous = baseline.get("results", {}).get(endpoint)
+        if not previous:
+            continue
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            if previous[key] and current[key] > previous[key] * (1 + threshold):
+                regressions.append(f"{endpoint} {key}: {previous[key]:.2f} -> {current[key]:.2f}")
+        if previous["rps"] and current["rps"] < previous["rps"] * (1 - threshold):
+            regressions.append(f"{endpoint} rps: {previous['rps']:.1f} -> {current['rps']:.1f}")
+    return regressions
+
+def print_table(results):
+    print(f"{'endpoint':<15}{'reqs':>7}{'err':>6}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for endpoint, r in results.items():
+        print(f"{endpoint:<15}{r['requests']:>7}{r['errors']:>6}{r['rps']:>10.1f}"
+              f"{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}")
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+async def run_inprocess(args):
+    from main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        return await Bench(client, args).run()
+
+async def run_uvicorn(args):
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        env=os.environ.copy(),
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+            for _ in range(100):
+                try:
+                    if (await client.get("/health")).status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError("uvicorn did not become healthy")
+            return await Bench(client, args).run()
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tenants", type=int, default=3)
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--notes", type=int, default=1000, help="notes per tenant")
+    parser.add_argument("--requests", type=int, default=300, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--db-url", help="database to seed and test (default: fresh temp SQLite file)")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args()
+
+    # Must be set before anything imports core.database_sqlite
+    workdir = tempfile.mkdtemp(prefix="notes-bench-")
+    os.environ["SQLALCHEMY_DATABASE_URL"] = args.db_url or f"sqlite:///{workdir}/bench.db"
+    # The login phase replays the same few users far faster than the login limiter allows
+    os.environ.setdefault("LOGIN_RATE_PER_MINUTE", "0")
+    os.environ.setdefault("LOGIN_IP_RATE_PER_MINUTE", "0")
+    # Likewise the per-tenant API budgets; admission control stays on
+    os.environ.setdefault("TENANT_RATE_LIMITS", "off")
+
+    from core.database_sqlite import engine
+    from core.migrate_sqlite import upgrade
+    from core.seed_sqlite import seed_load
+
+    upgrade(engine, log=lambda message: None)
+    seed_start = time.perf_counter()
+    seed_load(args.tenants, args.users, args.notes)
+    print(f"Seeded {args.tenants}x{args.users}x{args.notes} in {time.perf_counter() - seed_start:.1f}s")
+    engine.dispose()
+
+    runner = run_uvicorn if args.mode == "uvicorn" else run_inprocess
+    results = asyncio.run(runner(args))
+    print_table(results)
+
+    report = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "params": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
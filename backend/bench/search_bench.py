@@ -0,0 +1,124 @@
+"""
+Search latency for a large tenant and a small one sharing the same index.
+
+Fills a throwaway FTS5 table with --notes notes spread over --tenants tenants,
+--big-share of them in one tenant, and times GET /notes/search's query
+(services.search_sqlite.search_notes) for the first and a later page. For
+comparison it times the previous layout too: tenant_id UNINDEXED, filtered
+after MATCH and bm25 had run over every tenant's postings, paged with OFFSET.
+
+    cd backend
+    python -m bench.search_bench --notes 200000 --tenants 50 --budget-ms 50
+
+Exits non-zero when a p95 of the current layout is over --budget-ms.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+WORDS = [f"w{n}" for n in range(5000)]
+LEGACY_DDL = ("CREATE VIRTUAL TABLE legacy_fts USING fts5("
+              "title, content, tenant_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2')")
+LEGACY_SEARCH = (
+    "SELECT rowid, highlight(legacy_fts, 0, '<mark>', '</mark>'), "
+    "snippet(legacy_fts, 1, '<mark>', '</mark>', '…', 16), bm25(legacy_fts, 5.0, 1.0) AS rank "
+    "FROM legacy_fts WHERE legacy_fts MATCH ? AND tenant_id = ? ORDER BY rank LIMIT ? OFFSET ?"
+)
+QUERIES = {"common": "w1", "rare": "w4000", "prefix": "w12"}
+
+
+def fill(path, args):
+    from services.search_sqlite import SQLITE_DDL, tenant_key
+
+    rng = random.Random(7)
+    # Zipf-ish word frequencies, so "common" really is common
+    weights = [1 / (rank + 1) for rank in range(len(WORDS))]
+    conn = sqlite3.connect(path)
+    for ddl in SQLITE_DDL + [LEGACY_DDL]:
+        conn.execute(ddl)
+    big = int(args.notes * args.big_share)
+    rows = []
+    for note_id in range(1, args.notes + 1):
+        tenant = "big" if note_id <= big else f"t{note_id % (args.tenants - 1)}"
+        title = " ".join(rng.choices(WORDS, weights, k=4))
+        content = " ".join(rng.choices(WORDS, weights, k=40))
+        rows.append((note_id, tenant, title, content))
+        if len(rows) == 10000 or note_id == args.notes:
+            conn.executemany("INSERT INTO notes_fts (rowid, tenant_key, title, content) VALUES (?, ?, ?, ?)",
+                             [(n, tenant_key(t), ti, c) for n, t, ti, c in rows])
+            conn.executemany("INSERT INTO legacy_fts (rowid, tenant_id, title, content) VALUES (?, ?, ?, ?)",
+                             [(n, t, ti, c) for n, t, ti, c in rows])
+            rows = []
+    conn.execute("INSERT INTO notes_fts (notes_fts) VALUES ('optimize')")
+    conn.execute("INSERT INTO legacy_fts (legacy_fts) VALUES ('optimize')")
+    conn.commit()
+    conn.close()
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return statistics.median(samples) * 1000, samples[int(len(samples) * 0.95) - 1] * 1000
+
+async def current(path, tenant, q, page, runs):
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from services.search_sqlite import search_notes
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    timings = []
+    async with AsyncSession(engine) as db:
+        for _ in range(runs):
+            start = time.perf_counter()
+            after = None
+            for _ in range(page):
+                results = await search_notes(db, tenant, q, 20, after)
+                if not results:
+                    break
+                after = (results[-1]["rank"], results[-1]["id"])
+            timings.append(time.perf_counter() - start)
+    await engine.dispose()
+    return percentiles(timings)
+
+def legacy(path, tenant, q, page, runs):
+    from services.search_sqlite import fts_query
+
+    conn = sqlite3.connect(path)
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        for n in range(page):
+            conn.execute(LEGACY_SEARCH, (fts_query(q), tenant, 20, 20 * n)).fetchall()
+        timings.append(time.perf_counter() - start)
+    conn.close()
+    return percentiles(timings)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--notes", type=int, default=200000)
+    parser.add_argument("--tenants", type=int, default=50)
+    parser.add_argument("--big-share", type=float, default=0.5, help="share of the notes in the large tenant")
+    parser.add_argument("--pages", type=int, default=5, help="pages walked for the later-page timing")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--budget-ms", type=float, default=50.0, help="p95 budget per search request")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="notes-search-"), "search.db")
+    start = time.perf_counter()
+    fill(path, args)
+    print(f"Indexed {args.notes} notes in {time.perf_counter() - start:.1f}s\n")
+    print(f"{'tenant':<7}{'query':<8}{'page':>5}{'p50 ms':>9}{'p95 ms':>9}{'legacy p50':>12}{'legacy p95':>12}")
+    over = False
+    for tenant in ("big", "t1"):
+        for name, q in QUERIES.items():
+            for page in (1, args.pages):
+                p50, p95 = asyncio.run(current(path, tenant, q, page, args.runs))
+                old50, old95 = legacy(path, tenant, q, page, args.runs)
+                # A later page costs `page` requests; the budget is per request
+                over |= p95 / page > args.budget_ms
+                print(f"{tenant:<7}{name:<8}{page:>5}{p50:>9.1f}{p95:>9.1f}{old50:>12.1f}{old95:>12.1f}")
+    if over:
+        sys.exit(f"p95 over the {args.budget_ms:.0f} ms budget")
@@ -0,0 +1,97 @@
+"""
+Serialization benchmark for a large note list.
+
+Seeds one tenant with N notes in a throwaway database and times three ways of
+turning it into a JSON body, each including the query:
+
+  orm_dicts   ORM instances -> hand-built dicts -> jsonable_encoder -> json
+              (what the list handlers used to do)
+  note_out    ORM instances -> NoteOut models -> Pydantic dump_json
+  row_tuples  column tuples -> dicts -> orjson (the GET /notes/ path)
+
+    cd backend
+    python -m bench.serialization_bench --notes 10000
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+
+
+def note_dict(note):
+    return {
+        "id": note.id,
+        "title": note.title,
+        "body": note.content,
+        "owner": note.owner,
+        "tenant_id": note.tenant_id,
+        "createdAt": note.createdAt,
+        "updatedAt": note.updatedAt,
+        "createdBy": note.owner,
+    }
+
+async def main(args):
+    from typing import List
+    from fastapi.encoders import jsonable_encoder
+    from pydantic import TypeAdapter
+    from sqlalchemy import select
+    from core.database_sqlite import AsyncSessionLocal
+    from core.serialization import dumps
+    from models.note_sqlite import Note
+    from models.schemas_sqlite import NoteOut
+    from routes.notes_sqlite import NOTE_FIELDS
+
+    notes_out = TypeAdapter(List[NoteOut])
+    names = list(NOTE_FIELDS)
+    columns = [NOTE_FIELDS[name] for name in names]
+
+    async def orm_dicts(db):
+        notes = (await db.execute(select(Note).where(Note.tenant_id == "bench0"))).scalars().all()
+        content = jsonable_encoder([note_dict(note) for note in notes])
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+    async def note_out(db):
+        notes = (await db.execute(select(Note).where(Note.tenant_id == "bench0"))).scalars().all()
+        return notes_out.dump_json(notes_out.validate_python(notes))
+
+    async def row_tuples(db):
+        rows = (await db.execute(select(*columns).where(Note.tenant_id == "bench0"))).all()
+        return dumps([dict(zip(names, row)) for row in rows])
+
+    results = {}
+    for name, fn in (("orm_dicts", orm_dicts), ("note_out", note_out), ("row_tuples", row_tuples)):
+        timings = []
+        for _ in range(args.repeat):
+            # Fresh session each time so identity-map reuse doesn't flatter the ORM paths
+            async with AsyncSessionLocal() as db:
+                start = time.perf_counter()
+                body = await fn(db)
+                timings.append(time.perf_counter() - start)
+        results[name] = (statistics.median(timings) * 1000, len(body))
+
+    baseline = results["orm_dicts"][0]
+    print(f"{'path':<12}{'median ms':>12}{'bytes':>12}{'speedup':>10}")
+    for name, (ms, size) in results.items():
+        print(f"{name:<12}{ms:>12.1f}{size:>12}{baseline / ms:>9.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--notes", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    # Must be set before anything imports core.database_sqlite
+    workdir = tempfile.mkdtemp(prefix="notes-bench-")
+    os.environ["SQLALCHEMY_DATABASE_URL"] = f"sqlite:///{workdir}/bench.db"
+
+    from core.database_sqlite import engine
+    from core.migrate_sqlite import upgrade
+    from core.seed_sqlite import seed_load
+
+    upgrade(engine, log=lambda message: None)
+    seed_load(1, 1, args.notes)
+    engine.dispose()
+    asyncio.run(main(args))
@@ -0,0 +1,81 @@
+"""
+Write throughput with and without tenant sharding.
+
+Each of N tenants gets its own concurrent writer committing single-note
+transactions (insert, search index, change log) through tenant_session, the
+way POST /notes/ does. With SHARD_MODE=off every commit queues on the one
+database's write lock; with SHARD_MODE=tenant each tenant has its own.
+
+    cd backend
+    python -m bench.shard_write_bench --tenants 8 --writes 200
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+async def run(args):
+    from core.shards import tenant_session
+    from models.note_sqlite import Note
+    from services.changes_sqlite import record_changes
+    from services.search_sqlite import index_note
+
+    async def writer(tenant_id):
+        for n in range(args.writes):
+            async with tenant_session(tenant_id) as db:
+                note = Note(title=f"Bench note {n}", content=f"Write benchmark note {n} for {tenant_id}", owner=1,
+                            tenant_id=tenant_id)
+                db.add(note)
+                await db.flush()
+                await index_note(db, note.id, tenant_id, note.title, note.content)
+                await record_changes(db, tenant_id, [note.id])
+                await db.commit()
+
+    # Warm up: opens shard files and pools outside the timed part
+    await asyncio.gather(*(writer_once(f"bench{t}") for t in range(args.tenants)))
+    start = time.perf_counter()
+    await asyncio.gather(*(writer(f"bench{t}") for t in range(args.tenants)))
+    elapsed = time.perf_counter() - start
+    print(f"{os.environ['SHARD_MODE']:<8}{args.tenants:>8}{args.tenants * args.writes / elapsed:>14.0f}")
+
+async def writer_once(tenant_id):
+    from core.shards import tenant_session
+    from services.changes_sqlite import next_version
+
+    async with tenant_session(tenant_id) as db:
+        await next_version(db, tenant_id)
+        await db.commit()
+
+def child(args):
+    workdir = tempfile.mkdtemp(prefix="notes-bench-")
+    # Must be set before anything imports core.database_sqlite
+    os.environ["SQLALCHEMY_DATABASE_URL"] = f"sqlite:///{workdir}/catalog.db"
+    os.environ["SHARD_DIR"] = f"{workdir}/shards"
+
+    from core.database_sqlite import engine
+    from core.migrate_sqlite import upgrade
+
+    upgrade(engine, log=lambda message: None)
+    engine.dispose()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tenants", type=int, default=8)
+    parser.add_argument("--writes", type=int, default=200, help="commits per tenant")
+    parser.add_argument("--mode", choices=["off", "tenant"], help="run one mode in this process")
+    args = parser.parse_args()
+
+    if args.mode:
+        os.environ["SHARD_MODE"] = args.mode
+        child(args)
+    else:
+        # SHARD_MODE is read at import time, so each mode runs in its own process
+        print(f"{'mode':<8}{'tenants':>8}{'commits/s':>14}")
+        for mode in ("off", "tenant"):
+            subprocess.run([sys.executable, "-m", "bench.shard_write_bench", "--mode", mode,
+                            "--tenants", str(args.tenants), "--writes", str(args.writes)], check=True)
@@ -0,0 +1,283 @@
+"""
+Per-tenant rate limits and fair-share admission of API requests.
+
+TenantLimitMiddleware reads the caller's tenant, username and plan from the
+access token and
+
+1. takes a token from the user's and then the tenant's bucket, at the rates
+   of the tenant's plan (plans.rate_per_minute and friends), answering 429
+   with Retry-After when either is empty. Requests without a valid token
+   take one from a bucket per client address (ANONYMOUS_RATE_PER_MINUTE)
+   instead;
+2. admits the request through FairAdmission, which caps the requests doing
+   work at once (ADMISSION_MAX_IN_FLIGHT, by default the DB pool's capacity).
+   Under the cap requests go straight through. Above it they wait in one
+   queue per tenant, and a freed slot goes to the tenant with the least
+   weighted service so far (start-time fair queuing, weight
+   plans.fair_share_weight), so a tenant flooding the API only delays itself.
+   A request that waits longer than ADMISSION_QUEUE_TIMEOUT, or finds its
+   tenant's queue full, gets 429. Anonymous requests share one queue, with
+   the smallest weight.
+
+Buckets can be shared by all workers on a host (RATE_LIMIT_BACKEND=sqlite);
+admission is per worker process, as the DB pool it protects is.
+Event streams hand their slot back once the stream starts.
+"""
+import asyncio
+import os
+import time
+from collections import deque, namedtuple
+from sqlalchemy import select
+from core.database_sqlite import DB_MAX_OVERFLOW, DB_POOL_SIZE, AsyncSessionLocal
+from core.metrics import registry
+from core.rate_limit import TENANT_RATE_LIMITS, anonymous_requests, tenant_requests, user_requests
+from core.serialization import FastJSONResponse
+from core.tokens import decode_token, token_stamps
+from models.plan_sqlite import Plan
+from models.tenant_sqlite import Tenant
+
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", str(DB_POOL_SIZE + DB_MAX_OVERFLOW)))
+ADMISSION_MAX_QUEUED_PER_TENANT = int(os.getenv("ADMISSION_MAX_QUEUED_PER_TENANT", "32"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "5"))
+
+RatePolicy = namedtuple("RatePolicy", "rate burst user_rate user_burst weight")
+# Unknown plans: no rate limit, the smallest share
+DEFAULT_POLICY = RatePolicy(rate=0.0, burst=0.0, user_rate=0.0, user_burst=0.0, weight=1)
+# Admission queue of requests without a tenant; no tenant id is None
+ANONYMOUS = None
+
+requests_limited = registry.counter(
+    "http_requests_limited_total", "Requests refused with 429 by tenant limits", ("reason",)
+)
+admission_wait = registry.histogram(
+    "http_admission_wait_seconds", "Time requests queued for admission", (),
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+# Plans are reference data with no write endpoint; read them once per process
+_policies = {}
+
+
+def _per_second(per_minute):
+    return per_minute / 60 if per_minute else 0.0
+
+async def plan_policy(plan_id) -> RatePolicy:
+    if not _policies:
+        async with AsyncSessionLocal() as db:
+            for plan in (await db.execute(select(Plan))).scalars():
+                _policies[plan.id] = RatePolicy(
+                    _per_second(plan.rate_per_minute), plan.rate_burst or 0,
+                    _per_second(plan.user_rate_per_minute), plan.user_rate_burst or 0,
+                    max(1, plan.fair_share_weight or 1),
+                )
+    return _policies.get(plan_id, DEFAULT_POLICY)
+
+async def _current_plan(tenant_id: str):
+    # The token's plan claim is stale (tenant changed plan since it was issued)
+    async with AsyncSessionLocal() as db:
+        return await db.scalar(select(Tenant.plan).where(Tenant.id == tenant_id))
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class FairAdmission:
+    """At most `capacity` admitted requests; waiters are served by weighted fair queuing per tenant.
+
+    Each tenant has a virtual time that advances by 1/weight per admitted
+    waiter; the head of the queue with the lowest virtual time goes next. A
+    tenant that starts queuing begins at the current virtual time, so idle
+    periods don't bank credit. Runs on the event loop only, so no locking.
+    """
+
+    def __init__(self, capacity: int, max_queued: int, timeout: float):
+        self.capacity = capacity
+        self.max_queued = max_queued
+        self.timeout = timeout
+        self.in_flight = 0
+        self.admitted = 0
+        self.queued_total = 0
+        self.rejected = 0
+        self._queues = {}
+        self._vtime = {}
+        self._clock = 0.0
+
+    async def acquire(self, tenant_id: str, weight: int = 1):
+        if self.capacity <= 0:
+            return
+        if self.in_flight < self.capacity and not self._queues:
+            self.in_flight += 1
+            self.admitted += 1
+            return
+        queue = self._queues.get(tenant_id)
+        if queue is not None and len(queue) >= self.max_queued:
+            self.rejected += 1
+            raise AdmissionRejected("queue_full")
+        if queue is None:
+            queue = self._queues[tenant_id] = deque()
+            self._vtime[tenant_id] = max(self._vtime.get(tenant_id, 0.0), self._clock)
+        waiter = asyncio.get_running_loop().create_future()
+        queue.append((waiter, weight))
+        self.queued_total += 1
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, self.timeout)
+        except asyncio.TimeoutError:
+            self._discard(tenant_id, waiter)
+            self.rejected += 1
+            raise AdmissionRejected("queue_timeout")
+        except BaseException:
+            # Cancelled (client went away): give back a slot that was already handed over
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                self._discard(tenant_id, waiter)
+            raise
+        admission_wait.observe(value=time.perf_counter() - start)
+
+    def _discard(self, tenant_id, waiter):
+        queue = self._queues.get(tenant_id)
+        if queue is None:
+            return
+        for entry in queue:
+            if entry[0] is waiter:
+                queue.remove(entry)
+                break
+        if not queue:
+            del self._queues[tenant_id]
+
+    def release(self):
+        if self.capacity <= 0:
+            return
+        self.in_flight -= 1
+        while self.in_flight < self.capacity and self._queues:
+            tenant_id = min(self._queues, key=self._vtime.__getitem__)
+            queue = self._queues[tenant_id]
+            waiter, weight = queue.popleft()
+            if not queue:
+                del self._queues[tenant_id]
+            if waiter.done():
+                continue
+            self._clock = self._vtime[tenant_id]
+            self._vtime[tenant_id] += 1 / weight
+            self.in_flight += 1
+            self.admitted += 1
+            waiter.set_result(None)
+        if len(self._vtime) > 10 * self.capacity + 1000:
+            # Forget tenants that are idle and hold no lead over the clock
+            self._vtime = {
+                tenant_id: vtime for tenant_id, vtime in self._vtime.items()
+                if tenant_id in self._queues or vtime > self._clock
+            }
+
+    def stats(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "in_flight": self.in_flight,
+            "queued": sum(len(queue) for queue in self._queues.values()),
+            "queued_tenants": len(self._queues),
+            "admitted": self.admitted,
+            "queued_total": self.queued_total,
+            "rejected": self.rejected,
+        }
+
+
+admission = FairAdmission(ADMISSION_MAX_IN_FLIGHT, ADMISSION_MAX_QUEUED_PER_TENANT, ADMISSION_QUEUE_TIMEOUT)
+
+
+def _token(scope):
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            return token if scheme.lower() == "bearer" else None
+    # EventSource can't set headers (see get_stream_user)
+    for pair in scope.get("query_string", b"").decode("latin-1").split("&"):
+        if pair.startswith("token="):
+            return pair[6:]
+    return None
+
+def _anonymous_key(scope) -> str:
+    # Only the address: anything from the request itself (?tenant_id=) would buy a fresh bucket
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+def _rejection(reason: str, wait: float, detail: str):
+    requests_limited.inc(reason)
+    return FastJSONResponse({"detail": detail}, status_code=429,
+                            headers={"Retry-After": str(max(1, int(wait + 0.999)))})
+
+
+class TenantLimitMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = _token(scope)
+        claims = decode_token(token) if token else None
+        if not claims or not claims.get("tenant_id"):
+            # No usable token (the auth layer rejects bad ones later): limited by client address
+            tenant_id, policy = ANONYMOUS, DEFAULT_POLICY
+            if TENANT_RATE_LIMITS:
+                wait = anonymous_requests.acquire(_anonymous_key(scope))
+                if wait:
+                    await _rejection("anonymous", wait, "Too many requests")(scope, receive, send)
+                    return
+        else:
+            tenant_id = claims["tenant_id"]
+            plan_id = claims.get("tenant_plan")
+            if plan_id is None or token_stamps.is_stale(claims):
+                plan_id = await _current_plan(tenant_id)
+            policy = await plan_policy(plan_id)
+
+        if TENANT_RATE_LIMITS and tenant_id is not ANONYMOUS:
+            wait = user_requests.acquire(claims["sub"], rate=policy.user_rate, burst=policy.user_burst)
+            if wait:
+                await _rejection("user", wait, "Too many requests for this user")(scope, receive, send)
+                return
+            wait = tenant_requests.acquire(tenant_id, rate=policy.rate, burst=policy.burst)
+            if wait:
+                await _rejection("tenant", wait, "Too many requests for this tenant")(scope, receive, send)
+                return
+
+        try:
+            await admission.acquire(tenant_id, policy.weight)
+        except AdmissionRejected as exc:
+            await _rejection(exc.reason, 1.0, "Server busy, retry shortly")(scope, receive, send)
+            return
+
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                admission.release()
+
+        async def send_releasing(message):
+            if message["type"] == "http.response.start" and any(
+                name == b"content-type" and value.startswith(b"text/event-stream")
+                for name, value in message.get("headers", [])
+            ):
+                # A stream holds no DB connection once it starts
+                release()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_releasing)
+        finally:
+            release()
+
+
+def limit_stats() -> dict:
+    return {
+        "admission": admission.stats(),
+        "tenant_buckets": tenant_requests.stats(),
+        "user_buckets": user_requests.stats(),
+        "anonymous_buckets": anonymous_requests.stats(),
+    }
@@ -0,0 +1,183 @@
+"""
+Negotiated response compression (zstd, br, gzip).
+
+The encoding is picked from Accept-Encoding by q-value, preferring zstd, then
+br, then gzip on ties; zstd and br are offered only if the zstandard/brotli
+packages are installed. Complete bodies under RESPONSE_COMPRESSION_MIN_BYTES
+are sent as they are. Streamed bodies (NDJSON export, sync) are compressed
+chunk by chunk and flushed after each one so they keep streaming.
+
+Event streams, already-encoded responses and compressed media types are
+passed through. A strong ETag becomes weak on a compressed response, since the
+bytes differ from the identity representation; If-None-Match compares weakly.
+"""
+import os
+import zlib
+from core.metrics import registry
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", "4"))
+ZSTD_LEVEL = int(os.getenv("RESPONSE_ZSTD_LEVEL", "3"))
+
+COMPRESSIBLE_TYPES = (
+    b"application/json", b"application/x-ndjson", b"application/javascript", b"application/xml", b"text/",
+)
+UNCOMPRESSED_STATUSES = {204, 206, 304}
+
+compressed_responses = registry.counter(
+    "http_responses_compressed_total", "Responses sent compressed", ("encoding",)
+)
+compression_bytes_in = registry.counter(
+    "http_compression_input_bytes_total", "Response bytes before compression", ("encoding",)
+)
+compression_bytes_out = registry.counter(
+    "http_compression_output_bytes_total", "Response bytes after compression", ("encoding",)
+)
+
+
+class _Gzip:
+    def __init__(self):
+        self._z = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        return self._z.compress(data) + self._z.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class _Brotli:
+    def __init__(self):
+        self._c = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        out = self._c.process(data)
+        return out + (self._c.finish() if final else self._c.flush())
+
+
+class _Zstd:
+    def __init__(self):
+        self._c = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        mode = zstandard.COMPRESSOBJ_FLUSH_FINISH if final else zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        return self._c.compress(data) + self._c.flush(mode)
+
+
+# Server preference, best first
+ENCODERS = {
+    name: encoder
+    for name, encoder, available in (
+        ("zstd", _Zstd, zstandard is not None),
+        ("br", _Brotli, brotli is not None),
+        ("gzip", _Gzip, True),
+    )
+    if available
+}
+
+
+def negotiate(accept_encoding: str):
+    """Best encoding the client accepts, or None for identity."""
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+    wildcard = weights.get("*", 0.0)
+    best, best_q = None, 0.0
+    for name in ENCODERS:
+        q = weights.get(name, wildcard)
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+def _compressible(headers) -> bool:
+    content_type = b""
+    for name, value in headers:
+        if name == b"content-encoding":
+            return False
+        if name == b"content-type":
+            content_type = value.lower()
+    if content_type.startswith(b"text/event-stream"):
+        return False
+    return content_type.startswith(COMPRESSIBLE_TYPES) or b"+json" in content_type
+
+
+class CompressionMiddleware:
+    """Compress eligible responses with the client's preferred encoding."""
+
+    def __init__(self, app, minimum_size: int = RESPONSE_COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = b""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept = value
+        encoding = negotiate(accept.decode("latin-1")) if accept else None
+
+        start = None
+        encoder = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, encoder, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = message.get("headers", [])
+                if message["status"] in UNCOMPRESSED_STATUSES or not _compressible(headers):
+                    passthrough = True
+                    await send(message)
+                    return
+                # Hold the headers until the first chunk shows how large the body is
+                message["headers"] = [*headers, (b"vary", b"Accept-Encoding")]
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+            if start is not None:
+                headers = start["headers"]
+                if encoding is None or (not more and len(body) < self.minimum_size):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                encoder = ENCODERS[encoding]()
+                start["headers"] = [
+                    (name, b"W/" + value if name == b"etag" and not value.startswith(b"W/") else value)
+                    for name, value in headers
+                    if name != b"content-length"
+                ] + [(b"content-encoding", encoding.encode())]
+                await send(start)
+                start = None
+                compressed_responses.inc(encoding)
+
+            data = encoder.compress(body, final=not more)
+            compression_bytes_in.inc(encoding, amount=len(body))
+            compression_bytes_out.inc(encoding, amount=len(data))
+            await send({"type": "http.response.body", "body": data, "more_body": more})
+
+        await self.app(scope, receive, send_compressed)
@@ -1,3 +1,10 @@
+"""
+Process-wide settings.
+
+.env is read here, once per process. Modules read their own settings from the
+environment when imported, so anything that can be imported first (main.py,
+the database and token modules) imports this module before reading them.
+"""
 import os
 from dotenv import load_dotenv
 
@@ -10,4 +17,16 @@ class Settings:
     MONGODB_URL: str = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
     MONGODB_DB: str = os.getenv("MONGODB_DB", "notes_app")
 
+    # Allow multiple frontend URLs from .env or default values for dev
+    CORS_ORIGINS: list = os.getenv("FRONTEND_URL", "http://localhost:5173").split(",")
+    # At startup: strict refuses to serve an unmigrated database, warn only logs it, off skips the check
+    SCHEMA_CHECK: str = os.getenv("SCHEMA_CHECK", "strict").lower()
+    # Pooled connections opened at startup, so the first requests don't pay for them
+    DB_WARM_CONNECTIONS: int = int(os.getenv("DB_WARM_CONNECTIONS", "2"))
+
+    # server.py
+    HOST: str = os.getenv("HOST", "127.0.0.1")
+    PORT: int = int(os.getenv("PORT", "8000"))
+    WEB_CONCURRENCY: int = int(os.getenv("WEB_CONCURRENCY", "1"))
+
 settings = Settings()
@@ -0,0 +1,193 @@
+"""
+Transparent compression of large note bodies.
+
+With NOTE_COMPRESSION=gzip or zstd, note content of NOTE_COMPRESSION_MIN_BYTES
+or more is stored compressed on SQLite. Reads always decode whatever they
+find, so the setting can be switched on, off or between codecs at any time;
+`python -m services.compression_sqlite compress` rewrites existing rows.
+Postgres already compresses large values (TOAST), so it is left alone there.
+
+A compressed value is a BLOB: MAGIC, a codec byte, a 4-byte dictionary id
+(0 for none) and the payload. Uncompressed rows stay plain TEXT.
+
+zstd can use a per-tenant dictionary trained on the tenant's own notes, which
+is what makes mid-sized, similar notes worth compressing. The column type
+doesn't know which tenant a value belongs to, so writes that do go through
+encode_content(); anything else is compressed without a dictionary until its
+next edit or backfill.
+"""
+import asyncio
+import os
+import struct
+import threading
+import time
+import zlib
+from sqlalchemy import Text, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.types import TypeDecorator
+from sqlalchemy.util import await_only
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+NOTE_COMPRESSION = os.getenv("NOTE_COMPRESSION", "off").lower()
+NOTE_COMPRESSION_MIN_BYTES = int(os.getenv("NOTE_COMPRESSION_MIN_BYTES", "1024"))
+NOTE_COMPRESSION_LEVEL = int(os.getenv("NOTE_COMPRESSION_LEVEL", "6"))
+# How often a worker looks for newly trained dictionaries
+COMPRESSION_DICT_TTL = float(os.getenv("COMPRESSION_DICT_TTL", "60"))
+
+MAGIC = b"\x00NC"
+HEADER = struct.Struct(">3scI")
+CODECS = {"gzip": b"g", "zstd": b"z"}
+DICTS_SINCE = text("SELECT id, tenant_id, data FROM compression_dicts WHERE id > :last ORDER BY id")
+
+if NOTE_COMPRESSION not in (*CODECS, "off"):
+    raise RuntimeError(f"NOTE_COMPRESSION must be off, gzip or zstd, not {NOTE_COMPRESSION!r}")
+if NOTE_COMPRESSION == "zstd" and zstandard is None:
+    raise RuntimeError("NOTE_COMPRESSION=zstd needs the zstandard package")
+
+
+class DictionaryRegistry:
+    """Trained zstd dictionaries by id, and the newest one of each tenant.
+
+    Dictionaries are immutable, so only rows newer than the last load are
+    fetched. The app loads them at startup (core.lifecycle) and then every
+    COMPRESSION_DICT_TTL seconds in a background task, so encoding and decoding
+    only read the cache. A value naming an id this worker hasn't seen yet is
+    decoded inside the async session's greenlet, which waits for the fetch
+    without blocking the event loop. Scripts without a loop load synchronously.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._by_id = {}
+        self._current = {}
+        self._expires = 0.0
+        self._refreshing = None
+        self._lock = threading.Lock()
+
+    def _last_id(self) -> dict:
+        return {"last": max(self._by_id, default=0)}
+
+    def _install(self, rows):
+        for dict_id, tenant_id, data in rows:
+            dictionary = zstandard.ZstdCompressionDict(data)
+            dictionary.precompute_compress(level=NOTE_COMPRESSION_LEVEL)
+            self._by_id[dict_id] = dictionary
+            self._current[tenant_id] = dict_id
+        self._expires = time.monotonic() + self.ttl
+
+    def load_sync(self):
+        from core.database_sqlite import engine
+
+        with self._lock:
+            try:
+                with engine.connect() as conn:
+                    rows = conn.execute(DICTS_SINCE, self._last_id()).all()
+            except OperationalError:
+                # Table not migrated yet: no dictionaries
+                rows = []
+            self._install(rows)
+
+    async def refresh(self):
+        from core.database_sqlite import async_engine
+
+        try:
+            async with async_engine.connect() as conn:
+                rows = (await conn.execute(DICTS_SINCE, self._last_id())).all()
+        except OperationalError:
+            rows = []
+        self._install(rows)
+
+    def _refresh_soon(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.load_sync()
+            return
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = loop.create_task(self.refresh())
+
+    def current(self, tenant_id: str) -> int:
+        if time.monotonic() >= self._expires:
+            # Served from the cache meanwhile; a dictionary is used from the next write after it loads
+            self._refresh_soon()
+        return self._current.get(tenant_id, 0)
+
+    def get(self, dict_id: int):
+        if dict_id not in self._by_id:
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                self.load_sync()
+            else:
+                await_only(self.refresh())
+        if dict_id not in self._by_id:
+            raise ValueError(f"Unknown compression dictionary {dict_id}")
+        return self._by_id[dict_id]
+
+    def clear(self):
+        with self._lock:
+            self._by_id.clear()
+            self._current.clear()
+            self._expires = 0.0
+
+
+dictionaries = DictionaryRegistry(COMPRESSION_DICT_TTL)
+
+
+def compress(value: str, dict_id: int = 0):
+    """Stored form of `value`: compressed bytes, or the str itself if that doesn't pay off."""
+    raw = value.encode()
+    if NOTE_COMPRESSION == "off" or len(raw) < NOTE_COMPRESSION_MIN_BYTES:
+        return value
+    if NOTE_COMPRESSION == "zstd":
+        options = {"dict_data": dictionaries.get(dict_id)} if dict_id else {}
+        payload = zstandard.ZstdCompressor(level=NOTE_COMPRESSION_LEVEL, **options).compress(raw)
+    else:
+        payload = zlib.compress(raw, NOTE_COMPRESSION_LEVEL)
+        dict_id = 0
+    if HEADER.size + len(payload) >= len(raw):
+        return value
+    return HEADER.pack(MAGIC, CODECS[NOTE_COMPRESSION], dict_id) + payload
+
+def decompress(value):
+    if not isinstance(value, bytes):
+        return value
+    if not value.startswith(MAGIC):
+        return value.decode()
+    _, codec, dict_id = HEADER.unpack_from(value)
+    payload = value[HEADER.size:]
+    if codec == CODECS["gzip"]:
+        return zlib.decompress(payload).decode()
+    if codec == CODECS["zstd"]:
+        if zstandard is None:
+            raise RuntimeError("Note content is zstd-compressed; install the zstandard package")
+        options = {"dict_data": dictionaries.get(dict_id)} if dict_id else {}
+        return zstandard.ZstdDecompressor(**options).decompress(payload).decode()
+    raise ValueError(f"Unknown note compression codec {codec!r}")
+
+def encode_content(db, tenant_id: str, value: str):
+    """Stored form of a tenant's note body, using the tenant's dictionary if it has one."""
+    if NOTE_COMPRESSION == "off" or db.get_bind().dialect.name != "sqlite":
+        return value
+    dict_id = dictionaries.current(tenant_id) if NOTE_COMPRESSION == "zstd" else 0
+    return compress(value, dict_id)
+
+
+class CompressedText(TypeDecorator):
+    """Text column whose large values are stored compressed on SQLite."""
+
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        # Bytes were already encoded (with a tenant dictionary) by the caller
+        if isinstance(value, str) and dialect.name == "sqlite":
+            return compress(value)
+        return value
+
+    def process_result_value(self, value, dialect):
+        return decompress(value)
@@ -1,32 +1,58 @@
-from fastapi import Depends, HTTPException, status
+from typing import Optional
+from fastapi import Depends, HTTPException, Query, status
+from fastapi.requests import HTTPConnection
 from fastapi.security import OAuth2PasswordBearer
-import jwt
-from sqlalchemy.orm import Session
-from core.database_sqlite import SessionLocal
+import time
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.database_sqlite import get_db
+from core.principal_cache import Principal, principal_cache
+from core.shards import tenant_session
+from core.tokens import decode_token, principal_from_claims, token_stamps
 from models.user_sqlite import User
+from models.tenant_sqlite import Tenant
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
-import os
-from dotenv import load_dotenv
-load_dotenv()
-SECRET_KEY = os.getenv("SECRET_KEY", "supersecretjwtkey")
-ALGORITHM = os.getenv("ALGORITHM", "HS256")
-
-def get_db():
-    db = SessionLocal()
-    try:
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+    return await authenticate(token, db)
+
+async def get_optional_user(token: Optional[str] = Depends(optional_oauth2_scheme), db: AsyncSession = Depends(get_db)):
+    # For routes readable anonymously; a token that is sent must still be valid
+    return await authenticate(token, db) if token else None
+
+async def get_tenant_db(user: Principal = Depends(get_current_user)):
+    # Session on the shard holding the caller's tenant (the main database unless sharded)
+    async with tenant_session(user.tenant_id) as db:
+        yield db
+
+async def get_query_tenant_db(tenant_id: str, user: Optional[Principal] = Depends(get_optional_user)):
+    # Same, for the routes that take the tenant as a query parameter and may be read anonymously
+    # (GET /notes/ without ?ids=). A signed-in caller is routed by its token's tenant, so other
+    # tenants' ids are 404 like unknown ones
+    if user is not None and user.tenant_id != tenant_id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Tenant not found")
+    async with tenant_session(user.tenant_id if user else tenant_id) as db:
         yield db
-    finally:
-        db.close()
 
-def decode_token(token: str):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
-    except jwt.PyJWTError:
-        return None
+async def get_stream_user(
+    connection: HTTPConnection,
+    token: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_db),
+):
+    # EventSource and browser WebSockets can't set headers, so accept ?token= too
+    header = connection.headers.get("authorization", "")
+    if header.lower().startswith("bearer "):
+        token = header[7:]
+    if not token:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+    principal = await authenticate(token, db)
+    # Long-lived streams must not hold a pooled connection
+    await db.close()
+    return principal
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def authenticate(token: str, db: AsyncSession):
     payload = decode_token(token)
     if not payload:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
@@ -35,8 +61,32 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     if not username:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token payload")
 
-    user = db.query(User).filter_by(username=username).first()
-    if not user:
+    # Fast path: the signed claims are authoritative unless this user or tenant
+    # changed after the token was issued, on this worker or another
+    await token_stamps.sync(db)
+    principal = principal_from_claims(payload)
+    if principal and not token_stamps.is_stale(payload):
+        return principal
+
+    cache_key = (token.rsplit(".", 1)[-1], username)
+    principal = principal_cache.get(cache_key)
+    if principal:
+        return principal
+
+    result = await db.execute(
+        select(User, Tenant)
+        .outerjoin(Tenant, Tenant.id == User.tenant_id)
+        .where(User.username == username)
+    )
+    row = result.first()
+    if not row:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
-    return user
+    if payload.get("ver", 0) < row[0].token_version:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token revoked")
+
+    principal = Principal.from_rows(*row)
+    # Never keep a principal around longer than its token is valid
+    max_age = payload["exp"] - time.time() if "exp" in payload else None
+    principal_cache.put(cache_key, principal, max_age)
+    return principal
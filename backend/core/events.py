@@ -0,0 +1,242 @@
+"""
+In-process pub/sub for note change notifications, partitioned per tenant.
+
+Events are small hints ({"id", "deleted", "version"}); clients fetch the
+actual notes through /notes/changes. Events of type "version" only carry a
+tenant's new version for listeners (the response cache) and are not streamed. Each subscriber has a bounded pending
+set keyed by note id, so rapid edits to one note coalesce into a single
+event, and a subscriber that falls more than NOTE_EVENTS_MAX_PENDING notes
+behind has its backlog dropped and gets one "resync" event instead.
+
+NOTE_EVENTS_BACKEND picks how events reach the hub:
+  local  - delivered in-process (single worker)
+  sqlite - appended to a shared SQLite file (NOTE_EVENTS_BUS_PATH) and polled
+           by every worker, so several uvicorn workers see each other's events
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+logger = logging.getLogger(__name__)
+
+NOTE_EVENTS_BACKEND = os.getenv("NOTE_EVENTS_BACKEND", "local")
+NOTE_EVENTS_MAX_PENDING = int(os.getenv("NOTE_EVENTS_MAX_PENDING", "256"))
+NOTE_EVENTS_BUS_PATH = os.getenv("NOTE_EVENTS_BUS_PATH", os.path.join(tempfile.gettempdir(), "notes-events.db"))
+NOTE_EVENTS_POLL_INTERVAL = float(os.getenv("NOTE_EVENTS_POLL_INTERVAL", "0.2"))
+# Bus rows older than this are deleted; they only need to outlive one poll
+NOTE_EVENTS_BUS_RETENTION = float(os.getenv("NOTE_EVENTS_BUS_RETENTION", "60"))
+
+RESYNC = {"type": "resync"}
+
+
+class Subscription:
+    def __init__(self, tenant_id: str, max_pending: int):
+        self.tenant_id = tenant_id
+        self.max_pending = max_pending
+        self._pending = OrderedDict()
+        self._overflowed = False
+        self._ready = asyncio.Event()
+
+    def push(self, event) -> str:
+        """Queue an event; returns "queued", "coalesced" or "dropped"."""
+        outcome = "queued"
+        if self._overflowed:
+            outcome = "dropped"
+        elif event["id"] in self._pending:
+            self._pending[event["id"]] = event
+            self._pending.move_to_end(event["id"])
+            outcome = "coalesced"
+        elif len(self._pending) >= self.max_pending:
+            # Slow consumer: forget the backlog, it will resync from /notes/changes
+            self._pending.clear()
+            self._overflowed = True
+            outcome = "dropped"
+        else:
+            self._pending[event["id"]] = event
+        self._ready.set()
+        return outcome
+
+    async def get(self, timeout: float = None) -> list:
+        """Wait for events; [] on timeout, [RESYNC] after an overflow."""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        self._ready.clear()
+        if self._overflowed:
+            self._overflowed = False
+            return [RESYNC]
+        events = list(self._pending.values())
+        self._pending.clear()
+        return events
+
+
+class NoteEventHub:
+    def __init__(self, backend=None, max_pending: int = NOTE_EVENTS_MAX_PENDING):
+        self.max_pending = max_pending
+        self.backend = backend or LocalBackend()
+        self._tenants = defaultdict(set)
+        self._listeners = []
+        self.published = 0
+        self.delivered = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+    def add_listener(self, listener):
+        """Call `listener(tenant_id, events)` for every tenant's events, local or remote."""
+        self._listeners.append(listener)
+
+    def _notify(self, tenant_id: str, events):
+        for listener in self._listeners:
+            try:
+                listener(tenant_id, events)
+            except Exception:
+                logger.exception("Note event listener failed")
+
+    def start(self):
+        """Begin receiving other workers' events (needs a running loop)."""
+        self.backend.start(self)
+
+    def subscribe(self, tenant_id: str) -> Subscription:
+        self.start()
+        subscription = Subscription(tenant_id, self.max_pending)
+        self._tenants[tenant_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._tenants.get(subscription.tenant_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._tenants[subscription.tenant_id]
+
+    async def publish(self, tenant_id: str, events):
+        """Announce committed note changes; call only after the transaction commits."""
+        events = list(events)
+        if events:
+            self.published += len(events)
+            # Listeners see our own commits at once, not after a bus round-trip
+            self._notify(tenant_id, events)
+            await self.backend.publish(self, tenant_id, events)
+
+    def deliver(self, tenant_id: str, events):
+        self._notify(tenant_id, events)
+        events = [event for event in events if event.get("type") != "version"]
+        for subscription in list(self._tenants.get(tenant_id, ())):
+            for event in events:
+                outcome = subscription.push(event)
+                if outcome == "queued":
+                    self.delivered += 1
+                elif outcome == "coalesced":
+                    self.coalesced += 1
+                else:
+                    self.dropped += 1
+
+    async def close(self):
+        await self.backend.stop()
+
+    def stats(self):
+        return {
+            "backend": type(self.backend).__name__,
+            "tenants": len(self._tenants),
+            "subscribers": sum(len(subscribers) for subscribers in self._tenants.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+        }
+
+
+class LocalBackend:
+    def start(self, hub):
+        pass
+
+    async def publish(self, hub, tenant_id, events):
+        hub.deliver(tenant_id, events)
+
+    async def stop(self):
+        pass
+
+
+class SqliteBusBackend:
+    """Stand-in broker: workers append to one SQLite file and poll it for new rows."""
+
+    def __init__(self, path: str, poll_interval: float = NOTE_EVENTS_POLL_INTERVAL,
+                 retention: float = NOTE_EVENTS_BUS_RETENTION):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._task = None
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _execute(self, sql, params=()):
+        # Opened lazily so a pre-forked parent never shares its connection
+        with self._lock:
+            if self._conn is None:
+                self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS note_events ("
+                    "id INTEGER PRIMARY KEY AUTOINCREMENT, tenant_id TEXT NOT NULL, "
+                    "payload TEXT NOT NULL, created REAL NOT NULL)"
+                )
+            return self._conn.execute(sql, params).fetchall()
+
+    def _append(self, tenant_id, events):
+        self._execute(
+            "INSERT INTO note_events (tenant_id, payload, created) VALUES (?, ?, ?)",
+            (tenant_id, json.dumps(events), time.time()),
+        )
+
+    def _read(self, after_id):
+        return self._execute("SELECT id, tenant_id, payload FROM note_events WHERE id > ? ORDER BY id", (after_id,))
+
+    def _trim(self):
+        self._execute("DELETE FROM note_events WHERE created < ?", (time.time() - self.retention,))
+
+    def start(self, hub):
+        if self._task is None or self._task.get_loop() is not asyncio.get_running_loop():
+            # Only events published from now on; read synchronously so our own next publish isn't skipped
+            last_id = self._execute("SELECT coalesce(max(id), 0) FROM note_events")[0][0]
+            self._task = asyncio.get_running_loop().create_task(self._poll(hub, last_id))
+
+    async def publish(self, hub, tenant_id, events):
+        self.start(hub)
+        await asyncio.to_thread(self._append, tenant_id, events)
+
+    async def _poll(self, hub, last_id):
+        last_trim = time.monotonic()
+        while True:
+            try:
+                for row_id, tenant_id, payload in await asyncio.to_thread(self._read, last_id):
+                    last_id = row_id
+                    hub.deliver(tenant_id, json.loads(payload))
+                if time.monotonic() - last_trim > self.retention:
+                    await asyncio.to_thread(self._trim)
+                    last_trim = time.monotonic()
+            except sqlite3.Error:
+                logger.exception("Note event bus poll failed")
+            await asyncio.sleep(self.poll_interval)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+def _make_backend():
+    if NOTE_EVENTS_BACKEND == "sqlite":
+        return SqliteBusBackend(NOTE_EVENTS_BUS_PATH)
+    if NOTE_EVENTS_BACKEND != "local":
+        raise RuntimeError(f"Unknown NOTE_EVENTS_BACKEND {NOTE_EVENTS_BACKEND!r}")
+    return LocalBackend()
+
+
+note_events = NoteEventHub(_make_backend())
@@ -1,7 +1,5 @@
-from core.database_sqlite import engine, Base
-from models.user_sqlite import User
-from models.note_sqlite import Note
-from models.tenant_sqlite import Tenant
+from core.database_sqlite import engine
+from core.migrate_sqlite import upgrade
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+# Create or upgrade tables, indexes and reference data
+upgrade(engine)
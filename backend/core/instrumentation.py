@@ -0,0 +1,202 @@
+import contextvars
+import logging
+import os
+import time
+from collections import Counter as TallyCounter
+from sqlalchemy import event
+from core.database_sqlite import database_stats
+from core.events import note_events
+from core.metrics import registry
+from core.passwords import pool_stats as password_pool_stats
+from core.principal_cache import principal_cache
+from core.rate_limit import login_by_ip, login_by_username
+from core.response_cache import response_cache
+
+logger = logging.getLogger(__name__)
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+# The same statement this many times in one request is reported as a likely N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+
+http_requests = registry.counter(
+    "http_requests_total", "HTTP requests by route and status", ("method", "route", "status")
+)
+http_latency = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route")
+)
+http_in_flight = registry.gauge(
+    "http_requests_in_progress", "HTTP requests currently being served", ("method",)
+)
+sql_queries = registry.counter(
+    "sql_queries_total", "SQL statements executed while serving a route", ("route",)
+)
+sql_seconds = registry.counter(
+    "sql_duration_seconds_total", "Time spent in SQL while serving a route", ("route",)
+)
+sql_per_request = registry.histogram(
+    "sql_queries_per_request", "SQL statements per request", ("route",),
+    buckets=(1, 2, 3, 5, 10, 20, 50, 100),
+)
+n_plus_one = registry.counter(
+    "sql_n_plus_one_suspected_total", "Requests that repeated one statement N_PLUS_ONE_THRESHOLD+ times", ("route",)
+)
+
+
+class RequestStats:
+    __slots__ = ("queries", "sql_seconds")
+
+    def __init__(self):
+        self.queries = []
+        self.sql_seconds = 0.0
+
+
+_request_stats = contextvars.ContextVar("request_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.queries.append((statement, elapsed))
+        stats.sql_seconds += elapsed
+
+def instrument_engine(sync_engine):
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+POOL_GAUGES = {
+    "checked_out": "Connections currently checked out",
+    "idle": "Idle connections in the pool",
+    "overflow": "Connections opened beyond pool_size",
+    "saturation": "Checked-out share of pool_size + max_overflow",
+}
+
+def collect_runtime_metrics():
+    pools = database_stats()
+    for key, help_text in POOL_GAUGES.items():
+        values = {(name,): stats[key] for name, stats in pools.items() if key in stats}
+        yield f"db_pool_{key}", "gauge", help_text, values, ("engine",)
+    yield "db_pool_checkouts_total", "counter", "Connection pool checkouts", {
+        (name,): stats.get("checkouts", 0) for name, stats in pools.items()
+    }, ("engine",)
+    yield "db_pool_checkout_timeouts_total", "counter", "Connection pool checkout timeouts", {
+        (name,): stats.get("checkout_timeouts", 0) for name, stats in pools.items()
+    }, ("engine",)
+    yield "db_pool_checkout_wait_max_seconds", "gauge", "Longest connection pool checkout wait", {
+        (name,): stats.get("checkout_wait_max_ms", 0.0) / 1000 for name, stats in pools.items()
+    }, ("engine",)
+
+    cache = principal_cache.stats()
+    for key in ("hits", "misses", "evictions", "invalidations"):
+        yield f"principal_cache_{key}_total", "counter", f"Principal cache {key}", {(): cache[key]}, ()
+    yield "principal_cache_size", "gauge", "Principals currently cached", {(): cache["size"]}, ()
+
+    responses = response_cache.stats()
+    for key in ("hits", "misses", "not_modified", "evictions", "invalidations"):
+        yield f"response_cache_{key}_total", "counter", f"Response cache {key}", {(): responses[key]}, ()
+    yield "response_cache_entries", "gauge", "Responses currently cached", {(): responses["entries"]}, ()
+    yield "response_cache_bytes", "gauge", "Bytes of cached response bodies", {(): responses["bytes"]}, ()
+
+    events = note_events.stats()
+    yield "note_stream_subscribers", "gauge", "Open note event streams", {(): events["subscribers"]}, ()
+    for key in ("published", "delivered", "coalesced", "dropped"):
+        yield f"note_events_{key}_total", "counter", f"Note change events {key}", {(): events[key]}, ()
+
+    yield "password_hash_pending", "gauge", "Password hash/verify calls queued or running", {
+        (): password_pool_stats()["pending"]
+    }, ()
+    yield "login_rate_limited_total", "counter", "Login attempts rejected by the rate limiter", {
+        ("ip",): login_by_ip.rejected, ("username",): login_by_username.rejected,
+    }, ("key",)
+
+registry.add_collector(collect_runtime_metrics)
+
+
+def _route_of(scope):
+    # Route template (e.g. /notes/{note_id}) so label cardinality stays bounded
+    route = scope.get("route")
+    if route is None:
+        return "unmatched"
+    template = getattr(route, "path_format", None)
+    if template is None:
+        return scope["path"]
+    # Newer FastAPI keeps included routes without the router prefix; the prefixes here
+    # are literal, so they are the leading segments of the path the template lacks
+    segments = scope["path"].split("/")
+    missing = len(segments) - len(template.split("/"))
+    if missing > 0:
+        template = "/".join(segments[:missing + 1]) + template
+    return template
+
+def _report(method, path, route, elapsed, stats):
+    tally = TallyCounter(statement for statement, _ in stats.queries)
+    repeated = [(statement, count) for statement, count in tally.items() if count >= N_PLUS_ONE_THRESHOLD]
+    if repeated:
+        n_plus_one.inc(route)
+        for statement, count in repeated:
+            logger.warning("Possible N+1 on %s %s: %dx %s", method, route, count, " ".join(statement.split())[:200])
+    if elapsed * 1000 >= SLOW_REQUEST_MS:
+        queries = "\n".join(
+            f"  {1000 * seconds:8.2f} ms  {' '.join(statement.split())[:200]}"
+            for statement, seconds in stats.queries
+        )
+        logger.warning(
+            "Slow request %s %s took %.1f ms (%d queries, %.1f ms SQL)\n%s",
+            method, path, 1000 * elapsed, len(stats.queries), 1000 * stats.sql_seconds, queries,
+        )
+
+
+class RequestMetricsMiddleware:
+    """Per-route latency/status metrics, SQL accounting and a Server-Timing header."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        start = time.perf_counter()
+        status_code = 500
+        event_stream = False
+
+        async def send_with_timing(message):
+            nonlocal status_code, event_stream
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                event_stream = any(
+                    name == b"content-type" and value.startswith(b"text/event-stream")
+                    for name, value in message.get("headers", [])
+                )
+                total_ms = 1000 * (time.perf_counter() - start)
+                timing = (
+                    f'app;dur={total_ms:.1f}, '
+                    f'db;dur={1000 * stats.sql_seconds:.1f};desc="{len(stats.queries)} queries"'
+                )
+                message["headers"] = [*message.get("headers", []), (b"server-timing", timing.encode())]
+            await send(message)
+
+        http_in_flight.inc(method)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            http_in_flight.dec(method)
+            _request_stats.reset(token)
+            elapsed = time.perf_counter() - start
+            route = _route_of(scope)
+            http_requests.inc(method, route, str(status_code))
+            sql_queries.inc(route, amount=len(stats.queries))
+            sql_seconds.inc(route, amount=stats.sql_seconds)
+            sql_per_request.observe(route, value=len(stats.queries))
+            # An SSE stream lasts as long as the client stays connected; not a latency
+            if not event_stream:
+                http_latency.observe(method, route, value=elapsed)
+                _report(method, scope["path"], route, elapsed, stats)
@@ -0,0 +1,346 @@
+"""
+Durable background jobs.
+
+Jobs are rows of the catalog's `jobs` table, so they survive restarts and
+every process sharing the database can run them. enqueue() adds one inside
+the caller's transaction: the job exists exactly when the request's own
+writes committed. The worker pool, started from the app's lifespan, claims due
+jobs lane first, runs the handler registered for the job's kind and records
+the outcome.
+
+- Lanes: high, default and low. With two or more workers the first one only
+  serves the high lane, so a backlog of slow low-lane work can't delay it.
+- Retries: a failed attempt is re-queued after JOB_RETRY_BASE * 2^(attempt-1)
+  seconds (jittered, at most JOB_RETRY_MAX) until max_attempts; raise JobFailed
+  to give up at once.
+- Leases: a claimed job is leased for JOB_TIMEOUT plus a margin. If its worker
+  dies the job is re-queued once the lease expires, so handlers must be safe
+  to run twice.
+- Idempotency keys: enqueueing a key that is already known returns the
+  existing job. Keys are remembered as long as finished jobs are kept
+  (JOB_RETENTION_HOURS).
+
+Idle workers poll with plain reads; a commit that enqueued a job wakes the
+local pool right away.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import delete, event, func, select, update
+from sqlalchemy.dialects import sqlite
+from core.database_sqlite import AsyncSessionLocal
+from core.metrics import registry
+from models.job_sqlite import Job
+
+logger = logging.getLogger(__name__)
+
+# Workers per process; 0 leaves jobs to other processes
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+JOB_TIMEOUT = float(os.getenv("JOB_TIMEOUT", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_BASE = float(os.getenv("JOB_RETRY_BASE", "2"))
+JOB_RETRY_MAX = float(os.getenv("JOB_RETRY_MAX", "600"))
+JOB_RETENTION_HOURS = float(os.getenv("JOB_RETENTION_HOURS", "168"))
+# How long stop() lets running jobs finish before cancelling them
+JOB_SHUTDOWN_GRACE = float(os.getenv("JOB_SHUTDOWN_GRACE", "10"))
+# Expired leases and old finished jobs are swept this often
+JOB_MAINTENANCE_INTERVAL = 30.0
+LEASE_MARGIN = 30.0
+
+LANES = {"high": 0, "default": 1, "low": 2}
+LANE_NAMES = {rank: name for name, rank in LANES.items()}
+LATENCY_SAMPLE = 1000
+
+job_attempts = registry.counter("jobs_attempts_total", "Job attempts by outcome", ("kind", "outcome"))
+job_wait = registry.histogram(
+    "job_wait_seconds", "Time from a job being due to being claimed", ("lane",),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+job_duration = registry.histogram("job_duration_seconds", "Job handler run time", ("kind",))
+
+
+class JobFailed(Exception):
+    """Raised by a handler to fail its job without further retries."""
+
+
+_handlers = {}
+
+def handler(kind: str):
+    """Register the coroutine function that runs jobs of `kind`; it gets the payload dict."""
+    def register(func):
+        _handlers[kind] = func
+        return func
+    return register
+
+def _insert(db):
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects import postgresql
+
+        return postgresql.insert
+    return sqlite.insert
+
+async def enqueue(db, kind: str, payload: dict = None, lane: str = "default", tenant_id: str = None,
+                  key: str = None, delay: float = 0.0, max_attempts: int = JOB_MAX_ATTEMPTS) -> int:
+    """Add a job in db's transaction and return its id (the existing job's for a known key)."""
+    if kind not in _handlers:
+        raise ValueError(f"No handler registered for job kind {kind!r}")
+    now = datetime.utcnow()
+    stmt = _insert(db)(Job).values(
+        kind=kind,
+        payload=json.dumps(payload or {}),
+        priority=LANES[lane],
+        tenant_id=tenant_id,
+        status="queued",
+        attempts=0,
+        max_attempts=max_attempts,
+        idempotency_key=key,
+        runAt=now + timedelta(seconds=delay),
+        createdAt=now,
+    )
+    if key is not None:
+        stmt = stmt.on_conflict_do_nothing(index_elements=["idempotency_key"])
+    job_id = (await db.execute(stmt.returning(Job.id))).scalar()
+    if job_id is None:
+        job_id = await db.scalar(select(Job.id).where(Job.idempotency_key == key))
+    else:
+        event.listen(db.sync_session, "after_commit", lambda session: job_pool.wake(), once=True)
+    return job_id
+
+def _retry_delay(attempt: int) -> float:
+    return min(JOB_RETRY_MAX, JOB_RETRY_BASE * 2 ** (attempt - 1)) * random.uniform(0.8, 1.2)
+
+
+class JobWorkerPool:
+    def __init__(self, workers: int = JOB_WORKERS, poll_interval: float = JOB_POLL_INTERVAL):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.busy = 0
+        self.processed = 0
+        self._loop = None
+        self._wakeup = None
+        self._tasks = []
+        self._stopping = False
+
+    def start(self):
+        if self._tasks or self.workers <= 0:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        for index in range(self.workers):
+            lanes = [LANES["high"]] if index == 0 and self.workers > 1 else None
+            self._tasks.append(self._loop.create_task(self._work(lanes)))
+        self._tasks.append(self._loop.create_task(self._maintain()))
+
+    def wake(self):
+        # Called after commits, possibly from a thread without this loop
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def stop(self):
+        if not self._tasks:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        # Workers exit after their current job; whatever is cancelled goes back to the queue
+        await asyncio.wait(self._tasks[:-1], timeout=JOB_SHUTDOWN_GRACE)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._loop = None
+
+    async def _work(self, lanes):
+        while not self._stopping:
+            try:
+                job = await self._claim(lanes)
+            except Exception:
+                logger.exception("Claiming a job failed")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+            self.busy += 1
+            try:
+                await self._run(job)
+            finally:
+                self.busy -= 1
+
+    async def _claim(self, lanes):
+        async with AsyncSessionLocal() as db:
+            while True:
+                now = datetime.utcnow()
+                # A plain read first, so idle polling never takes the write lock
+                candidate = (
+                    select(Job.id, Job.runAt)
+                    .where(Job.status == "queued", Job.runAt <= now)
+                    .order_by(Job.priority, Job.runAt, Job.id)
+                    .limit(1)
+                )
+                if lanes is not None:
+                    candidate = candidate.where(Job.priority.in_(lanes))
+                found = (await db.execute(candidate)).first()
+                if found is None:
+                    return None
+                stmt = (
+                    update(Job)
+                    .where(Job.id == found.id, Job.status == "queued")
+                    .values(
+                        status="running",
+                        attempts=Job.attempts + 1,
+                        startedAt=now,
+                        lockedUntil=now + timedelta(seconds=JOB_TIMEOUT + LEASE_MARGIN),
+                    )
+                    .returning(Job.id, Job.kind, Job.payload, Job.priority, Job.attempts, Job.max_attempts)
+                    .execution_options(synchronize_session=False)
+                )
+                job = (await db.execute(stmt)).first()
+                await db.commit()
+                if job is not None:
+                    job_wait.observe(LANE_NAMES.get(job.priority, str(job.priority)),
+                                     value=max((now - found.runAt).total_seconds(), 0.0))
+                    return job
+                # Another worker got it first
+
+    async def _finish(self, job, **values):
+        # Only if this worker still holds the job (its lease may have expired and been re-claimed)
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(Job)
+                .where(Job.id == job.id, Job.status == "running", Job.attempts == job.attempts)
+                .values(lockedUntil=None, **values)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+
+    async def _run(self, job):
+        func = _handlers.get(job.kind)
+        start = time.perf_counter()
+        try:
+            if func is None:
+                raise JobFailed(f"No handler registered for job kind {job.kind!r}")
+            await asyncio.wait_for(func(json.loads(job.payload)), JOB_TIMEOUT)
+        except asyncio.CancelledError:
+            # Shutdown: hand the attempt back untouched
+            await self._finish(job, status="queued", attempts=job.attempts - 1, runAt=datetime.utcnow())
+            raise
+        except Exception as exc:
+            error = f"{type(exc).__name__}: {exc}"
+            if isinstance(exc, JobFailed) or job.attempts >= job.max_attempts:
+                outcome = "failed"
+                await self._finish(job, status="failed", last_error=error, finishedAt=datetime.utcnow())
+            else:
+                outcome = "retried"
+                retry_at = datetime.utcnow() + timedelta(seconds=_retry_delay(job.attempts))
+                await self._finish(job, status="queued", last_error=error, runAt=retry_at)
+            logger.warning("Job %s (%s) attempt %s %s: %s", job.id, job.kind, job.attempts, outcome, error)
+        else:
+            outcome = "done"
+            await self._finish(job, status="done", finishedAt=datetime.utcnow())
+        self.processed += 1
+        job_attempts.inc(job.kind, outcome)
+        job_duration.observe(job.kind, value=time.perf_counter() - start)
+
+    async def _maintain(self):
+        while True:
+            try:
+                await requeue_expired()
+                await prune_jobs()
+            except Exception:
+                logger.exception("Job queue maintenance failed")
+            await asyncio.sleep(JOB_MAINTENANCE_INTERVAL)
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self._tasks) - 1 if self._tasks else 0,
+            "busy": self.busy,
+            "processed": self.processed,
+            "handlers": sorted(_handlers),
+        }
+
+
+job_pool = JobWorkerPool()
+
+
+async def requeue_expired() -> int:
+    """Put jobs whose worker vanished (lease expired) back in the queue."""
+    now = datetime.utcnow()
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            update(Job)
+            .where(Job.status == "running", Job.lockedUntil < now)
+            .values(status="queued", runAt=now, lockedUntil=None, last_error="Lease expired")
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+    return result.rowcount
+
+async def prune_jobs(now: datetime = None) -> int:
+    """Delete finished jobs past retention, which also frees their idempotency keys."""
+    cutoff = (now or datetime.utcnow()) - timedelta(hours=JOB_RETENTION_HOURS)
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            delete(Job).where(Job.status.in_(("done", "failed")), Job.finishedAt < cutoff)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+    return result.rowcount
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(fraction * len(values)))], 3)
+
+async def queue_stats(db) -> dict:
+    """Depth per lane and status, oldest due job, and latency of recently finished jobs."""
+    now = datetime.utcnow()
+    lanes = {
+        name: {"queued": 0, "due": 0, "running": 0, "failed": 0, "done": 0, "oldest_due_seconds": 0.0}
+        for name in LANES
+    }
+    depth = await db.execute(
+        select(Job.priority, Job.status, func.count()).group_by(Job.priority, Job.status)
+    )
+    for priority, status, count in depth:
+        lanes[LANE_NAMES[priority]][status] = count
+    due = await db.execute(
+        select(Job.priority, func.count(), func.min(Job.runAt))
+        .where(Job.status == "queued", Job.runAt <= now)
+        .group_by(Job.priority)
+    )
+    for priority, count, oldest in due:
+        lane = lanes[LANE_NAMES[priority]]
+        lane["due"] = count
+        lane["oldest_due_seconds"] = round((now - oldest).total_seconds(), 3)
+
+    # Newest finished jobs: queue latency (enqueued to last start) and run time
+    recent = await db.execute(
+        select(Job.priority, Job.createdAt, Job.startedAt, Job.finishedAt)
+        .where(Job.status == "done")
+        .order_by(Job.id.desc())
+        .limit(LATENCY_SAMPLE)
+    )
+    waits = {name: [] for name in LANES}
+    runs = {name: [] for name in LANES}
+    for priority, created, started, finished in recent:
+        waits[LANE_NAMES[priority]].append((started - created).total_seconds())
+        runs[LANE_NAMES[priority]].append((finished - started).total_seconds())
+    for name, lane in lanes.items():
+        lane["latency_seconds"] = {
+            "sample": len(waits[name]),
+            "wait_p50": _percentile(waits[name], 0.5),
+            "wait_p95": _percentile(waits[name], 0.95),
+            "run_p50": _percentile(runs[name], 0.5),
+            "run_p95": _percentile(runs[name], 0.95),
+        }
+    return {"pool": job_pool.stats(), "lanes": lanes}
@@ -0,0 +1,89 @@
+"""
+Process lifecycle: startup and shutdown of the app, and the reset after a fork.
+
+Importing the app opens nothing: engines, pools and caches connect lazily. So
+a pre-fork server (gunicorn --preload) can import it once in the master and
+fork workers that share no sockets or file handles. Each worker then runs
+startup() from the lifespan:
+
+1. check the schema (SCHEMA_CHECK): refuse to serve a database with
+   migrations still pending;
+2. warm up: open a few pooled connections and load the reference data caches
+   (plans, shard placements, compression dictionaries);
+3. start the background job workers.
+
+shutdown() stops the workers, closes the event bus and disposes every engine.
+after_fork() runs in every forked child. It drops pooled connections inherited
+from the parent without closing them, as the parent may still use them.
+"""
+import asyncio
+import logging
+import os
+import time
+from sqlalchemy import text
+from core import content_codec
+from core.admission import plan_policy as rate_policy
+from core.config import settings
+from core.database_sqlite import AsyncSessionLocal, async_engine, engine
+from core.events import note_events
+from core.jobs import job_pool
+from core.migrate_sqlite import current_revision, pending_migrations
+from core.shards import shard_engines, shard_router
+from services.revisions_sqlite import plan_policy as revision_policy
+
+logger = logging.getLogger(__name__)
+
+
+def check_schema():
+    if settings.SCHEMA_CHECK == "off":
+        return
+    pending = [module.revision for module in pending_migrations(engine)]
+    if not pending:
+        return
+    message = (
+        f"Database is at revision {current_revision(engine) or '<empty>'}, migrations {', '.join(pending)} "
+        "are pending; run `python -m core.migrate_sqlite upgrade`"
+    )
+    if settings.SCHEMA_CHECK == "strict":
+        raise RuntimeError(message)
+    logger.warning(message)
+
+async def _ping():
+    async with async_engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+async def warm_up():
+    # Concurrent checkouts, so the pool really opens that many connections
+    await asyncio.gather(*(_ping() for _ in range(settings.DB_WARM_CONNECTIONS)))
+    await rate_policy(None)
+    async with AsyncSessionLocal() as db:
+        await revision_policy(db, None)
+    await shard_router.shard_for("")
+    if content_codec.NOTE_COMPRESSION == "zstd":
+        await content_codec.dictionaries.refresh()
+
+async def startup():
+    start = time.perf_counter()
+    await asyncio.to_thread(check_schema)
+    try:
+        await warm_up()
+    except Exception:
+        # Not fatal: the pools and caches fill on first use instead
+        logger.exception("Warm-up failed")
+    job_pool.start()
+    logger.info("Allowed CORS origins: %s", settings.CORS_ORIGINS)
+    logger.info("Worker %s ready in %.0f ms", os.getpid(), 1000 * (time.perf_counter() - start))
+
+async def shutdown():
+    await job_pool.stop()
+    await note_events.close()
+    await shard_engines.dispose()
+    await async_engine.dispose()
+    engine.dispose()
+
+def after_fork():
+    engine.dispose(close=False)
+    async_engine.sync_engine.dispose(close=False)
+    shard_engines.forget_connections()
+
+os.register_at_fork(after_in_child=after_fork)
@@ -0,0 +1,90 @@
+"""
+Minimal versioned schema migrations.
+
+Each module in migrations/ named NNNN_<slug>.py defines `revision`,
+`down_revision` and `upgrade(engine)`. A migration owns its transactions so
+long backfills can commit in batches while the app keeps serving traffic.
+
+    python -m core.migrate_sqlite upgrade [revision]
+    python -m core.migrate_sqlite current
+    python -m core.migrate_sqlite history
+"""
+import importlib
+import pkgutil
+import sys
+from datetime import datetime
+from sqlalchemy import text
+
+import migrations
+
+VERSION_TABLE = "schema_migrations"
+
+
+def load_migrations():
+    modules = [
+        importlib.import_module(f"migrations.{info.name}")
+        for info in pkgutil.iter_modules(migrations.__path__)
+        if info.name[:4].isdigit()
+    ]
+    modules.sort(key=lambda module: module.revision)
+    previous = None
+    for module in modules:
+        if module.down_revision != previous:
+            raise RuntimeError(
+                f"Migration {module.revision} follows {module.down_revision}, expected {previous}"
+            )
+        previous = module.revision
+    return modules
+
+def describe(module):
+    doc = (module.__doc__ or "").strip()
+    return doc.splitlines()[0] if doc else ""
+
+def _ensure_version_table(engine):
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {VERSION_TABLE} ("
+            "version VARCHAR PRIMARY KEY, description VARCHAR, applied_at VARCHAR NOT NULL)"
+        ))
+
+def applied_versions(engine):
+    _ensure_version_table(engine)
+    with engine.connect() as conn:
+        return {row[0] for row in conn.execute(text(f"SELECT version FROM {VERSION_TABLE}"))}
+
+def pending_migrations(engine):
+    applied = applied_versions(engine)
+    return [module for module in load_migrations() if module.revision not in applied]
+
+def current_revision(engine):
+    applied = applied_versions(engine)
+    return max(applied) if applied else None
+
+def upgrade(engine, target=None, log=print):
+    for module in pending_migrations(engine):
+        if target is not None and module.revision > target:
+            break
+        description = describe(module)
+        log(f"Applying {module.revision}: {description}")
+        module.upgrade(engine)
+        with engine.begin() as conn:
+            conn.execute(
+                text(f"INSERT INTO {VERSION_TABLE} (version, description, applied_at) VALUES (:v, :d, :t)"),
+                {"v": module.revision, "d": description, "t": datetime.utcnow().isoformat()},
+            )
+
+if __name__ == "__main__":
+    from core.database_sqlite import engine
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "upgrade"
+    if command == "upgrade":
+        upgrade(engine, sys.argv[2] if len(sys.argv) > 2 else None)
+    elif command == "current":
+        print(current_revision(engine) or "<empty>")
+    elif command == "history":
+        applied = applied_versions(engine)
+        for module in load_migrations():
+            mark = "x" if module.revision in applied else " "
+            print(f"[{mark}] {module.revision} {describe(module)}")
+    else:
+        sys.exit("usage: python -m core.migrate_sqlite [upgrade [revision]|current|history]")
@@ -0,0 +1,70 @@
+"""
+Password hashing. bcrypt is deliberately slow, so hashing and verification run
+in a small dedicated thread pool (bcrypt releases the GIL) instead of on the
+event loop, with a cap on how many requests may wait for it.
+"""
+import asyncio
+import hmac
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import bcrypt
+from fastapi import HTTPException, status
+
+HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", "12"))
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Requests allowed to queue for a hashing thread before we shed load with 503
+HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
+_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="password-hash")
+_pending = 0
+
+
+def _secret(password: str) -> bytes:
+    # bcrypt only looks at the first 72 bytes; newer releases raise instead of truncating
+    return password.encode("utf-8")[:72]
+
+def is_hashed(stored: str) -> bool:
+    return stored.startswith(("$2a$", "$2b$", "$2y$"))
+
+def hash_password_sync(password: str) -> str:
+    return bcrypt.hashpw(_secret(password), bcrypt.gensalt(HASH_ROUNDS)).decode()
+
+def verify_password_sync(password: str, stored: str):
+    """Return (matches, needs_rehash). Legacy plaintext rows match but need rehashing."""
+    if not is_hashed(stored):
+        return hmac.compare_digest(password.encode("utf-8"), stored.encode("utf-8")), True
+    matches = bcrypt.checkpw(_secret(password), stored.encode())
+    return matches, matches and int(stored.split("$")[2]) != HASH_ROUNDS
+
+@lru_cache(maxsize=1)
+def _dummy_hash() -> str:
+    return hash_password_sync("dummy-password")
+
+def _verify_unknown_user(password: str):
+    # Burn the same CPU as a real check so response time doesn't reveal unknown usernames
+    verify_password_sync(password, _dummy_hash())
+    return False, False
+
+
+async def _offload(fn, *args):
+    global _pending
+    if _pending >= HASH_MAX_PENDING:
+        raise HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, "Too many login attempts in progress",
+                            headers={"Retry-After": "1"})
+    _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+    finally:
+        _pending -= 1
+
+async def hash_password(password: str) -> str:
+    return await _offload(hash_password_sync, password)
+
+async def verify_password(password: str, stored) -> tuple:
+    if stored is None:
+        return await _offload(_verify_unknown_user, password)
+    return await _offload(verify_password_sync, password, stored)
+
+def pool_stats():
+    return {"workers": HASH_WORKERS, "pending": _pending, "max_pending": HASH_MAX_PENDING}
@@ -0,0 +1,106 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass(frozen=True)
+class Principal:
+    # Same attribute names as models.user_sqlite.User so routes can use either
+    id: int
+    username: str
+    role: str
+    tenant_id: str
+    name: str
+    plan: str
+    tenant_plan: Optional[str]
+
+    @classmethod
+    def from_rows(cls, user, tenant=None):
+        return cls(
+            id=user.id,
+            username=user.username,
+            role=user.role,
+            tenant_id=user.tenant_id,
+            name=user.name,
+            plan=user.plan,
+            tenant_plan=tenant.plan if tenant else None,
+        )
+
+
+class PrincipalCache:
+    """Bounded LRU of authenticated principals, keyed by (token signature, username)."""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key) -> Optional[Principal]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, principal: Principal, max_age: Optional[float] = None):
+        ttl = self.ttl if max_age is None else min(self.ttl, max_age)
+        if ttl <= 0 or self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, principal)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _invalidate(self, predicate):
+        with self._lock:
+            stale = [key for key, (_, principal) in self._entries.items() if predicate(principal)]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def invalidate_user(self, username: str):
+        self._invalidate(lambda principal: principal.username == username)
+
+    def invalidate_tenant(self, tenant_id: str):
+        self._invalidate(lambda principal: principal.tenant_id == tenant_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            "size": size,
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+principal_cache = PrincipalCache(
+    max_size=int(os.getenv("PRINCIPAL_CACHE_MAX_SIZE", "10000")),
+    ttl=float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60")),
+)
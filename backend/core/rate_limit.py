@@ -0,0 +1,187 @@
+import logging
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from fastapi import HTTPException, Request, status
+
+logger = logging.getLogger(__name__)
+
+# memory: buckets per worker process; sqlite: one file shared by every worker
+# on the host, so the budgets are global rather than per worker
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_DB_PATH = os.getenv("RATE_LIMIT_DB_PATH", os.path.join(tempfile.gettempdir(), "notes-rate-limits.db"))
+# Shared buckets untouched this long are deleted (a full bucket needs no row)
+RATE_LIMIT_IDLE_SECONDS = 3600
+
+
+class TokenBucketLimiter:
+    """Token buckets per key (`rate` tokens/second, up to `burst`), LRU-bounded to `max_keys`."""
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 100_000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def acquire(self, key, cost: float = 1.0, rate: float = None, burst: float = None) -> float:
+        """Take `cost` tokens for `key`; return 0 on success, else seconds until it would succeed.
+
+        `rate` and `burst` override the limiter's own for this key (plan-dependent limits).
+        """
+        rate = self.rate if rate is None else rate
+        burst = self.burst if burst is None else burst
+        if rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= cost:
+                tokens -= cost
+                wait = 0.0
+            else:
+                wait = (cost - tokens) / rate
+                self.rejected += 1
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def stats(self):
+        with self._lock:
+            size = len(self._buckets)
+        return {"rate_per_second": self.rate, "burst": self.burst, "keys": size, "rejected": self.rejected}
+
+
+class SqliteTokenBucketLimiter(TokenBucketLimiter):
+    """The same token buckets kept in a local SQLite file that all workers share.
+
+    One upsert per acquire, refilled from wall-clock time. If the file can't be
+    used the request is let through: a limiter outage must not become an API outage.
+    """
+
+    _ACQUIRE = (
+        "INSERT INTO buckets (key, tokens, granted, updated) VALUES (:key, :burst - :cost, 1, :now) "
+        "ON CONFLICT (key) DO UPDATE SET "
+        "granted = min(:burst, tokens + max(0, :now - updated) * :rate) >= :cost, "
+        "tokens = min(:burst, tokens + max(0, :now - updated) * :rate) - CASE "
+        "WHEN min(:burst, tokens + max(0, :now - updated) * :rate) >= :cost THEN :cost ELSE 0 END, "
+        "updated = :now "
+        "RETURNING tokens, granted"
+    )
+
+    def __init__(self, path: str, namespace: str, rate: float, burst: float):
+        super().__init__(rate, burst)
+        self.path = path
+        # Limiters share the table, so each prefixes its keys
+        self.namespace = namespace
+        self._conn = None
+        self._trimmed = time.time()
+
+    def _connect(self):
+        # Opened lazily so a pre-forked parent never shares its connection
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, timeout=1.0, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            # Losing a few refills in a crash is harmless
+            self._conn.execute("PRAGMA synchronous=OFF")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, granted INTEGER NOT NULL, updated REAL NOT NULL)"
+            )
+        return self._conn
+
+    def acquire(self, key, cost: float = 1.0, rate: float = None, burst: float = None) -> float:
+        rate = self.rate if rate is None else rate
+        burst = self.burst if burst is None else burst
+        if rate <= 0:
+            return 0.0
+        now = time.time()
+        params = {"key": f"{self.namespace}:{key}", "cost": cost, "rate": rate, "burst": burst, "now": now}
+        with self._lock:
+            try:
+                conn = self._connect()
+                tokens, granted = conn.execute(self._ACQUIRE, params).fetchone()
+                if now - self._trimmed > RATE_LIMIT_IDLE_SECONDS:
+                    conn.execute("DELETE FROM buckets WHERE updated < ?", (now - RATE_LIMIT_IDLE_SECONDS,))
+                    self._trimmed = now
+            except sqlite3.Error:
+                logger.exception("Shared rate limiter unavailable, allowing request")
+                return 0.0
+            if granted:
+                return 0.0
+            self.rejected += 1
+        return (cost - tokens) / rate
+
+    def clear(self):
+        with self._lock:
+            self._connect().execute("DELETE FROM buckets WHERE key >= ? AND key < ?",
+                                    (f"{self.namespace}:", f"{self.namespace};"))
+
+    def stats(self):
+        with self._lock:
+            try:
+                size = self._connect().execute(
+                    "SELECT count(*) FROM buckets WHERE key >= ? AND key < ?",
+                    (f"{self.namespace}:", f"{self.namespace};"),
+                ).fetchone()[0]
+            except sqlite3.Error:
+                size = None
+        return {"rate_per_second": self.rate, "burst": self.burst, "keys": size, "rejected": self.rejected}
+
+
+def make_limiter(name: str, rate: float, burst: float) -> TokenBucketLimiter:
+    if RATE_LIMIT_BACKEND == "sqlite":
+        return SqliteTokenBucketLimiter(RATE_LIMIT_DB_PATH, name, rate, burst)
+    if RATE_LIMIT_BACKEND != "memory":
+        raise RuntimeError(f"Unknown RATE_LIMIT_BACKEND {RATE_LIMIT_BACKEND!r}")
+    return TokenBucketLimiter(rate, burst)
+
+
+def too_many_requests(wait: float, detail: str = "Too many requests"):
+    return HTTPException(status.HTTP_429_TOO_MANY_REQUESTS, detail,
+                         headers={"Retry-After": str(max(1, math.ceil(wait)))})
+
+
+# Login is limited per username (credential stuffing one account) and per client
+# address (spraying many accounts); 0 per minute disables a limiter.
+login_by_username = make_limiter(
+    "login-user",
+    rate=float(os.getenv("LOGIN_RATE_PER_MINUTE", "10")) / 60,
+    burst=float(os.getenv("LOGIN_RATE_BURST", "5")),
+)
+login_by_ip = make_limiter(
+    "login-ip",
+    rate=float(os.getenv("LOGIN_IP_RATE_PER_MINUTE", "60")) / 60,
+    burst=float(os.getenv("LOGIN_IP_RATE_BURST", "20")),
+)
+
+def check_login_rate(request: Request, username: str):
+    client_ip = request.client.host if request.client else "unknown"
+    wait = max(login_by_ip.acquire(client_ip), login_by_username.acquire(username.lower()))
+    if wait:
+        raise too_many_requests(wait, "Too many login attempts, try again later")
+
+
+# API requests are limited per tenant and per user at rates set by the tenant's
+# plan (see core.admission); TENANT_RATE_LIMITS=off disables both.
+TENANT_RATE_LIMITS = os.getenv("TENANT_RATE_LIMITS", "on").lower() != "off"
+tenant_requests = make_limiter("tenant", rate=0, burst=0)
+user_requests = make_limiter("user", rate=0, burst=0)
+# Requests without a usable token, per client address and ?tenant_id=
+anonymous_requests = make_limiter(
+    "anonymous",
+    rate=float(os.getenv("ANONYMOUS_RATE_PER_MINUTE", "300")) / 60,
+    burst=float(os.getenv("ANONYMOUS_RATE_BURST", "60")),
+)
@@ -0,0 +1,187 @@
+"""
+Tenant-scoped response cache with strong ETags.
+
+Every cached representation is keyed by (tenant, route key, tenant version),
+where the version is the tenant_versions counter bumped by each note, user or
+tenant mutation. The ETag is derived from the same triple, so a request whose
+If-None-Match matches the tenant's current version gets a 304 without touching
+the database, and a mutation invalidates exactly that tenant's entries.
+
+Versions learned from our own commits are applied immediately. Other workers'
+commits arrive through the note event hub, so with NOTE_EVENTS_BACKEND=sqlite
+they are seen within one bus poll; a version not refreshed for
+RESPONSE_CACHE_VERSION_TTL seconds is re-read from the database.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Optional
+from fastapi import Request, Response
+from core.events import note_events
+from core.serialization import dumps
+
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "5000"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESPONSE_CACHE_VERSION_TTL = float(os.getenv("RESPONSE_CACHE_VERSION_TTL", "5"))
+
+# Tenant data: caches may keep it, but must revalidate with the ETag every time
+CACHE_CONTROL = "private, no-cache"
+
+# Version scope for responses that span all tenants (e.g. GET /tenants/)
+ALL_TENANTS = "*"
+
+
+def make_etag(tenant_id: str, version: int, key: str) -> str:
+    digest = hashlib.sha1(f"{tenant_id}\0{version}\0{key}".encode()).hexdigest()[:24]
+    return f'"{digest}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # Weak comparison: compressed responses carry the tag as W/"..."
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+
+
+class ResponseCache:
+    """LRU of rendered JSON bodies plus the latest known version of each tenant."""
+
+    def __init__(self, max_entries: int, max_bytes: int, version_ttl: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.version_ttl = version_ttl
+        self._entries = OrderedDict()
+        self._by_tenant = defaultdict(set)
+        self._versions = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def known_version(self, tenant_id: str) -> Optional[int]:
+        entry = self._versions.get(tenant_id)
+        if entry is None or entry[1] <= time.monotonic():
+            return None
+        return entry[0]
+
+    def advance(self, tenant_id: str, version: int, authoritative: bool = False):
+        """Record a tenant version; newer versions drop the tenant's older entries."""
+        with self._lock:
+            current = self._versions.get(tenant_id)
+            if current and version < current[0] and not authoritative:
+                return
+            self._versions[tenant_id] = (version, time.monotonic() + self.version_ttl)
+            stale = [key for key in self._by_tenant.get(tenant_id, ()) if key[2] != version]
+            for key in stale:
+                self._remove(key)
+            self.invalidations += len(stale)
+
+    def _remove(self, key):
+        body, _ = self._entries.pop(key)
+        self._bytes -= len(body)
+        keys = self._by_tenant[key[0]]
+        keys.discard(key)
+        if not keys:
+            del self._by_tenant[key[0]]
+
+    def get(self, tenant_id: str, key: str, version: int):
+        with self._lock:
+            entry = self._entries.get((tenant_id, key, version))
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((tenant_id, key, version))
+            self.hits += 1
+            return entry
+
+    def put(self, tenant_id: str, key: str, version: int, body: bytes, headers: dict):
+        if self.max_entries <= 0 or len(body) > self.max_bytes:
+            return
+        cache_key = (tenant_id, key, version)
+        with self._lock:
+            if cache_key in self._entries:
+                self._remove(cache_key)
+            self._entries[cache_key] = (body, headers)
+            self._by_tenant[tenant_id].add(cache_key)
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_tenant.clear()
+            self._versions.clear()
+            self._bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "tenants": len(self._versions),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "not_modified": self.not_modified,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_VERSION_TTL)
+
+
+def _on_events(tenant_id, events):
+    versions = [event["version"] for event in events if "version" in event]
+    if versions:
+        response_cache.advance(tenant_id, max(versions))
+
+note_events.add_listener(_on_events)
+
+
+async def tenant_version(db, tenant_id: str) -> int:
+    version = response_cache.known_version(tenant_id)
+    if version is None:
+        from services.changes_sqlite import current_version
+
+        version = await current_version(db, tenant_id)
+        response_cache.advance(tenant_id, version, authoritative=True)
+    return version
+
+async def cached_json(request: Request, db, tenant_id: str, key: str, build) -> Response:
+    """Serve `build(version)` -> (payload, headers) through the cache, honouring If-None-Match.
+
+    `build` may instead return a Response, which is sent as-is and not cached.
+    """
+    # Versions from other workers arrive through the hub's backend
+    note_events.start()
+    version = await tenant_version(db, tenant_id)
+    etag = make_etag(tenant_id, version, key)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        response_cache.not_modified += 1
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+    entry = response_cache.get(tenant_id, key, version)
+    if entry is None:
+        result = await build(version)
+        if isinstance(result, Response):
+            return result
+        payload, headers = result
+        entry = (dumps(payload), headers)
+        response_cache.put(tenant_id, key, version, *entry)
+    body, headers = entry
+    return Response(body, media_type="application/json", headers={**headers, "ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+async def announce_version(tenant_id: str, version: int):
+    # After commit: invalidate here at once and tell the other workers
+    await note_events.publish(tenant_id, [{"type": "version", "version": version}])
@@ -1,23 +1,12 @@
-import jwt
-from datetime import datetime, timedelta
+from datetime import timedelta
 from typing import Optional
-from core.config import settings
+from core.tokens import ACCESS_TOKEN_TTL, decode_token, encode_claims
 
-SECRET_KEY = "supersecret"  # ⚠️ move to .env in real projects
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60
+# Thin wrappers kept for the legacy routes; tokens are signed and verified by core.tokens
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    to_encode = data.copy()
-    expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    ttl = int(expires_delta.total_seconds()) if expires_delta else ACCESS_TOKEN_TTL
+    return encode_claims(data, ttl)
 
 def decode_access_token(token: str):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
-    except jwt.ExpiredSignatureError:
-        return None
-    except jwt.PyJWTError:
-        return None
+    return decode_token(token)
@@ -1,6 +1,13 @@
+import argparse
+from datetime import datetime, timedelta
+from sqlalchemy import insert, select, text
 from core.database_sqlite import SessionLocal
+from core.passwords import hash_password_sync
 from models.user_sqlite import User
 from models.tenant_sqlite import Tenant
+from models.note_sqlite import Note
+from services.quota_sqlite import note_size
+from services.search_sqlite import fts_row
 
 def seed():
     db = SessionLocal()
@@ -15,11 +22,12 @@ def seed():
     db.commit()
 
     # Seed users
+    password = hash_password_sync("123")
     users = [
-        User(username="acmeAdmin", password="123", role="admin", tenant_id="acme"),
-        User(username="acmeMember", password="123", role="member", tenant_id="acme"),
-        User(username="globexAdmin", password="123", role="admin", tenant_id="globex"),
-        User(username="globexMember", password="123", role="member", tenant_id="globex"),
+        User(username="acmeAdmin", password=password, role="admin", tenant_id="acme"),
+        User(username="acmeMember", password=password, role="member", tenant_id="acme"),
+        User(username="globexAdmin", password=password, role="admin", tenant_id="globex"),
+        User(username="globexMember", password=password, role="member", tenant_id="globex"),
     ]
     for user in users:
         if not db.query(User).filter_by(username=user.username).first():
@@ -27,5 +35,84 @@ def seed():
     db.commit()
     db.close()
 
+def bench_username(tenant_index: int, user_index: int) -> str:
+    return f"bench{tenant_index}_user{user_index}"
+
+def seed_load(tenants: int, users: int, notes: int, plan: str = "pro",
+              password: str = "bench", batch_size: int = 5000):
+    """Seed `tenants` x `users` x `notes` rows for load tests.
+
+    Tenant ids are bench<i>, usernames bench<i>_user<j> (user 0 is the admin)
+    and each tenant gets `notes` notes spread over its users.
+    """
+    db = SessionLocal()
+    try:
+        start = datetime.utcnow() - timedelta(days=30)
+        # One bcrypt hash shared by every load-test user; hashing per user would dominate seeding
+        hashed_password = hash_password_sync(password)
+        for t in range(tenants):
+            tenant_id = f"bench{t}"
+            if db.get(Tenant, tenant_id):
+                continue
+            db.add(Tenant(id=tenant_id, name=f"Bench Tenant {t}", plan=plan))
+            db.execute(insert(User), [
+                {
+                    "username": bench_username(t, u),
+                    "password": hashed_password,
+                    "role": "admin" if u == 0 else "member",
+                    "tenant_id": tenant_id,
+                    "name": f"Bench User {u}",
+                    "plan": plan,
+                }
+                for u in range(users)
+            ])
+            user_ids = [
+                row[0] for row in db.execute(
+                    text("SELECT id FROM users WHERE tenant_id = :tenant_id ORDER BY id"),
+                    {"tenant_id": tenant_id},
+                )
+            ]
+            total_size = 0
+            for offset in range(0, notes, batch_size):
+                rows = []
+                for n in range(offset, min(offset + batch_size, notes)):
+                    title = f"Bench note {n}"
+                    content = f"Load test note {n} for tenant {tenant_id}. " * 4
+                    stamp = start + timedelta(seconds=n)
+                    total_size += note_size(title, content)
+                    rows.append({
+                        "title": title,
+                        "content": content,
+                        "owner": user_ids[n % len(user_ids)],
+                        "tenant_id": tenant_id,
+                        "createdAt": stamp,
+                        "updatedAt": stamp,
+                    })
+                db.execute(insert(Note), rows)
+            if notes and db.get_bind().dialect.name != "postgresql":
+                # Read back through the model: bodies may have been stored compressed
+                indexed = db.execute(
+                    select(Note.id, Note.title, Note.content, Note.tenant_id).where(Note.tenant_id == tenant_id)
+                ).all()
+                db.execute(text(
+                    "INSERT INTO notes_fts (rowid, tenant_key, title, content) "
+                    "VALUES (:id, :tenant_key, :title, :content)"
+                ), [fts_row(row._mapping) for row in indexed])
+            db.execute(text(
+                "INSERT INTO tenant_usage (tenant_id, note_count, storage_bytes, member_count) "
+                "VALUES (:tenant_id, :notes, :size, :members)"
+            ), {"tenant_id": tenant_id, "notes": notes, "size": total_size, "members": users - 1})
+            db.commit()
+    finally:
+        db.close()
+
 if __name__ == "__main__":
-    seed()
+    parser = argparse.ArgumentParser(description="Seed the database")
+    parser.add_argument("--tenants", type=int, help="seed N load-test tenants instead of the demo data")
+    parser.add_argument("--users", type=int, default=5, help="users per load-test tenant")
+    parser.add_argument("--notes", type=int, default=1000, help="notes per load-test tenant")
+    args = parser.parse_args()
+    if args.tenants:
+        seed_load(args.tenants, args.users, args.notes)
+    else:
+        seed()
@@ -0,0 +1,26 @@
+"""
+JSON encoding for responses.
+
+orjson writes dicts, lists, datetimes and Pydantic models straight to bytes,
+so handlers that already hold plain rows skip FastAPI's jsonable_encoder pass,
+which dominates CPU on large list responses.
+"""
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+
+def _default(value):
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json", by_alias=True)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONResponse(JSONResponse):
+    """App-wide default response class; renders with orjson."""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
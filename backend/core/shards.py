@@ -0,0 +1,613 @@
+"""
+Tenant-sharded storage: one SQLite file per tenant (or per hash bucket).
+
+With SHARD_MODE=tenant each tenant's notes live in their own file under
+SHARD_DIR; with SHARD_MODE=hash tenants are spread over SHARD_COUNT files by a
+hash of their id. SHARD_MODE=off (the default) keeps everything in the main
+database. The main database (SQLALCHEMY_DATABASE_URL) is always the catalog:
+tenants, users, plans, compression dictionaries and the placements of tenants
+that were moved off their default shard.
+
+A shard file holds only the tenant tables (notes, search index, change log,
+versions, revisions, usage, stats rollups). Every shard connection ATTACHes the catalog, and
+SQLite resolves unqualified table names in the main file first, so the same
+queries, joins with users/tenants/plans included, run unchanged against a
+shard; a note write only takes that shard's write lock. Note ids come in
+blocks from a catalog sequence (NoteIds), so they are unique across shards and
+a tenant keeps its note ids when it moves.
+
+Shard engines are opened lazily, kept in an LRU of SHARD_ENGINE_CACHE_SIZE
+and created from the models on first use (migrations cover the catalog).
+Only tenants in the catalog get a session, so a shard file is never created
+for a tenant id that doesn't exist (UnknownTenant -> 404).
+
+    python -m core.shards list
+    python -m core.shards where TENANT
+    python -m core.shards pin                  # before enabling sharding on an existing database
+    python -m core.shards move TENANT SHARD    # "main" is the catalog database
+
+A move copies the tenant in batches while it keeps serving, catches up from
+the change log, then fences the old shard (tenant_versions.moved_to, checked
+by every note write, which fails with TenantMoved -> 503 and a retry),
+copies the last changes and records the new placement. The old copy is
+deleted once every worker has reloaded placements (SHARD_PLACEMENT_TTL).
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import re
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from sqlalchemy import Text, create_engine, delete, event, func, insert, select, text, type_coerce, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+from sqlalchemy.schema import CreateIndex, CreateTable
+from core.database_sqlite import (
+    SQLALCHEMY_DATABASE_URL, AsyncSessionLocal, SessionLocal, TimedAsyncQueuePool, apply_sqlite_pragmas,
+    async_engine, engine, engine_options, is_sqlite,
+)
+
+SHARD_MODE = os.getenv("SHARD_MODE", "off").lower()
+SHARD_DIR = os.getenv("SHARD_DIR", "./shards")
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "16"))
+SHARD_ENGINE_CACHE_SIZE = int(os.getenv("SHARD_ENGINE_CACHE_SIZE", "64"))
+# Per shard; a busy worker may hold many shards open at once
+SHARD_POOL_SIZE = int(os.getenv("SHARD_POOL_SIZE", "2"))
+SHARD_MAX_OVERFLOW = int(os.getenv("SHARD_MAX_OVERFLOW", "8"))
+# How long a worker trusts its copy of the placements table
+SHARD_PLACEMENT_TTL = float(os.getenv("SHARD_PLACEMENT_TTL", "5"))
+# Note ids a worker takes from the catalog sequence at a time
+NOTE_ID_BLOCK_SIZE = int(os.getenv("NOTE_ID_BLOCK_SIZE", "1000"))
+MOVE_BATCH_SIZE = 1000
+
+MAIN_SHARD = "main"
+CATALOG = "catalog"
+
+_safe_name = re.compile(r"[A-Za-z0-9_-][A-Za-z0-9_.-]*")
+
+if SHARD_MODE not in ("off", "tenant", "hash"):
+    raise RuntimeError(f"SHARD_MODE must be off, tenant or hash, not {SHARD_MODE!r}")
+if SHARD_MODE != "off" and not is_sqlite(SQLALCHEMY_DATABASE_URL):
+    raise RuntimeError("Sharded storage needs a SQLite catalog database")
+
+
+class TenantMoved(Exception):
+    """A write reached the shard a tenant has just moved away from."""
+
+    def __init__(self, tenant_id: str, shard: str):
+        super().__init__(f"Tenant {tenant_id} moved to shard {shard}")
+        self.tenant_id = tenant_id
+        self.shard = shard
+
+
+class UnknownTenant(Exception):
+    """A tenant id that isn't in the catalog."""
+
+    def __init__(self, tenant_id):
+        super().__init__(f"Unknown tenant {tenant_id}")
+        self.tenant_id = tenant_id
+
+
+class ShardMoveError(Exception):
+    pass
+
+
+def shard_tables():
+    from models.note_change_sqlite import NoteChange
+    from models.note_revision_sqlite import NoteRevision
+    from models.note_sqlite import Note
+    from models.tenant_usage_sqlite import TenantUsage
+    from models.tenant_version_sqlite import TenantVersion
+    # notes.owner references users, which must be in the metadata to render the DDL
+    import models.user_sqlite  # noqa: F401
+
+    return [table.__table__ for table in (Note, NoteChange, NoteRevision, TenantUsage, TenantVersion)] + stats_tables()
+
+def stats_tables():
+    from models.tenant_stats_sqlite import TenantStatsAuthor, TenantStatsBackfill, TenantStatsDaily, TenantStatsHourly
+
+    return [table.__table__ for table in (TenantStatsHourly, TenantStatsDaily, TenantStatsAuthor, TenantStatsBackfill)]
+
+def default_shard(tenant_id: str) -> str:
+    if SHARD_MODE == "tenant":
+        if _safe_name.fullmatch(tenant_id):
+            return f"tenant-{tenant_id}"
+        return f"tenant-{hashlib.sha1(tenant_id.encode()).hexdigest()[:16]}"
+    if SHARD_MODE == "hash":
+        return f"shard-{zlib.crc32(tenant_id.encode()) % SHARD_COUNT:03d}"
+    return MAIN_SHARD
+
+def shard_path(name: str) -> str:
+    if not _safe_name.fullmatch(name):
+        raise ValueError(f"Invalid shard name {name!r}")
+    return os.path.join(SHARD_DIR, f"{name}.db")
+
+def shard_names():
+    """The catalog plus every shard file that exists."""
+    names = [MAIN_SHARD]
+    if os.path.isdir(SHARD_DIR):
+        names += sorted(entry[:-3] for entry in os.listdir(SHARD_DIR) if entry.endswith(".db"))
+    return names
+
+def _attach_catalog(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"ATTACH DATABASE ? AS {CATALOG}", (make_url(SQLALCHEMY_DATABASE_URL).database,))
+    finally:
+        cursor.close()
+
+def _listen(sync_engine):
+    event.listen(sync_engine, "connect", apply_sqlite_pragmas)
+    event.listen(sync_engine, "connect", _attach_catalog)
+
+def create_shard_schema(name: str):
+    """Create the tenant tables in a shard file, if they don't exist yet."""
+    from services.search_sqlite import SQLITE_DDL, upgrade_index
+
+    os.makedirs(SHARD_DIR, exist_ok=True)
+    setup = create_engine(f"sqlite:///{shard_path(name)}", poolclass=NullPool)
+    event.listen(setup, "connect", apply_sqlite_pragmas)
+    try:
+        with setup.begin() as conn:
+            had_stats = conn.scalar(text(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name = 'tenant_stats_backfill'"
+            ))
+            for table in shard_tables():
+                conn.execute(CreateTable(table, if_not_exists=True))
+                for index in table.indexes:
+                    conn.execute(CreateIndex(index, if_not_exists=True))
+            for ddl in SQLITE_DDL:
+                conn.execute(text(ddl))
+            if not had_stats:
+                # A shard from before the rollups: leave its notes to the stats backfill, as migration 0011 does
+                conn.execute(text(
+                    "INSERT INTO tenant_stats_backfill (tenant_id, through_id, cursor, createdAt) "
+                    "SELECT tenant_id, MAX(id), 0, strftime('%Y-%m-%d %H:%M:%f000', 'now') FROM notes "
+                    "WHERE tenant_id IS NOT NULL GROUP BY tenant_id"
+                ))
+            newest = conn.scalar(text("SELECT MAX(id) FROM notes")) or 0
+        # Ids from before the sequence existed must never be handed out again
+        with engine.begin() as conn:
+            conn.execute(text("UPDATE id_sequences SET next_id = MAX(next_id, :floor) WHERE name = 'notes'"),
+                         {"floor": newest + 1})
+        # A search index from before tenant_key is rebuilt once (compressed bodies decode through the catalog)
+        with Session(bind=setup, autoflush=False) as session:
+            upgrade_index(session)
+    finally:
+        setup.dispose()
+
+def sync_engine_for(name: str):
+    """Engine for scripts; the caller disposes it (except for the catalog's)."""
+    if name == MAIN_SHARD:
+        return engine
+    create_shard_schema(name)
+    shard_engine = create_engine(f"sqlite:///{shard_path(name)}", connect_args={"check_same_thread": False})
+    _listen(shard_engine)
+    return shard_engine
+
+@contextmanager
+def shard_sync_session(name: str):
+    shard_engine = sync_engine_for(name)
+    session = Session(bind=shard_engine, autoflush=False)
+    try:
+        yield session
+    finally:
+        session.close()
+        if shard_engine is not engine:
+            shard_engine.dispose()
+
+
+class ShardEngines:
+    """LRU of lazily opened async engines, one per shard file."""
+
+    def __init__(self, max_engines: int):
+        self.max_engines = max_engines
+        self._engines = OrderedDict()
+        self._ready = set()
+        self._hooks = []
+        self.hits = 0
+        self.opened = 0
+        self.evictions = 0
+
+    def on_open(self, hook):
+        """Call hook(sync_engine) for every shard engine opened (e.g. instrumentation)."""
+        self._hooks.append(hook)
+
+    async def get(self, name: str):
+        if name == MAIN_SHARD:
+            return async_engine
+        shard_engine = self._engines.get(name)
+        if shard_engine is not None:
+            self._engines.move_to_end(name)
+            self.hits += 1
+            return shard_engine
+        if name not in self._ready:
+            await asyncio.to_thread(create_shard_schema, name)
+            self._ready.add(name)
+        # Another request may have opened it while the schema was checked
+        shard_engine = self._engines.get(name)
+        if shard_engine is None:
+            url = f"sqlite+aiosqlite:///{shard_path(name)}"
+            options = engine_options(url, TimedAsyncQueuePool)
+            options.update(pool_size=SHARD_POOL_SIZE, max_overflow=SHARD_MAX_OVERFLOW)
+            shard_engine = create_async_engine(url, **options)
+            _listen(shard_engine.sync_engine)
+            for hook in self._hooks:
+                hook(shard_engine.sync_engine)
+            self._engines[name] = shard_engine
+            self.opened += 1
+            while len(self._engines) > self.max_engines:
+                _, evicted = self._engines.popitem(last=False)
+                self.evictions += 1
+                # Checked-out connections stay usable and are closed when returned
+                await evicted.dispose()
+        return shard_engine
+
+    async def dispose(self):
+        while self._engines:
+            _, shard_engine = self._engines.popitem()
+            await shard_engine.dispose()
+
+    def forget_connections(self):
+        # In a forked child: drop the parent's pooled connections without closing them
+        for shard_engine in self._engines.values():
+            shard_engine.sync_engine.dispose(close=False)
+
+    def stats(self):
+        return {
+            "mode": SHARD_MODE,
+            "open": len(self._engines),
+            "max_open": self.max_engines,
+            "hits": self.hits,
+            "opened": self.opened,
+            "evictions": self.evictions,
+        }
+
+
+class ShardRouter:
+    """tenant_id -> shard name: the catalog's placements, else the mode's default."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._placements = {}
+        self._expires = 0.0
+        self._known = set()
+        self._known_expires = 0.0
+
+    async def exists(self, tenant_id: str) -> bool:
+        """Whether the catalog has the tenant; found ones are remembered for `ttl`, unknown ones asked again."""
+        if time.monotonic() >= self._known_expires:
+            self._known.clear()
+            self._known_expires = time.monotonic() + self.ttl
+        if tenant_id in self._known:
+            return True
+        from models.tenant_sqlite import Tenant
+
+        async with AsyncSessionLocal() as db:
+            found = await db.scalar(select(Tenant.id).where(Tenant.id == tenant_id))
+        if found is None:
+            return False
+        self._known.add(tenant_id)
+        return True
+
+    async def shard_for(self, tenant_id: str) -> str:
+        if SHARD_MODE == "off":
+            return MAIN_SHARD
+        if time.monotonic() >= self._expires:
+            from models.tenant_shard_sqlite import TenantShard
+
+            async with AsyncSessionLocal() as db:
+                rows = await db.execute(select(TenantShard.tenant_id, TenantShard.shard))
+                self._placements = dict(rows.all())
+            self._expires = time.monotonic() + self.ttl
+        return self._placements.get(tenant_id) or default_shard(tenant_id)
+
+    def invalidate(self):
+        self._expires = 0.0
+        self._known_expires = 0.0
+
+
+class NoteIds:
+    """Ids for new notes when sharded, taken in blocks from the catalog's id_sequences row.
+
+    take() commits the block in its own catalog transaction, so call it before
+    the caller's transaction writes: for a tenant stored in the catalog that
+    transaction would hold the write lock the block needs. Without sharding
+    there is one notes table and SQLite numbers the notes itself.
+    """
+
+    def __init__(self, block_size: int):
+        self.block_size = block_size
+        self._next = self._end = 0
+
+    async def take(self, count: int = 1):
+        """`count` unused note ids, or None when ids are left to the database."""
+        if SHARD_MODE == "off":
+            return None
+        ids = []
+        while len(ids) < count:
+            if self._next >= self._end:
+                size = max(self.block_size, count - len(ids))
+                async with AsyncSessionLocal() as db:
+                    # Never below the catalog's own notes, which may be numbered by SQLite (seeding, SHARD_MODE=off)
+                    end = await db.scalar(text(
+                        "UPDATE id_sequences SET next_id = MAX(next_id, (SELECT COALESCE(MAX(id), 0) + 1 FROM notes)) "
+                        "+ :size WHERE name = 'notes' RETURNING next_id"
+                    ), {"size": size})
+                    await db.commit()
+                self._next, self._end = end - size, end
+            taken = min(count - len(ids), self._end - self._next)
+            ids.extend(range(self._next, self._next + taken))
+            self._next += taken
+        return ids
+
+
+shard_engines = ShardEngines(SHARD_ENGINE_CACHE_SIZE)
+shard_router = ShardRouter(SHARD_PLACEMENT_TTL)
+note_ids = NoteIds(NOTE_ID_BLOCK_SIZE)
+
+
+@asynccontextmanager
+async def tenant_session(tenant_id: str):
+    """Session on the shard holding `tenant_id`'s notes (the catalog is attached); UnknownTenant if there's no such tenant."""
+    if not await shard_router.exists(tenant_id):
+        raise UnknownTenant(tenant_id)
+    shard = await shard_router.shard_for(tenant_id)
+    if shard == MAIN_SHARD:
+        session = AsyncSessionLocal()
+    else:
+        session = AsyncSession(await shard_engines.get(shard), autoflush=False, expire_on_commit=False)
+    async with session as db:
+        yield db
+
+async def shard_sessions():
+    """One session per existing shard in turn, for maintenance jobs."""
+    for name in shard_names():
+        if name == MAIN_SHARD:
+            session = AsyncSessionLocal()
+        else:
+            session = AsyncSession(await shard_engines.get(name), autoflush=False, expire_on_commit=False)
+        async with session as db:
+            yield db
+
+
+# Moving tenants (sync, run from the CLI)
+
+def _rows_in(conn, table, column, ids):
+    from models.note_sqlite import Note
+
+    columns = [
+        type_coerce(column_, Text).label(column_.name) if table is Note.__table__ and column_.name == "content"
+        else column_
+        for column_ in table.c
+    ]
+    return [row._asdict() for row in conn.execute(select(*columns).where(column.in_(ids)))]
+
+def _copy_notes(src, dst, tenant_id: str, ids):
+    """Replace the given notes (and their revisions and index rows) in dst with src's."""
+    from models.note_revision_sqlite import NoteRevision
+    from models.note_sqlite import Note
+
+    notes, revisions = Note.__table__, NoteRevision.__table__
+    fts = text("SELECT rowid AS id, tenant_key, title, content FROM notes_fts WHERE rowid IN (SELECT value FROM json_each(:ids))")
+    for start in range(0, len(ids), MOVE_BATCH_SIZE):
+        chunk = ids[start:start + MOVE_BATCH_SIZE]
+        with src.connect() as conn:
+            note_rows = _rows_in(conn, notes, notes.c.id, chunk)
+            revision_rows = _rows_in(conn, revisions, revisions.c.note_id, [row["id"] for row in note_rows])
+            fts_rows = [row._asdict() for row in conn.execute(fts, {"ids": str(chunk)})]
+        with dst.begin() as conn:
+            taken = conn.scalar(
+                select(func.count()).select_from(notes)
+                .where(notes.c.id.in_([row["id"] for row in note_rows]), notes.c.tenant_id != tenant_id)
+            )
+            # Only possible for ids from before the catalog sequence (migration 0014)
+            if taken:
+                raise ShardMoveError(f"{taken} note ids are already used by other tenants on the target shard")
+            conn.execute(delete(notes).where(notes.c.id.in_(chunk)))
+            conn.execute(delete(revisions).where(revisions.c.note_id.in_(chunk)))
+            conn.execute(text("DELETE FROM notes_fts WHERE rowid IN (SELECT value FROM json_each(:ids))"),
+                         {"ids": str(chunk)})
+            if note_rows:
+                conn.execute(insert(notes), note_rows)
+            if revision_rows:
+                conn.execute(insert(revisions), revision_rows)
+            if fts_rows:
+                conn.execute(text("INSERT INTO notes_fts (rowid, tenant_key, title, content) "
+                                  "VALUES (:id, :tenant_key, :title, :content)"), fts_rows)
+
+def _copy_changes(src, dst, tenant_id: str, since: int):
+    from models.note_change_sqlite import NoteChange
+
+    changes = NoteChange.__table__
+    with src.connect() as conn:
+        rows = [row._asdict() for row in conn.execute(
+            select(changes).where(changes.c.tenant_id == tenant_id, changes.c.version > since)
+        )]
+    with dst.begin() as conn:
+        for start in range(0, len(rows), MOVE_BATCH_SIZE):
+            chunk = rows[start:start + MOVE_BATCH_SIZE]
+            conn.execute(delete(changes).where(
+                changes.c.tenant_id == tenant_id, changes.c.note_id.in_([row["note_id"] for row in chunk])
+            ))
+            conn.execute(insert(changes), chunk)
+    return [row["note_id"] for row in rows]
+
+def _current_version(conn, tenant_id: str) -> int:
+    from models.tenant_version_sqlite import TenantVersion
+
+    return conn.scalar(select(TenantVersion.version).where(TenantVersion.tenant_id == tenant_id)) or 0
+
+def _purge(conn, tenant_id: str, keep_versions: bool = True):
+    from models.note_change_sqlite import NoteChange
+    from models.note_revision_sqlite import NoteRevision
+    from models.note_sqlite import Note
+    from models.tenant_usage_sqlite import TenantUsage
+    from models.tenant_version_sqlite import TenantVersion
+    from services.search_sqlite import FTS_DELETE_TENANT, tenant_match
+
+    note_ids = select(Note.id).where(Note.tenant_id == tenant_id)
+    conn.execute(delete(NoteRevision.__table__).where(NoteRevision.note_id.in_(note_ids)))
+    conn.execute(FTS_DELETE_TENANT, {"match": tenant_match(tenant_id)})
+    conn.execute(delete(Note.__table__).where(Note.tenant_id == tenant_id))
+    conn.execute(delete(NoteChange.__table__).where(NoteChange.tenant_id == tenant_id))
+    conn.execute(delete(TenantUsage.__table__).where(TenantUsage.tenant_id == tenant_id))
+    for table in stats_tables():
+        conn.execute(delete(table).where(table.c.tenant_id == tenant_id))
+    if not keep_versions:
+        conn.execute(delete(TenantVersion.__table__).where(TenantVersion.tenant_id == tenant_id))
+
+def _set_fence(conn, tenant_id: str, target):
+    from models.tenant_version_sqlite import TenantVersion
+
+    fenced = conn.execute(
+        update(TenantVersion.__table__).where(TenantVersion.tenant_id == tenant_id).values(moved_to=target)
+    ).rowcount
+    if not fenced and target is not None:
+        conn.execute(insert(TenantVersion.__table__).values(
+            tenant_id=tenant_id, version=0, pruned_through=0, moved_to=target
+        ))
+
+def _place(tenant_id: str, shard: str):
+    from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+    from models.tenant_shard_sqlite import TenantShard
+
+    stmt = sqlite_insert(TenantShard.__table__).values(tenant_id=tenant_id, shard=shard)
+    with engine.begin() as conn:
+        conn.execute(stmt.on_conflict_do_update(
+            index_elements=["tenant_id"], set_={"shard": shard, "movedAt": func.current_timestamp()}
+        ))
+
+def current_shard(tenant_id: str) -> str:
+    from models.tenant_shard_sqlite import TenantShard
+
+    with engine.connect() as conn:
+        placed = conn.scalar(select(TenantShard.shard).where(TenantShard.tenant_id == tenant_id))
+    return placed or default_shard(tenant_id)
+
+def move_tenant(tenant_id: str, target: str, keep_source: bool = False, log=print):
+    """Move a tenant's notes to `target` while it keeps serving; see the module docstring."""
+    from models.note_sqlite import Note
+    from models.tenant_usage_sqlite import TenantUsage
+    from models.tenant_version_sqlite import TenantVersion
+
+    if SHARD_MODE == "off":
+        raise ShardMoveError("SHARD_MODE is off; every tenant is in the main database")
+    source = current_shard(tenant_id)
+    if source == target:
+        raise ShardMoveError(f"Tenant {tenant_id} is already on {target}")
+    if target != MAIN_SHARD:
+        shard_path(target)
+    src, dst = sync_engine_for(source), sync_engine_for(target)
+    fenced = False
+    try:
+        with dst.begin() as conn:
+            _purge(conn, tenant_id)
+
+        # Bulk copy; anything written meanwhile is in the change log after `version`
+        with src.connect() as conn:
+            version = _current_version(conn, tenant_id)
+            ids = list(conn.scalars(select(Note.id).where(Note.tenant_id == tenant_id).order_by(Note.id)))
+        _copy_notes(src, dst, tenant_id, ids)
+        _copy_changes(src, dst, tenant_id, -1)
+        log(f"Copied {len(ids)} notes of {tenant_id} from {source} to {target}")
+
+        # Catch up until a round is small, so the fenced round is short
+        while True:
+            with src.connect() as conn:
+                latest = _current_version(conn, tenant_id)
+            changed = _copy_changes(src, dst, tenant_id, version)
+            _copy_notes(src, dst, tenant_id, changed)
+            version = latest
+            if len(changed) < MOVE_BATCH_SIZE // 10:
+                break
+
+        with src.begin() as conn:
+            _set_fence(conn, tenant_id, target)
+        fenced = True
+        _copy_notes(src, dst, tenant_id, _copy_changes(src, dst, tenant_id, version))
+        with src.connect() as conn:
+            versions = conn.execute(select(TenantVersion.version, TenantVersion.pruned_through)
+                                    .where(TenantVersion.tenant_id == tenant_id)).first()
+            usage = [row._asdict() for row in conn.execute(
+                select(TenantUsage.__table__).where(TenantUsage.tenant_id == tenant_id)
+            )]
+            stats = [
+                (table, [row._asdict() for row in conn.execute(select(table).where(table.c.tenant_id == tenant_id))])
+                for table in stats_tables()
+            ]
+        with dst.begin() as conn:
+            conn.execute(delete(TenantVersion.__table__).where(TenantVersion.tenant_id == tenant_id))
+            conn.execute(insert(TenantVersion.__table__).values(
+                tenant_id=tenant_id, version=versions.version, pruned_through=versions.pruned_through
+            ))
+            if usage:
+                conn.execute(insert(TenantUsage.__table__), usage)
+            for table, rows in stats:
+                conn.execute(delete(table).where(table.c.tenant_id == tenant_id))
+                if rows:
+                    conn.execute(insert(table), rows)
+        _place(tenant_id, target)
+        log(f"{tenant_id} now served from {target} (version {versions.version})")
+    except Exception:
+        if fenced:
+            with src.begin() as conn:
+                _set_fence(conn, tenant_id, None)
+        with dst.begin() as conn:
+            _purge(conn, tenant_id, keep_versions=not fenced)
+        raise
+
+    if not keep_source:
+        # Workers still routing to the source read its (frozen) copy until they reload
+        time.sleep(2 * SHARD_PLACEMENT_TTL)
+        with src.begin() as conn:
+            _purge(conn, tenant_id)
+        log(f"Removed {tenant_id}'s notes from {source}")
+    for shard_engine in (src, dst):
+        if shard_engine is not engine:
+            shard_engine.dispose()
+
+def pin_existing(log=print):
+    """Place every tenant with notes in the main database there, so enabling sharding hides nothing."""
+    from models.note_sqlite import Note
+    from models.tenant_shard_sqlite import TenantShard
+
+    db = SessionLocal()
+    try:
+        placed = set(db.scalars(select(TenantShard.tenant_id)))
+        tenants = [tenant for tenant in db.scalars(select(Note.tenant_id).distinct()) if tenant not in placed]
+    finally:
+        db.close()
+    for tenant_id in tenants:
+        _place(tenant_id, MAIN_SHARD)
+    log(f"Pinned {len(tenants)} tenants to {MAIN_SHARD}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tenant shard placement")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="shards and how many notes each holds")
+    where = commands.add_parser("where", help="shard serving a tenant")
+    where.add_argument("tenant")
+    commands.add_parser("pin", help="keep tenants with notes in the main database there")
+    move = commands.add_parser("move", help="move a tenant to another shard online")
+    move.add_argument("tenant")
+    move.add_argument("shard")
+    move.add_argument("--keep-source", action="store_true", help="leave the old copy in place")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for name in shard_names():
+            with shard_sync_session(name) as db:
+                rows = db.execute(text("SELECT tenant_id, count(*) FROM notes GROUP BY tenant_id")).all()
+            print(f"{name}: " + ", ".join(f"{tenant}={count}" for tenant, count in rows))
+    elif args.command == "where":
+        print(current_shard(args.tenant))
+    elif args.command == "pin":
+        pin_existing()
+    else:
+        move_tenant(args.tenant, args.shard, keep_source=args.keep_source)
@@ -0,0 +1,258 @@
+"""
+Token service: the one place JWTs are signed and verified.
+
+Access tokens carry everything get_current_user needs (tenant, role, plans and
+the user's token_version), so most requests are authorized from the verified
+claims without a database round-trip. Refresh tokens are long-lived and are
+checked against users.token_version, which is bumped to revoke them. Access
+tokens are short-lived; a revoked or changed user or tenant is stamped in the
+catalog (token_stamps), and every worker re-reads the stamps at most every
+TOKEN_STAMPS_SYNC_SECONDS, so older tokens go back to the database from then on.
+
+HS* algorithms sign with SECRET_KEY. For RS*/ES*/EdDSA (needs pyjwt[crypto])
+put PEM private keys in JWT_KEYS_DIR as <kid>.pem: JWT_ACTIVE_KID (default: the
+newest file) signs, every key in the directory verifies, and the directory is
+re-read every JWT_KEYS_REFRESH_SECONDS so keys rotate without a restart.
+Public-only PEMs (retired keys) still verify; GET /auth/jwks publishes them.
+"""
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+import jwt
+import core.config  # noqa: F401 (reads .env before the settings below)
+from core.principal_cache import Principal, principal_cache
+
+SECRET_KEY = os.getenv("SECRET_KEY", "supersecretjwtkey")
+ALGORITHM = os.getenv("ALGORITHM", "HS256")
+JWT_KEYS_DIR = os.getenv("JWT_KEYS_DIR", "")
+JWT_ACTIVE_KID = os.getenv("JWT_ACTIVE_KID", "")
+JWT_KEYS_REFRESH_SECONDS = float(os.getenv("JWT_KEYS_REFRESH_SECONDS", "300"))
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
+TOKEN_STAMPS_SYNC_SECONDS = float(os.getenv("TOKEN_STAMPS_SYNC_SECONDS", "2"))
+
+ACCESS_TOKEN_TTL = ACCESS_TOKEN_EXPIRE_MINUTES * 60
+REFRESH_TOKEN_TTL = REFRESH_TOKEN_EXPIRE_DAYS * 86400
+SYMMETRIC_KID = "hs"
+
+
+class KeySet:
+    """Parsed signing/verification keys, reloaded from disk at most every `refresh_seconds`."""
+
+    def __init__(self, algorithm: str, secret: str, keys_dir: str, active_kid: str, refresh_seconds: float):
+        self.algorithm = algorithm
+        self.secret = secret
+        self.keys_dir = keys_dir
+        self.active_kid = active_kid
+        self.refresh_seconds = refresh_seconds
+        self._signing = None
+        self._verifying = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def symmetric(self) -> bool:
+        return self.algorithm.startswith("HS")
+
+    def _load(self):
+        if self.symmetric:
+            return (SYMMETRIC_KID, self.secret), {SYMMETRIC_KID: self.secret}
+
+        from cryptography.hazmat.primitives.serialization import load_pem_private_key, load_pem_public_key
+
+        if not self.keys_dir:
+            raise RuntimeError(f"{self.algorithm} tokens need JWT_KEYS_DIR with <kid>.pem keys")
+        private, verifying = {}, {}
+        paths = sorted(Path(self.keys_dir).glob("*.pem"), key=lambda path: path.stat().st_mtime)
+        for path in paths:
+            data = path.read_bytes()
+            if b"PRIVATE KEY" in data:
+                private[path.stem] = load_pem_private_key(data, password=None)
+                verifying[path.stem] = private[path.stem].public_key()
+            else:
+                verifying[path.stem] = load_pem_public_key(data)
+        kid = self.active_kid or (list(private)[-1] if private else None)
+        if kid not in private:
+            raise RuntimeError(f"No private key for active kid {kid!r} in {self.keys_dir}")
+        return (kid, private[kid]), verifying
+
+    def _refresh(self, force: bool = False):
+        now = time.monotonic()
+        if self._signing and now - self._loaded_at < (1.0 if force else self.refresh_seconds):
+            return
+        with self._lock:
+            self._signing, self._verifying = self._load()
+            self._loaded_at = now
+
+    def signing_key(self):
+        self._refresh()
+        return self._signing
+
+    def verification_key(self, kid: Optional[str]):
+        self._refresh()
+        if self.symmetric:
+            # Tokens issued before key ids were added have no kid
+            return self._verifying[SYMMETRIC_KID] if kid in (None, SYMMETRIC_KID) else None
+        if kid not in self._verifying:
+            # Possibly rotated in by another worker since our last load
+            self._refresh(force=True)
+        return self._verifying.get(kid)
+
+    def jwks(self):
+        if self.symmetric:
+            return {"keys": []}
+        self._refresh()
+        algorithm = jwt.get_algorithm_by_name(self.algorithm)
+        keys = []
+        for kid, key in self._verifying.items():
+            jwk = json.loads(algorithm.to_jwk(key))
+            keys.append({**jwk, "kid": kid, "alg": self.algorithm, "use": "sig"})
+        return {"keys": keys}
+
+
+keys = KeySet(ALGORITHM, SECRET_KEY, JWT_KEYS_DIR, JWT_ACTIVE_KID, JWT_KEYS_REFRESH_SECONDS)
+
+
+def encode_claims(claims: dict, ttl: int) -> str:
+    kid, key = keys.signing_key()
+    now = int(time.time())
+    return jwt.encode({**claims, "iat": now, "exp": now + ttl}, key, algorithm=ALGORITHM, headers={"kid": kid})
+
+def create_access_token(user, tenant_plan: Optional[str]) -> str:
+    return encode_claims({
+        "typ": "access",
+        "sub": user.username,
+        "uid": user.id,
+        "tenant_id": user.tenant_id,
+        "role": user.role,
+        "name": user.name,
+        "plan": user.plan,
+        "tenant_plan": tenant_plan,
+        "ver": user.token_version or 0,
+    }, ACCESS_TOKEN_TTL)
+
+def create_refresh_token(user) -> str:
+    return encode_claims({
+        "typ": "refresh",
+        "sub": user.username,
+        "ver": user.token_version or 0,
+        "jti": secrets.token_urlsafe(12),
+    }, REFRESH_TOKEN_TTL)
+
+def decode_token(token: str, token_type: str = "access") -> Optional[dict]:
+    try:
+        key = keys.verification_key(jwt.get_unverified_header(token).get("kid"))
+        if key is None:
+            return None
+        payload = jwt.decode(token, key, algorithms=[ALGORITHM])
+    except jwt.PyJWTError:
+        return None
+    # Tokens from before refresh tokens existed have no typ and are access tokens
+    if payload.get("typ", "access") != token_type:
+        return None
+    return payload
+
+def principal_from_claims(payload: dict) -> Optional[Principal]:
+    if "uid" not in payload or "ver" not in payload:
+        return None
+    return Principal(
+        id=payload["uid"],
+        username=payload["sub"],
+        role=payload["role"],
+        tenant_id=payload["tenant_id"],
+        name=payload.get("name", ""),
+        plan=payload["plan"],
+        tenant_plan=payload.get("tenant_plan"),
+    )
+
+
+class TokenStamps:
+    """Users and tenants changed after their access tokens were issued.
+
+    Entries older than the access-token lifetime are dropped, since every token
+    they could make stale has expired by then. The process that makes a change
+    records it at once; share() also writes it to the catalog, and sync() reads
+    the other workers' changes from there every `sync_seconds`.
+    """
+
+    # Stamps are written before their transaction commits, so each sync re-reads a few seconds back
+    SYNC_OVERLAP = 5.0
+
+    def __init__(self, ttl: float, sync_seconds: float):
+        self.ttl = ttl
+        self.sync_seconds = sync_seconds
+        self._users = OrderedDict()
+        self._tenants = OrderedDict()
+        self._lock = threading.Lock()
+        self._synced_at = None
+        self._syncing = False
+
+    def _record(self, entries, key, at: float = None) -> bool:
+        now = time.time()
+        at = now if at is None else at
+        with self._lock:
+            if entries.get(key, 0) >= at:
+                return False
+            entries[key] = at
+            entries.move_to_end(key)
+            while entries and next(iter(entries.values())) < now - self.ttl:
+                entries.popitem(last=False)
+            return True
+
+    def user_changed(self, username: str):
+        self._record(self._users, username)
+
+    def tenant_changed(self, tenant_id: str):
+        self._record(self._tenants, tenant_id)
+
+    def is_stale(self, payload: dict) -> bool:
+        # iat has one-second resolution, so a token from the same second counts as stale
+        issued_at = payload["iat"]
+        return (
+            self._users.get(payload["sub"], 0) >= issued_at - 1
+            or self._tenants.get(payload.get("tenant_id"), 0) >= issued_at - 1
+        )
+
+    async def share(self, db, users=(), tenants=()):
+        """Stamp users (by username) and tenants in the catalog, in the caller's transaction."""
+        from sqlalchemy import delete, insert
+        from models.token_stamp_sqlite import TokenStamp
+
+        now = time.time()
+        rows = [{"kind": "user", "key": key} for key in users] + [{"kind": "tenant", "key": key} for key in tenants]
+        for row in rows:
+            await db.execute(delete(TokenStamp).where(TokenStamp.kind == row["kind"], TokenStamp.key == row["key"]))
+        await db.execute(insert(TokenStamp), [{**row, "changedAt": now} for row in rows])
+        await db.execute(delete(TokenStamp).where(TokenStamp.changedAt < now - self.ttl))
+
+    async def sync(self, db):
+        """Pick up the stamps other workers shared, at most every `sync_seconds`."""
+        from sqlalchemy import select
+        from models.token_stamp_sqlite import TokenStamp
+
+        now = time.time()
+        if self._syncing or (self._synced_at is not None and now - self._synced_at < self.sync_seconds):
+            return
+        self._syncing = True
+        try:
+            since = now - self.ttl if self._synced_at is None else self._synced_at - self.SYNC_OVERLAP
+            rows = (await db.execute(
+                select(TokenStamp.kind, TokenStamp.key, TokenStamp.changedAt).where(TokenStamp.changedAt >= since)
+            )).all()
+            self._synced_at = now
+        finally:
+            self._syncing = False
+        for kind, key, at in rows:
+            # Principals cached on this worker before the change are stale too
+            if kind == "user" and self._record(self._users, key, at):
+                principal_cache.invalidate_user(key)
+            elif kind == "tenant" and self._record(self._tenants, key, at):
+                principal_cache.invalidate_tenant(key)
+
+
+token_stamps = TokenStamps(ACCESS_TOKEN_TTL, TOKEN_STAMPS_SYNC_SECONDS)
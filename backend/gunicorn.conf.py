@@ -0,0 +1,18 @@
+"""
+Pre-fork serving: gunicorn -c gunicorn.conf.py main:app
+(needs `pip install gunicorn uvicorn-worker`)
+
+The master imports the app once (preload_app) and forks the workers, so they
+start without re-importing it. Engines connect lazily and core.lifecycle
+drops any pooled connection a child inherits (os.register_at_fork). The
+lifespan, including the schema check and warm-up, runs in every worker.
+Run migrations first: python -m core.migrate_sqlite upgrade
+"""
+from core.config import settings
+
+bind = f"{settings.HOST}:{settings.PORT}"
+workers = settings.WEB_CONCURRENCY
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+# Longer than JOB_SHUTDOWN_GRACE, so running jobs can finish on reload
+graceful_timeout = 30
@@ -1,36 +1,104 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+# First, so .env is loaded before any module reads its settings
+from core.config import settings
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from routes import auth_sqlite, notes_sqlite, tenants_sqlite, users_sqlite
-import os
-from dotenv import load_dotenv
+from core.principal_cache import principal_cache
+from core.response_cache import response_cache
+from core.admission import TenantLimitMiddleware, limit_stats
+from core.database_sqlite import async_engine, database_stats, engine
+from core.compression import CompressionMiddleware
+from core.instrumentation import RequestMetricsMiddleware, instrument_engine
+from core.metrics import registry
+from core.serialization import FastJSONResponse
+from core.lifecycle import shutdown, startup
+from core.shards import TenantMoved, UnknownTenant, shard_engines, shard_router
 
-load_dotenv()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Once per worker: schema check, warm-up, job workers (see core.lifecycle)
+    await startup()
+    yield
+    await shutdown()
 
 app = FastAPI(
     title="Multi-Tenant Notes App",
     description="Notes app with tenant isolation, roles, and subscription plans",
-    version="1.0.0"
+    version=settings.VERSION,
+    default_response_class=FastJSONResponse,
+    lifespan=lifespan,
 )
 
-# Allow multiple frontend URLs from .env or default values for dev
-origins = os.getenv("FRONTEND_URL", "http://localhost:5173").split(",")
-
-# **DEBUG PRINT for verifying loaded CORS origins**
-print(f"Allowed CORS origins: {origins}")
+# Plan-based per-tenant/per-user rate limits and fair admission; inside CORS so
+# browsers can read the 429s
+app.add_middleware(TenantLimitMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=origins,  # Allow frontend origins for CORS
+    allow_origins=settings.CORS_ORIGINS,  # Allow frontend origins for CORS
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Sync-Cursor", "Server-Timing", "ETag"],
 )
 
+# Negotiated gzip/br/zstd; inside the metrics middleware so timings include it
+app.add_middleware(CompressionMiddleware)
+
+# Latency/status metrics and per-request SQL accounting
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+shard_engines.on_open(instrument_engine)
+app.add_middleware(RequestMetricsMiddleware)
+
+# A write raced a tenant move: reload placements, the client retries on the new shard
+@app.exception_handler(TenantMoved)
+async def tenant_moved(request: Request, exc: TenantMoved):
+    shard_router.invalidate()
+    return FastJSONResponse({"detail": "Tenant is being moved, retry shortly"}, status_code=503,
+                            headers={"Retry-After": "1"})
+
+@app.exception_handler(UnknownTenant)
+async def unknown_tenant(request: Request, exc: UnknownTenant):
+    return FastJSONResponse({"detail": "Tenant not found"}, status_code=404)
+
 # Health check endpoint
 @app.get("/health")
 async def health_check():
     return {"status": "ok"}
 
+# Principal cache hit/miss counters
+@app.get("/health/principal-cache")
+async def principal_cache_stats():
+    return principal_cache.stats()
+
+# Response cache hit rate, size and invalidations
+@app.get("/health/response-cache")
+async def response_cache_stats():
+    return response_cache.stats()
+
+# Open shard engines and cache churn
+@app.get("/health/shards")
+async def shard_stats():
+    return shard_engines.stats()
+
+# Rate limiter buckets and admission queue depth
+@app.get("/health/rate-limits")
+async def rate_limit_stats():
+    return limit_stats()
+
+# Connection pool checkout latency and saturation
+@app.get("/health/db")
+async def database_pool_stats():
+    return database_stats()
+
+# Prometheus scrape endpoint
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 # Register routers with appropriate prefixes and tags
 app.include_router(auth_sqlite.router, prefix="/auth", tags=["Auth"])
 app.include_router(notes_sqlite.router, prefix="/notes", tags=["Notes"])
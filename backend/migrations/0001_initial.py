@@ -0,0 +1,81 @@
+"""Initial schema: users, tenants, notes, plans, tenant_usage and search index.
+
+Frozen copy of the tables as create_all used to build them, so databases
+created before migrations existed are adopted without changes.
+"""
+from sqlalchemy import Column, Integer, MetaData, String, Table, Text, ForeignKey, select, text
+
+revision = "0001"
+down_revision = None
+
+metadata = MetaData()
+
+users = Table(
+    "users", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("username", String, unique=True, index=True, nullable=False),
+    Column("password", String, nullable=False),
+    Column("role", String),
+    Column("tenant_id", String, index=True),
+    Column("name", String),
+    Column("plan", String),
+)
+
+tenants = Table(
+    "tenants", metadata,
+    Column("id", String, primary_key=True, index=True),
+    Column("name", String, unique=True, index=True, nullable=False),
+    Column("plan", String),
+)
+
+notes = Table(
+    "notes", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("title", String, nullable=False),
+    Column("content", Text, nullable=False),
+    Column("owner", Integer, ForeignKey("users.id")),
+    Column("tenant_id", String, index=True),
+    Column("createdAt", String),
+    Column("updatedAt", String),
+)
+
+plans = Table(
+    "plans", metadata,
+    Column("id", String, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("max_notes", Integer, nullable=True),
+    Column("max_storage_bytes", Integer, nullable=True),
+    Column("max_members", Integer, nullable=True),
+)
+
+tenant_usage = Table(
+    "tenant_usage", metadata,
+    Column("tenant_id", String, primary_key=True),
+    Column("note_count", Integer, nullable=False),
+    Column("storage_bytes", Integer, nullable=False),
+    Column("member_count", Integer, nullable=False),
+)
+
+DEFAULT_PLANS = [
+    {"id": "free", "name": "Free", "max_notes": 3, "max_storage_bytes": None, "max_members": None},
+    {"id": "pro", "name": "Pro", "max_notes": None, "max_storage_bytes": None, "max_members": None},
+]
+
+
+def upgrade(engine):
+    with engine.begin() as conn:
+        metadata.create_all(conn, checkfirst=True)
+        if conn.dialect.name == "postgresql":
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_notes_search ON notes USING GIN "
+                "(to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(content, '')))"
+            ))
+        else:
+            conn.execute(text(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5("
+                "title, content, tenant_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2')"
+            ))
+        existing = set(conn.execute(select(plans.c.id)).scalars())
+        missing = [plan for plan in DEFAULT_PLANS if plan["id"] not in existing]
+        if missing:
+            conn.execute(plans.insert(), missing)
@@ -0,0 +1,102 @@
+"""Composite indexes on notes/users and typed note timestamps.
+
+Indexes are built without blocking readers (CONCURRENTLY on Postgres, WAL
+readers on SQLite) and timestamps are backfilled in small committed batches,
+so this runs against a live database. SQLite keeps the column declarations
+as they are (its columns are not strictly typed); values are normalized to
+SQLAlchemy's DateTime format and a trigger supplies the server-side default.
+On Postgres the final type change still rewrites the notes table.
+"""
+from datetime import datetime
+from sqlalchemy import text
+
+revision = "0002"
+down_revision = "0001"
+
+BATCH_SIZE = 2000
+
+CREATE_INDEXES = [
+    ("ix_notes_tenant_updated", 'notes (tenant_id, "updatedAt" DESC, id DESC)'),
+    ("ix_notes_tenant_owner", "notes (tenant_id, owner)"),
+    ("ix_users_tenant_role", "users (tenant_id, role)"),
+]
+# Left-prefixes of the composite indexes above
+DROP_INDEXES = ["ix_notes_tenant_id", "ix_users_tenant_id"]
+
+SQLITE_NOW = "strftime('%Y-%m-%d %H:%M:%f000', 'now')"
+
+
+def _normalize(value, fallback):
+    if value is None or value == "":
+        return fallback
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+def _backfill_timestamps(engine):
+    now = datetime.utcnow()
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                text('SELECT id, "createdAt", "updatedAt" FROM notes WHERE id > :last ORDER BY id LIMIT :batch'),
+                {"last": last_id, "batch": BATCH_SIZE},
+            ).all()
+            if not rows:
+                return
+            updates = []
+            for note_id, created, updated in rows:
+                created_at = _normalize(created, now)
+                updated_at = _normalize(updated, created_at)
+                updates.append({
+                    "id": note_id,
+                    "created": created_at.strftime("%Y-%m-%d %H:%M:%S.%f"),
+                    "updated": updated_at.strftime("%Y-%m-%d %H:%M:%S.%f"),
+                })
+            conn.execute(
+                text('UPDATE notes SET "createdAt" = :created, "updatedAt" = :updated WHERE id = :id'),
+                updates,
+            )
+        last_id = rows[-1][0]
+
+def _upgrade_sqlite(engine):
+    with engine.begin() as conn:
+        for name, target in CREATE_INDEXES:
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {target}"))
+        conn.execute(text(
+            "CREATE TRIGGER IF NOT EXISTS notes_default_timestamps AFTER INSERT ON notes "
+            'WHEN NEW."createdAt" IS NULL OR NEW."updatedAt" IS NULL BEGIN '
+            f'UPDATE notes SET "createdAt" = coalesce(NEW."createdAt", {SQLITE_NOW}), '
+            f'"updatedAt" = coalesce(NEW."updatedAt", NEW."createdAt", {SQLITE_NOW}) '
+            "WHERE id = NEW.id; END"
+        ))
+    _backfill_timestamps(engine)
+    with engine.begin() as conn:
+        for name in DROP_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        conn.execute(text("ANALYZE"))
+
+def _upgrade_postgresql(engine):
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for name, target in CREATE_INDEXES:
+            conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {target}"))
+    # The type change rewrites the table; backfill first so it only converts clean values
+    _backfill_timestamps(engine)
+    with engine.begin() as conn:
+        for column in ("createdAt", "updatedAt"):
+            conn.execute(text(
+                f'ALTER TABLE notes ALTER COLUMN "{column}" TYPE TIMESTAMP USING "{column}"::timestamp, '
+                f'ALTER COLUMN "{column}" SET DEFAULT CURRENT_TIMESTAMP, '
+                f'ALTER COLUMN "{column}" SET NOT NULL'
+            ))
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for name in DROP_INDEXES:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        conn.execute(text("ANALYZE notes"))
+        conn.execute(text("ANALYZE users"))
+
+def upgrade(engine):
+    if engine.dialect.name == "postgresql":
+        _upgrade_postgresql(engine)
+    else:
+        _upgrade_sqlite(engine)
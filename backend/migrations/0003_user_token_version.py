@@ -0,0 +1,12 @@
+"""Per-user token_version, embedded in tokens and bumped to revoke them."""
+from sqlalchemy import inspect, text
+
+revision = "0003"
+down_revision = "0002"
+
+
+def upgrade(engine):
+    if "token_version" in {column["name"] for column in inspect(engine).get_columns("users")}:
+        return
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE users ADD COLUMN token_version INTEGER NOT NULL DEFAULT 0"))
@@ -0,0 +1,31 @@
+"""Per-tenant change versions and the note change log behind /notes/changes."""
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, String, Table, text
+
+revision = "0004"
+down_revision = "0003"
+
+metadata = MetaData()
+
+tenant_versions = Table(
+    "tenant_versions", metadata,
+    Column("tenant_id", String, primary_key=True),
+    Column("version", Integer, nullable=False, server_default="0"),
+    Column("pruned_through", Integer, nullable=False, server_default="0"),
+)
+
+note_changes = Table(
+    "note_changes", metadata,
+    Column("tenant_id", String, primary_key=True),
+    Column("note_id", Integer, primary_key=True),
+    Column("version", Integer, nullable=False),
+    Column("deleted", Integer, nullable=False, server_default="0"),
+    Column("changedAt", DateTime, nullable=False, server_default=text("CURRENT_TIMESTAMP")),
+)
+Index("ix_note_changes_tenant_version", note_changes.c.tenant_id, note_changes.c.version, note_changes.c.note_id)
+
+
+def upgrade(engine):
+    # Existing notes need no log rows: clients start from a full list, which
+    # returns the sync cursor to continue from
+    with engine.begin() as conn:
+        metadata.create_all(conn, checkfirst=True)
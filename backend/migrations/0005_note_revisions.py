@@ -0,0 +1,49 @@
+"""Note revision history (snapshots + deltas) and per-plan revision retention."""
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, Text, inspect, text
+
+revision = "0005"
+down_revision = "0004"
+
+metadata = MetaData()
+
+note_revisions = Table(
+    "note_revisions", metadata,
+    Column("note_id", Integer, primary_key=True),
+    Column("revision", Integer, primary_key=True),
+    Column("base_revision", Integer, nullable=False),
+    Column("kind", String, nullable=False),
+    Column("title", String, nullable=False),
+    Column("data", Text, nullable=False),
+    Column("size", Integer, nullable=False),
+    Column("editor", Integer, nullable=True),
+    Column("createdAt", DateTime, nullable=False, server_default=text("CURRENT_TIMESTAMP")),
+)
+
+PLAN_COLUMNS = {
+    "revision_limit": "INTEGER",
+    "revision_retention_days": "INTEGER",
+    "revision_snapshot_every": "INTEGER NOT NULL DEFAULT 20",
+}
+
+PLAN_POLICIES = {
+    "free": {"revision_limit": 10, "revision_retention_days": 30, "revision_snapshot_every": 10},
+    "pro": {"revision_limit": 200, "revision_retention_days": None, "revision_snapshot_every": 20},
+}
+
+
+def upgrade(engine):
+    existing = {column["name"] for column in inspect(engine).get_columns("plans")}
+    with engine.begin() as conn:
+        metadata.create_all(conn, checkfirst=True)
+        for name, ddl in PLAN_COLUMNS.items():
+            if name not in existing:
+                conn.execute(text(f"ALTER TABLE plans ADD COLUMN {name} {ddl}"))
+        for plan_id, policy in PLAN_POLICIES.items():
+            conn.execute(
+                text(
+                    "UPDATE plans SET revision_limit = :revision_limit, "
+                    "revision_retention_days = :revision_retention_days, "
+                    "revision_snapshot_every = :revision_snapshot_every WHERE id = :id"
+                ),
+                {**policy, "id": plan_id},
+            )
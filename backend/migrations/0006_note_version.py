@@ -0,0 +1,12 @@
+"""Per-note version for optimistic concurrency on updates."""
+from sqlalchemy import inspect, text
+
+revision = "0006"
+down_revision = "0005"
+
+
+def upgrade(engine):
+    if "version" in {column["name"] for column in inspect(engine).get_columns("notes")}:
+        return
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE notes ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
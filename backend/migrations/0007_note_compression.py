@@ -0,0 +1,46 @@
+"""Per-tenant zstd dictionaries; compresses existing note bodies when NOTE_COMPRESSION is on."""
+from sqlalchemy import Column, DateTime, Index, Integer, LargeBinary, MetaData, String, Table, text
+
+revision = "0007"
+down_revision = "0006"
+
+metadata = MetaData()
+
+BATCH_SIZE = 500
+
+compression_dicts = Table(
+    "compression_dicts", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("tenant_id", String, nullable=False),
+    Column("data", LargeBinary, nullable=False),
+    Column("sample_count", Integer, nullable=False),
+    Column("createdAt", DateTime, nullable=False, server_default=text("CURRENT_TIMESTAMP")),
+    Index("ix_compression_dicts_tenant", "tenant_id", "id"),
+)
+
+
+def upgrade(engine):
+    from core.content_codec import NOTE_COMPRESSION, compress
+
+    with engine.begin() as conn:
+        metadata.create_all(conn, checkfirst=True)
+    if NOTE_COMPRESSION == "off" or engine.dialect.name != "sqlite":
+        return
+    # No dictionaries exist yet. Batched and conditional on each note's version, so the app can keep serving
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(text(
+                "SELECT id, version, content FROM notes "
+                "WHERE typeof(content) = 'text' AND id > :last ORDER BY id LIMIT :size"
+            ), {"last": last_id, "size": BATCH_SIZE}).all()
+            if not rows:
+                return
+            updates = []
+            for row in rows:
+                stored = compress(row.content)
+                if isinstance(stored, bytes):
+                    updates.append({"id": row.id, "version": row.version, "content": stored})
+            if updates:
+                conn.execute(text("UPDATE notes SET content = :content WHERE id = :id AND version = :version"), updates)
+        last_id = rows[-1].id
@@ -0,0 +1,22 @@
+"""Tenant shard placements in the catalog and the moved-tenant write fence."""
+from sqlalchemy import Column, DateTime, MetaData, String, Table, inspect, text
+
+revision = "0008"
+down_revision = "0007"
+
+metadata = MetaData()
+
+tenant_shards = Table(
+    "tenant_shards", metadata,
+    Column("tenant_id", String, primary_key=True),
+    Column("shard", String, nullable=False),
+    Column("movedAt", DateTime, nullable=False, server_default=text("CURRENT_TIMESTAMP")),
+)
+
+
+def upgrade(engine):
+    existing = {column["name"] for column in inspect(engine).get_columns("tenant_versions")}
+    with engine.begin() as conn:
+        metadata.create_all(conn, checkfirst=True)
+        if "moved_to" not in existing:
+            conn.execute(text("ALTER TABLE tenant_versions ADD COLUMN moved_to VARCHAR"))
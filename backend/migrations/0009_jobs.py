@@ -0,0 +1,34 @@
+"""Durable background job queue."""
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, String, Table, Text, text
+
+revision = "0009"
+down_revision = "0008"
+
+metadata = MetaData()
+
+jobs = Table(
+    "jobs", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("kind", String, nullable=False),
+    Column("payload", Text, nullable=False),
+    Column("priority", Integer, nullable=False),
+    Column("tenant_id", String, nullable=True),
+    Column("status", String, nullable=False),
+    Column("attempts", Integer, nullable=False),
+    Column("max_attempts", Integer, nullable=False),
+    Column("idempotency_key", String, nullable=True),
+    Column("last_error", Text, nullable=True),
+    Column("runAt", DateTime, nullable=False, server_default=text("CURRENT_TIMESTAMP")),
+    Column("lockedUntil", DateTime, nullable=True),
+    Column("createdAt", DateTime, nullable=False, server_default=text("CURRENT_TIMESTAMP")),
+    Column("startedAt", DateTime, nullable=True),
+    Column("finishedAt", DateTime, nullable=True),
+    Index("ix_jobs_claim", "status", "priority", "runAt"),
+    Index("ix_jobs_idempotency_key", "idempotency_key", unique=True),
+    Index("ix_jobs_tenant", "tenant_id", "id"),
+)
+
+
+def upgrade(engine):
+    with engine.begin() as conn:
+        metadata.create_all(conn, checkfirst=True)
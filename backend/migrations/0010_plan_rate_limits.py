@@ -0,0 +1,37 @@
+"""Per-plan request rate limits and fair-share weights."""
+from sqlalchemy import inspect, text
+
+revision = "0010"
+down_revision = "0009"
+
+PLAN_COLUMNS = {
+    "rate_per_minute": "INTEGER",
+    "rate_burst": "INTEGER",
+    "user_rate_per_minute": "INTEGER",
+    "user_rate_burst": "INTEGER",
+    "fair_share_weight": "INTEGER NOT NULL DEFAULT 1",
+}
+
+PLAN_POLICIES = {
+    "free": {"rate_per_minute": 600, "rate_burst": 120, "user_rate_per_minute": 300, "user_rate_burst": 60,
+             "fair_share_weight": 1},
+    "pro": {"rate_per_minute": 6000, "rate_burst": 1000, "user_rate_per_minute": 1200, "user_rate_burst": 200,
+            "fair_share_weight": 4},
+}
+
+
+def upgrade(engine):
+    existing = {column["name"] for column in inspect(engine).get_columns("plans")}
+    with engine.begin() as conn:
+        for name, ddl in PLAN_COLUMNS.items():
+            if name not in existing:
+                conn.execute(text(f"ALTER TABLE plans ADD COLUMN {name} {ddl}"))
+        for plan_id, policy in PLAN_POLICIES.items():
+            conn.execute(
+                text(
+                    "UPDATE plans SET rate_per_minute = :rate_per_minute, rate_burst = :rate_burst, "
+                    "user_rate_per_minute = :user_rate_per_minute, user_rate_burst = :user_rate_burst, "
+                    "fair_share_weight = :fair_share_weight WHERE id = :id"
+                ),
+                {**policy, "id": plan_id},
+            )
@@ -0,0 +1,73 @@
+"""Hourly and daily tenant activity rollups, with a backfill of existing notes."""
+import json
+from datetime import datetime
+from sqlalchemy import Column, Date, DateTime, Integer, MetaData, String, Table, column, table, text
+
+revision = "0011"
+down_revision = "0010"
+
+metadata = MetaData()
+
+COUNTER_COLUMNS = ("notes_created", "notes_updated", "notes_deleted", "storage_delta")
+
+
+def _counters():
+    return [Column(name, Integer, nullable=False) for name in COUNTER_COLUMNS]
+
+Table(
+    "tenant_stats_hourly", metadata,
+    Column("tenant_id", String, primary_key=True),
+    Column("hour", DateTime, primary_key=True),
+    *_counters(),
+)
+Table(
+    "tenant_stats_daily", metadata,
+    Column("tenant_id", String, primary_key=True),
+    Column("day", Date, primary_key=True),
+    *_counters(),
+    Column("active_authors", Integer, nullable=False),
+)
+Table(
+    "tenant_stats_authors", metadata,
+    Column("tenant_id", String, primary_key=True),
+    Column("day", Date, primary_key=True),
+    Column("user_id", Integer, primary_key=True),
+)
+backfill = Table(
+    "tenant_stats_backfill", metadata,
+    Column("tenant_id", String, primary_key=True),
+    Column("through_id", Integer, nullable=False),
+    Column("cursor", Integer, nullable=False),
+    Column("createdAt", DateTime, nullable=False),
+    Column("finishedAt", DateTime, nullable=True),
+)
+# Created by 0009; only the columns written here
+jobs = table(
+    "jobs", column("kind"), column("payload"), column("priority"), column("tenant_id"), column("status"),
+    column("attempts"), column("max_attempts"), column("idempotency_key"),
+    column("runAt", DateTime), column("createdAt", DateTime),
+)
+
+
+def upgrade(engine):
+    # Writes from here on are counted as they happen; notes up to each tenant's
+    # newest id are left to a stats.backfill job (low lane, see services.stats_sqlite)
+    if engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        metadata.create_all(conn, checkfirst=True)
+        tenants = conn.execute(text(
+            "SELECT tenant_id, MAX(id) FROM notes WHERE tenant_id IS NOT NULL GROUP BY tenant_id"
+        )).all()
+        for tenant_id, through_id in tenants:
+            conn.execute(insert(backfill).values(
+                tenant_id=tenant_id, through_id=through_id, cursor=0, createdAt=now,
+            ).on_conflict_do_nothing(index_elements=["tenant_id"]))
+            conn.execute(insert(jobs).values(
+                kind="stats.backfill", payload=json.dumps({"tenant_id": tenant_id}), priority=2,
+                tenant_id=tenant_id, status="queued", attempts=0, max_attempts=5,
+                idempotency_key=f"stats.backfill:{tenant_id}:0", runAt=now, createdAt=now,
+            ).on_conflict_do_nothing(index_elements=["idempotency_key"]))
@@ -0,0 +1,49 @@
+"""Search index keyed by tenant, so searches only read the caller's tenant's postings."""
+from sqlalchemy import text
+
+revision = "0012"
+down_revision = "0011"
+
+# As of this revision; services.search_sqlite keeps the live definitions
+FTS_DDL = (
+    "CREATE VIRTUAL TABLE notes_fts USING fts5("
+    "tenant_key, title, content, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+)
+# tenant_key is 't' and the id's UTF-8 bytes in lowercase hex
+FTS_FILL = (
+    "INSERT INTO notes_fts (rowid, tenant_key, title, content) "
+    "SELECT id, 't' || lower(hex(tenant_id)), title, content FROM notes WHERE typeof(content) != 'blob'"
+)
+FTS_INSERT = "INSERT INTO notes_fts (rowid, tenant_key, title, content) VALUES (:id, :tenant_key, :title, :content)"
+BATCH_SIZE = 5000
+
+
+def upgrade(engine):
+    # Postgres searches the notes table directly; nothing to do there
+    if engine.dialect.name != "sqlite":
+        return
+    from core.content_codec import decompress
+
+    with engine.begin() as conn:
+        ddl = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'notes_fts'")).scalar()
+        if ddl is None or "tenant_key" in ddl:
+            return
+        conn.execute(text("DROP TABLE notes_fts"))
+        conn.execute(text(FTS_DDL))
+        conn.execute(text(FTS_FILL))
+        # Compressed bodies (0007) are indexed as text
+        last_id = 0
+        while True:
+            rows = conn.execute(text(
+                "SELECT id, tenant_id, title, content FROM notes "
+                "WHERE typeof(content) = 'blob' AND id > :last ORDER BY id LIMIT :size"
+            ), {"last": last_id, "size": BATCH_SIZE}).all()
+            if not rows:
+                break
+            conn.execute(text(FTS_INSERT), [
+                {"id": row.id, "tenant_key": None if row.tenant_id is None else "t" + row.tenant_id.encode().hex(),
+                 "title": row.title, "content": decompress(row.content)}
+                for row in rows
+            ])
+            last_id = rows[-1].id
+        conn.execute(text("INSERT INTO notes_fts (notes_fts) VALUES ('optimize')"))
@@ -0,0 +1,20 @@
+"""Token revocation stamps shared by all workers."""
+from sqlalchemy import Column, Float, Index, MetaData, String, Table
+
+revision = "0013"
+down_revision = "0012"
+
+metadata = MetaData()
+
+Table(
+    "token_stamps", metadata,
+    Column("kind", String, primary_key=True),
+    Column("key", String, primary_key=True),
+    Column("changedAt", Float, nullable=False),
+    Index("ix_token_stamps_changed", "changedAt"),
+)
+
+
+def upgrade(engine):
+    with engine.begin() as conn:
+        metadata.create_all(conn, checkfirst=True)
@@ -0,0 +1,24 @@
+"""Catalog sequence for note ids, unique across shards so moved tenants keep theirs."""
+from sqlalchemy import Column, Integer, MetaData, String, Table, text
+
+revision = "0014"
+down_revision = "0013"
+
+metadata = MetaData()
+
+Table(
+    "id_sequences", metadata,
+    Column("name", String, primary_key=True),
+    Column("next_id", Integer, nullable=False),
+)
+
+
+def upgrade(engine):
+    # Shard files raise it past their own notes when they are opened (core.shards.create_shard_schema)
+    with engine.begin() as conn:
+        metadata.create_all(conn, checkfirst=True)
+        conn.execute(text(
+            "INSERT INTO id_sequences (name, next_id) "
+            "SELECT 'notes', COALESCE(MAX(id), 0) + 1 FROM notes "
+            "WHERE NOT EXISTS (SELECT 1 FROM id_sequences WHERE name = 'notes')"
+        ))
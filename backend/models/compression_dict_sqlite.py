@@ -0,0 +1,16 @@
+from sqlalchemy import Column, DateTime, Index, Integer, LargeBinary, String
+from core.database_sqlite import Base, utcnow
+
+class CompressionDict(Base):
+    __tablename__ = "compression_dicts"
+    # Stored in every value compressed with it, so a row is never rewritten or reused
+    id = Column(Integer, primary_key=True)
+    tenant_id = Column(String, nullable=False)
+    data = Column(LargeBinary, nullable=False)
+    sample_count = Column(Integer, nullable=False)
+    createdAt = Column(DateTime, nullable=False, server_default=utcnow())
+
+    __table_args__ = (
+        # A tenant's newest dictionary is the one new writes use
+        Index("ix_compression_dicts_tenant", tenant_id, id),
+    )
@@ -0,0 +1,8 @@
+from sqlalchemy import Column, Integer, String
+from core.database_sqlite import Base
+
+class IdSequence(Base):
+    """Next id to hand out, for ids that must be unique across shards (catalog only); see core.shards.NoteIds."""
+    __tablename__ = "id_sequences"
+    name = Column(String, primary_key=True)
+    next_id = Column(Integer, nullable=False)
@@ -0,0 +1,31 @@
+from sqlalchemy import Column, DateTime, Index, Integer, String, Text
+from core.database_sqlite import Base, utcnow
+
+class Job(Base):
+    """Deferred work item (catalog only); see core.jobs."""
+    __tablename__ = "jobs"
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    payload = Column(Text, nullable=False, default="{}")
+    # Lane rank: 0 high, 1 default, 2 low
+    priority = Column(Integer, nullable=False, default=1)
+    tenant_id = Column(String, nullable=True)
+    # queued, running, done or failed
+    status = Column(String, nullable=False, default="queued")
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    idempotency_key = Column(String, nullable=True)
+    last_error = Column(Text, nullable=True)
+    runAt = Column(DateTime, nullable=False, server_default=utcnow())
+    # Lease of a running job; an expired lease makes it claimable again
+    lockedUntil = Column(DateTime, nullable=True)
+    createdAt = Column(DateTime, nullable=False, server_default=utcnow())
+    startedAt = Column(DateTime, nullable=True)
+    finishedAt = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # Claim order: lane, then due time
+        Index("ix_jobs_claim", status, priority, runAt),
+        Index("ix_jobs_idempotency_key", idempotency_key, unique=True),
+        Index("ix_jobs_tenant", tenant_id, id),
+    )
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, DateTime, Index, Integer, String
+from core.database_sqlite import Base, utcnow
+
+class NoteChange(Base):
+    """Latest change per note: one row per note ever touched, deletes kept as tombstones."""
+    __tablename__ = "note_changes"
+    tenant_id = Column(String, primary_key=True)
+    note_id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False)
+    deleted = Column(Integer, nullable=False, default=0)
+    changedAt = Column(DateTime, nullable=False, server_default=utcnow())
+
+    __table_args__ = (
+        # changes-since scans
+        Index("ix_note_changes_tenant_version", tenant_id, version, note_id),
+    )
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, DateTime, Integer, String
+from core.content_codec import CompressedText
+from core.database_sqlite import Base, utcnow
+
+class NoteRevision(Base):
+    __tablename__ = "note_revisions"
+    note_id = Column(Integer, primary_key=True)
+    revision = Column(Integer, primary_key=True)
+    # First revision of the chain this one is rebuilt from ("snapshot" rows point at themselves)
+    base_revision = Column(Integer, nullable=False)
+    kind = Column(String, nullable=False)  # "snapshot" or "delta"
+    title = Column(String, nullable=False)
+    # Full content for snapshots, JSON-encoded edit script against the previous revision for deltas;
+    # large values are stored compressed like note bodies (see core.content_codec)
+    data = Column(CompressedText, nullable=False)
+    size = Column(Integer, nullable=False)
+    editor = Column(Integer, nullable=True)
+    createdAt = Column(DateTime, nullable=False, server_default=utcnow())
@@ -1,12 +1,23 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey
-from core.database_sqlite import Base
+from sqlalchemy import Column, DateTime, Index, Integer, String, ForeignKey
+from core.content_codec import CompressedText
+from core.database_sqlite import Base, utcnow
 
 class Note(Base):
     __tablename__ = "notes"
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
-    content = Column(Text, nullable=False)
+    # Large bodies may be stored compressed (NOTE_COMPRESSION); always reads back as str
+    content = Column(CompressedText, nullable=False)
     owner = Column(Integer, ForeignKey("users.id"))
-    tenant_id = Column(String, index=True)
-    createdAt = Column(String)
-    updatedAt = Column(String)
+    tenant_id = Column(String)
+    createdAt = Column(DateTime, nullable=False, server_default=utcnow())
+    updatedAt = Column(DateTime, nullable=False, server_default=utcnow())
+    # Bumped by every write; updates are conditional on it (optimistic concurrency)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
+    __table_args__ = (
+        # Recency listing / keyset pagination, and per-owner filtering
+        Index("ix_notes_tenant_updated", tenant_id, updatedAt.desc(), id.desc()),
+        Index("ix_notes_tenant_owner", tenant_id, owner),
+    )
+    __mapper_args__ = {"version_id_col": version}
@@ -0,0 +1,34 @@
+from sqlalchemy import Column, Integer, String
+from core.database_sqlite import Base
+
+class Plan(Base):
+    __tablename__ = "plans"
+    id = Column(String, primary_key=True)
+    name = Column(String, nullable=False)
+    # NULL means unlimited
+    max_notes = Column(Integer, nullable=True)
+    max_storage_bytes = Column(Integer, nullable=True)
+    max_members = Column(Integer, nullable=True)
+    # Revision history: max revisions and max age kept per note (NULL = unlimited),
+    # and how many revisions share one full snapshot
+    revision_limit = Column(Integer, nullable=True)
+    revision_retention_days = Column(Integer, nullable=True)
+    revision_snapshot_every = Column(Integer, nullable=False, default=20)
+    # Request budgets per tenant and per user (NULL = unlimited), and the
+    # tenant's share of DB capacity when requests have to queue
+    rate_per_minute = Column(Integer, nullable=True)
+    rate_burst = Column(Integer, nullable=True)
+    user_rate_per_minute = Column(Integer, nullable=True)
+    user_rate_burst = Column(Integer, nullable=True)
+    fair_share_weight = Column(Integer, nullable=False, default=1)
+
+DEFAULT_PLANS = [
+    {"id": "free", "name": "Free", "max_notes": 3, "max_storage_bytes": None, "max_members": None,
+     "revision_limit": 10, "revision_retention_days": 30, "revision_snapshot_every": 10,
+     "rate_per_minute": 600, "rate_burst": 120, "user_rate_per_minute": 300, "user_rate_burst": 60,
+     "fair_share_weight": 1},
+    {"id": "pro", "name": "Pro", "max_notes": None, "max_storage_bytes": None, "max_members": None,
+     "revision_limit": 200, "revision_retention_days": None, "revision_snapshot_every": 20,
+     "rate_per_minute": 6000, "rate_burst": 1000, "user_rate_per_minute": 1200, "user_rate_burst": 200,
+     "fair_share_weight": 4},
+]
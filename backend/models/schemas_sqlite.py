@@ -0,0 +1,79 @@
+from datetime import date, datetime
+from typing import List, Optional
+from pydantic import AliasChoices, BaseModel, ConfigDict, Field
+
+# Response models, read straight off ORM instances or row mappings
+
+class NoteOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    title: str
+    body: str = Field(validation_alias=AliasChoices("body", "content"))
+    owner: Optional[int] = None
+    tenant_id: Optional[str] = None
+    createdAt: datetime
+    updatedAt: datetime
+    createdBy: Optional[int] = Field(None, validation_alias=AliasChoices("createdBy", "owner"))
+    version: int = 1
+
+class MemberOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    username: str
+    name: Optional[str] = None
+    plan: Optional[str] = None
+
+class TenantOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: str
+    name: str
+    plan: Optional[str] = None
+
+class JobOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    kind: str
+    status: str
+    attempts: int
+    last_error: Optional[str] = None
+    runAt: datetime
+    createdAt: datetime
+    startedAt: Optional[datetime] = None
+    finishedAt: Optional[datetime] = None
+
+class HourlyStatsOut(BaseModel):
+    hour: datetime
+    notes_created: int
+    notes_updated: int
+    notes_deleted: int
+    storage_delta: int
+
+class DailyStatsOut(BaseModel):
+    day: date
+    notes_created: int
+    notes_updated: int
+    notes_deleted: int
+    storage_delta: int
+    active_authors: int
+
+class ActivityTotalsOut(BaseModel):
+    notes_created: int
+    notes_updated: int
+    notes_deleted: int
+    storage_delta: int
+
+class TenantStatsOut(BaseModel):
+    tenant_id: str
+    note_count: int
+    storage_bytes: int
+    member_count: int
+    # Distinct users who created or edited notes over the daily window
+    active_authors: int
+    window: ActivityTotalsOut
+    daily: List[DailyStatsOut]
+    hourly: List[HourlyStatsOut]
+    history_complete: bool
@@ -0,0 +1,9 @@
+from sqlalchemy import Column, DateTime, String
+from core.database_sqlite import Base, utcnow
+
+class TenantShard(Base):
+    """Placement of a tenant that moved off its default shard (catalog only)."""
+    __tablename__ = "tenant_shards"
+    tenant_id = Column(String, primary_key=True)
+    shard = Column(String, nullable=False)
+    movedAt = Column(DateTime, nullable=False, server_default=utcnow())
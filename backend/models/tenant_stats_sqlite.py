@@ -0,0 +1,41 @@
+from sqlalchemy import Column, Date, DateTime, Integer, String
+from core.database_sqlite import Base, utcnow
+
+# Note activity rollups, bumped in the same transaction as every note write (services.stats_sqlite)
+
+class TenantStatsHourly(Base):
+    __tablename__ = "tenant_stats_hourly"
+    tenant_id = Column(String, primary_key=True)
+    hour = Column(DateTime, primary_key=True)
+    notes_created = Column(Integer, nullable=False, default=0)
+    notes_updated = Column(Integer, nullable=False, default=0)
+    notes_deleted = Column(Integer, nullable=False, default=0)
+    # Net change of the tenant's note storage, same measure as tenant_usage.storage_bytes
+    storage_delta = Column(Integer, nullable=False, default=0)
+
+class TenantStatsDaily(Base):
+    __tablename__ = "tenant_stats_daily"
+    tenant_id = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    notes_created = Column(Integer, nullable=False, default=0)
+    notes_updated = Column(Integer, nullable=False, default=0)
+    notes_deleted = Column(Integer, nullable=False, default=0)
+    storage_delta = Column(Integer, nullable=False, default=0)
+    active_authors = Column(Integer, nullable=False, default=0)
+
+class TenantStatsAuthor(Base):
+    """Users who created or edited a note that day; a new row bumps active_authors."""
+    __tablename__ = "tenant_stats_authors"
+    tenant_id = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    user_id = Column(Integer, primary_key=True)
+
+class TenantStatsBackfill(Base):
+    """Notes written before rollups existed (ids up to through_id) still to be counted, from cursor on."""
+    __tablename__ = "tenant_stats_backfill"
+    tenant_id = Column(String, primary_key=True)
+    through_id = Column(Integer, nullable=False)
+    cursor = Column(Integer, nullable=False, default=0)
+    # When the rollups started counting this tenant's writes as they happen
+    createdAt = Column(DateTime, nullable=False, server_default=utcnow())
+    finishedAt = Column(DateTime, nullable=True)
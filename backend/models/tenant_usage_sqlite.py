@@ -0,0 +1,9 @@
+from sqlalchemy import Column, Integer, String
+from core.database_sqlite import Base
+
+class TenantUsage(Base):
+    __tablename__ = "tenant_usage"
+    tenant_id = Column(String, primary_key=True)
+    note_count = Column(Integer, nullable=False, default=0)
+    storage_bytes = Column(Integer, nullable=False, default=0)
+    member_count = Column(Integer, nullable=False, default=0)
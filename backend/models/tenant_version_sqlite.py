@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, String
+from core.database_sqlite import Base
+
+class TenantVersion(Base):
+    __tablename__ = "tenant_versions"
+    tenant_id = Column(String, primary_key=True)
+    # Bumped once per note-mutating transaction; the row lock orders commits per tenant
+    version = Column(Integer, nullable=False, default=0)
+    # Tombstones up to this version have been pruned; older sync cursors must resync
+    pruned_through = Column(Integer, nullable=False, default=0)
+    # Set on the old shard when the tenant moves; writes there then fail (see core.shards)
+    moved_to = Column(String, nullable=True)
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Float, Index, String
+from core.database_sqlite import Base
+
+class TokenStamp(Base):
+    """A user or tenant whose access tokens went stale at changedAt (catalog only); see core.tokens."""
+    __tablename__ = "token_stamps"
+    # "user" (keyed by username) or "tenant"
+    kind = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)
+    # Unix time, compared with the tokens' iat
+    changedAt = Column(Float, nullable=False)
+
+    __table_args__ = (
+        Index("ix_token_stamps_changed", changedAt),
+    )
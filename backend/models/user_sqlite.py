@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Index, Integer, String
 from core.database_sqlite import Base
 
 class User(Base):
@@ -7,6 +7,13 @@ class User(Base):
     username = Column(String, unique=True, index=True, nullable=False)
     password = Column(String, nullable=False)
     role = Column(String, default="user")
-    tenant_id = Column(String, index=True)
+    tenant_id = Column(String)
     name = Column(String, default="")
     plan = Column(String, default="free")
+    # Embedded in issued tokens; bump to make existing tokens stale
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        # count_members / list_members
+        Index("ix_users_tenant_role", tenant_id, role),
+    )
@@ -1,53 +1,42 @@
-from fastapi import APIRouter, HTTPException, Depends
+import logging
+from fastapi import APIRouter, HTTPException, Depends, Request
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
-from core.database_sqlite import SessionLocal
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.database_sqlite import get_db
+from core.deps_sqlite import get_current_user
+from core.passwords import hash_password, verify_password
+from core.principal_cache import principal_cache
+from core.rate_limit import check_login_rate
+from core.tokens import ACCESS_TOKEN_TTL, create_access_token, create_refresh_token, decode_token, keys, token_stamps
 from models.user_sqlite import User
-import jwt
-from datetime import datetime, timedelta
+from models.tenant_sqlite import Tenant
 
-router = APIRouter()
+logger = logging.getLogger(__name__)
 
-import os
-from dotenv import load_dotenv
-load_dotenv()
-SECRET_KEY = os.getenv("SECRET_KEY", "supersecretjwtkey")
-ALGORITHM = os.getenv("ALGORITHM", "HS256")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
+router = APIRouter()
 
 class LoginRequest(BaseModel):
     username: str
     password: str
 
-def create_access_token(data: dict, expires_delta: timedelta = None):
-    to_encode = data.copy()
-    expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-@router.post("/login")
-async def login(request: LoginRequest, db: Session = Depends(get_db)):
-    print(f"Login attempt for username: {request.username}")
-    user = db.query(User).filter_by(username=request.username, password=request.password).first()
-    if not user:
-        print("No user found or password mismatch")
-        raise HTTPException(status_code=401, detail="Invalid credentials")
-
-    access_token = create_access_token(
-        data={"sub": user.username, "tenant_id": user.tenant_id, "role": user.role}
+async def _user_with_tenant(db: AsyncSession, username: str):
+    result = await db.execute(
+        select(User, Tenant)
+        .outerjoin(Tenant, Tenant.id == User.tenant_id)
+        .where(User.username == username)
     )
+    return result.first() or (None, None)
 
+def _token_response(user, tenant):
     return {
-        "access_token": access_token,
+        "access_token": create_access_token(user, tenant.plan if tenant else None),
+        "refresh_token": create_refresh_token(user),
         "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_TTL,
         "user": {
             "id": user.id,
             "username": user.username,
@@ -57,3 +46,48 @@ async def login(request: LoginRequest, db: Session = Depends(get_db)):
             "plan": user.plan,
         }
     }
+
+@router.post("/login")
+async def login(request: LoginRequest, http_request: Request, db: AsyncSession = Depends(get_db)):
+    logger.debug("Login attempt for %s", request.username)
+    check_login_rate(http_request, request.username)
+    user, tenant = await _user_with_tenant(db, request.username)
+    matches, needs_rehash = await verify_password(request.password, user.password if user else None)
+    if not matches:
+        logger.info("Failed login for %s", request.username)
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    # Legacy plaintext rows (and hashes with an outdated cost) are upgraded on login
+    if needs_rehash:
+        user.password = await hash_password(request.password)
+        await db.commit()
+
+    return _token_response(user, tenant)
+
+@router.post("/refresh")
+async def refresh(request: RefreshRequest, db: AsyncSession = Depends(get_db)):
+    payload = decode_token(request.refresh_token, token_type="refresh")
+    if not payload:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    user, tenant = await _user_with_tenant(db, payload["sub"])
+    if not user or payload.get("ver") != user.token_version:
+        raise HTTPException(status_code=401, detail="Refresh token revoked")
+    # Fresh claims from the database, and a new refresh token to replace this one
+    return _token_response(user, tenant)
+
+@router.post("/logout-all")
+async def logout_all(user=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    # Revokes every refresh token and every access token: on this worker immediately,
+    # on the others once they sync the token stamps
+    db_user = await db.get(User, user.id)
+    db_user.token_version += 1
+    await token_stamps.share(db, users=[user.username])
+    await db.commit()
+    token_stamps.user_changed(user.username)
+    principal_cache.invalidate_user(user.username)
+    return {"message": "Signed out of all sessions"}
+
+@router.get("/jwks")
+async def jwks():
+    # Public verification keys when tokens are signed asymmetrically
+    return keys.jwks()
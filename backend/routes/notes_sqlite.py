@@ -1,11 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException, Path
-from pydantic import BaseModel
-from sqlalchemy.orm import Session
-from models.user_sqlite import User
-from models.tenant_sqlite import Tenant
+import asyncio
+import json
+from datetime import datetime
+from functools import partial
+from typing import List, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.exc import StaleDataError
 from models.note_sqlite import Note
-from core.database_sqlite import SessionLocal
-from core.deps_sqlite import get_current_user
+from models.schemas_sqlite import NoteOut
+from core.content_codec import encode_content
+from core.deps_sqlite import get_current_user, get_optional_user, get_query_tenant_db, get_stream_user, get_tenant_db
+from core.events import note_events
+from core.principal_cache import Principal
+from core.response_cache import cached_json
+from core.serialization import FastJSONResponse
+from core.shards import note_ids, shard_router, tenant_session
+from core.pagination import decode_cursor, encode_cursor
+from services.batch_notes_sqlite import NOT_FOUND, delete_notes, update_notes
+from services.changes_sqlite import changes_query, current_version, pruned_through, record_changes
+from services.quota_sqlite import adjust_storage, ensure_usage, note_size, release_notes, reserve_notes
+from services.stats_sqlite import record_activity
+from services.revisions_sqlite import delete_revisions, get_revision, list_revisions, record_revisions
+from services.search_sqlite import index_note, search_notes, unindex_note
+from services.bulk_notes_sqlite import (
+    BulkImportError, gzip_json_array, import_notes, iter_json_array, iter_ndjson, ndjson_lines,
+)
 
 router = APIRouter()
 
@@ -15,90 +37,500 @@ class NoteCreate(BaseModel):
     tenant_id: str
     owner: int
 
-def get_db():
-    db = SessionLocal()
+class NoteUpdate(NoteCreate):
+    # Version the edit was based on; If-Match takes precedence
+    version: Optional[int] = None
+
+# Output field name -> column; list views can skip "body" via ?fields=
+NOTE_FIELDS = {
+    "id": Note.id,
+    "title": Note.title,
+    "body": Note.content,
+    "owner": Note.owner,
+    "tenant_id": Note.tenant_id,
+    "createdAt": Note.createdAt,
+    "updatedAt": Note.updatedAt,
+    "createdBy": Note.owner,
+    "version": Note.version,
+}
+# Pre-image of a note for updates (size, tenant, revision delta)
+NOTE_STATE = (Note.id, Note.title, Note.content, Note.owner, Note.tenant_id,
+              Note.createdAt, Note.updatedAt, Note.version)
+MAX_BATCH_SIZE = 100
+# Lost races on one note before PUT gives up with 409
+NOTE_UPDATE_ATTEMPTS = 3
+STREAM_HEARTBEAT_SECONDS = 15
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+STREAM_BATCH_SIZE = 500
+
+_sort_key = Note.updatedAt
+
+class BatchGetRequest(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+    fields: Optional[str] = None
+
+class BatchNoteUpdate(BaseModel):
+    id: int
+    title: str
+    content: str
+    owner: Optional[int] = None
+    version: Optional[int] = None
+
+class BatchUpdateRequest(BaseModel):
+    notes: List[BatchNoteUpdate] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+
+class BatchDeleteRequest(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+
+def parse_fields(fields: Optional[str]):
+    if not fields:
+        return list(NOTE_FIELDS)
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in NOTE_FIELDS]
+    if unknown:
+        raise HTTPException(400, f"Unknown fields: {', '.join(unknown)}")
+    return names
+
+def notes_page_query(tenant_id: str, names, cursor: Optional[str] = None):
+    # The first two columns carry the keyset, the rest are the projected fields
+    columns = [_sort_key, Note.id] + [NOTE_FIELDS[name] for name in names]
+    stmt = select(*columns).where(Note.tenant_id == tenant_id)
+    if cursor:
+        sort_value, note_id = decode_cursor(cursor, 2)
+        try:
+            sort_value = datetime.fromisoformat(sort_value)
+        except (TypeError, ValueError):
+            raise HTTPException(400, "Invalid cursor")
+        stmt = stmt.where(or_(
+            _sort_key < sort_value,
+            and_(_sort_key == sort_value, Note.id < note_id),
+        ))
+    return stmt.order_by(_sort_key.desc(), Note.id.desc())
+
+def parse_ids(ids: str):
     try:
-        yield db
-    finally:
-        db.close()
+        values = [int(value) for value in ids.split(",") if value.strip()]
+    except ValueError:
+        raise HTTPException(400, "ids must be comma-separated integers")
+    if not values or len(values) > MAX_BATCH_SIZE:
+        raise HTTPException(400, f"Between 1 and {MAX_BATCH_SIZE} ids per request")
+    return values
 
-@router.get("/")
-async def get_notes(tenant_id: str, db: Session = Depends(get_db)):
-    notes = db.query(Note).filter_by(tenant_id=tenant_id).all()
+async def batch_get(db, tenant_id: str, ids, names):
+    # One IN query; ids outside the tenant are indistinguishable from missing ones
+    columns = [Note.id] + [NOTE_FIELDS[name] for name in names]
+    rows = await db.execute(select(*columns).where(Note.id.in_(set(ids)), Note.tenant_id == tenant_id))
+    found = {row[0]: dict(zip(names, row[1:])) for row in rows}
     return [
-        {
-            "id": note.id,
-            "title": note.title,
-            "body": note.content,
-            "owner": note.owner,
-            "tenant_id": note.tenant_id,
-            "createdAt": note.createdAt,
-            "updatedAt": note.updatedAt,
-            "createdBy": note.owner
-        }
-        for note in notes
+        {"id": note_id, "status": 200, "note": found[note_id]} if note_id in found else {"id": note_id, **NOT_FOUND}
+        for note_id in ids
     ]
 
+def row_to_note(row, names):
+    return dict(zip(names, row[2:]))
+
+async def iter_note_rows(tenant_id: str, stmt):
+    # Own session: the request-scoped one may be closed before the body is sent
+    async with tenant_session(tenant_id) as db:
+        result = await db.stream(stmt.execution_options(yield_per=STREAM_BATCH_SIZE))
+        async for row in result:
+            yield row
+
+def query_key(request: Request) -> str:
+    # Parameter order doesn't change the response, so it shouldn't split the cache
+    return "&".join(sorted(request.url.query.split("&")))
+
+@router.get("/")
+async def get_notes(
+    tenant_id: str,
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    ids: Optional[str] = Query(None, description="Comma-separated note ids; returns per-id results instead of a page"),
+    format: Literal["json", "ndjson"] = "json",
+    user: Optional[Principal] = Depends(get_optional_user),
+    db: AsyncSession = Depends(get_query_tenant_db),
+):
+    names = parse_fields(fields)
+    if ids is not None:
+        # Same rules as POST /notes/batch-get: signed in, and only the caller's tenant (get_query_tenant_db)
+        if user is None:
+            raise HTTPException(401, "Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+        note_ids = parse_ids(ids)
+
+        async def build_batch(version):
+            return {"results": await batch_get(db, user.tenant_id, note_ids, names)}, {}
+
+        return await cached_json(request, db, tenant_id, f"notes?{query_key(request)}", build_batch)
+
+    # The page listing stays open without a token, as it always has been: anyone naming a
+    # tenant can read its notes (rate-limited per address, see core.admission). A signed-in
+    # caller is held to its own tenant, but dropping the token gets the anonymous listing
+    stmt = notes_page_query(tenant_id, names, cursor)
+
+    # NDJSON streams everything after the cursor unless a limit is given
+    if format == "ndjson":
+        # Read before the notes so later changes are never missed; resume with /notes/changes
+        if not cursor:
+            response.headers["X-Sync-Cursor"] = encode_cursor(await current_version(db, tenant_id), 0)
+        if limit:
+            stmt = stmt.limit(limit)
+        lines = ndjson_lines(iter_note_rows(tenant_id, stmt), partial(row_to_note, names=names))
+        return StreamingResponse(lines, media_type="application/x-ndjson", headers=response.headers)
+
+    async def build(version):
+        headers = {}
+        if not cursor:
+            headers["X-Sync-Cursor"] = encode_cursor(version, 0)
+        page_size = limit or DEFAULT_PAGE_SIZE
+        rows = (await db.execute(stmt.limit(page_size + 1))).all()
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            last = rows[-1]
+            headers["X-Next-Cursor"] = encode_cursor(last[0].isoformat(), last[1])
+        return [row_to_note(row, names) for row in rows], headers
+
+    return await cached_json(request, db, tenant_id, f"notes?{query_key(request)}", build)
+
+@router.get("/changes")
+async def get_changes(
+    since: str,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_tenant_db),
+):
+    """Notes created, updated or deleted after the `since` cursor, oldest change first."""
+    names = parse_fields(fields)
+    version, after_id = decode_cursor(since, 2)
+    if not isinstance(version, int) or not isinstance(after_id, int):
+        raise HTTPException(400, "Invalid cursor")
+    if version < await pruned_through(db, user.tenant_id):
+        raise HTTPException(410, "Sync cursor is too old, reload all notes")
+
+    rows = (await db.execute(changes_query(user.tenant_id, version, after_id).limit(limit + 1))).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    live_ids = [note_id for _, note_id, deleted in rows if not deleted]
+    notes = {}
+    if live_ids:
+        stmt = select(Note.id, *(NOTE_FIELDS[name] for name in names)).where(
+            Note.id.in_(live_ids), Note.tenant_id == user.tenant_id
+        )
+        notes = {row[0]: dict(zip(names, row[1:])) for row in await db.execute(stmt)}
+
+    changes = []
+    for _, note_id, deleted in rows:
+        note = notes.get(note_id)
+        if deleted or note is None:
+            changes.append({"id": note_id, "deleted": True})
+        else:
+            changes.append({**note, "id": note_id, "deleted": False})
+    if rows:
+        version, after_id = rows[-1][0], rows[-1][1]
+    return {"changes": changes, "cursor": encode_cursor(version, after_id), "has_more": has_more}
+
+@router.get("/stream")
+async def stream_note_events(request: Request, user: Principal = Depends(get_stream_user)):
+    """Server-Sent Events: note change hints for the caller's tenant."""
+    async def events():
+        subscription = note_events.subscribe(user.tenant_id)
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                batch = await subscription.get(timeout=STREAM_HEARTBEAT_SECONDS)
+                if not batch:
+                    yield ": ping\n\n"
+                for event in batch:
+                    kind = event.get("type", "note")
+                    yield f"event: {kind}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            note_events.unsubscribe(subscription)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.websocket("/stream")
+async def websocket_note_events(websocket: WebSocket, user: Principal = Depends(get_stream_user)):
+    await websocket.accept()
+    subscription = note_events.subscribe(user.tenant_id)
+
+    async def drain():
+        # Clients don't send anything; this only notices the disconnect
+        while True:
+            await websocket.receive_text()
+
+    receiver = asyncio.create_task(drain())
+    try:
+        while True:
+            getter = asyncio.create_task(subscription.get())
+            await asyncio.wait({receiver, getter}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver.done():
+                getter.cancel()
+                break
+            for event in getter.result():
+                await websocket.send_json(event if "type" in event else {"type": "note", **event})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        note_events.unsubscribe(subscription)
+
+@router.get("/search")
+async def search(
+    response: Response,
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_tenant_db),
+):
+    after = decode_cursor(cursor, 2) if cursor else None
+    if after and not (isinstance(after[0], (int, float)) and isinstance(after[1], int)):
+        raise HTTPException(400, "Invalid cursor")
+
+    results = await search_notes(db, user.tenant_id, q, limit + 1, after)
+    if len(results) > limit:
+        results = results[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(results[-1]["rank"], results[-1]["id"])
+    return results
+
+@router.get("/export")
+async def export_notes(
+    format: Literal["ndjson", "json.gz"] = "ndjson",
+    fields: Optional[str] = None,
+    user: Principal = Depends(get_current_user),
+):
+    names = parse_fields(fields)
+    rows = iter_note_rows(user.tenant_id, notes_page_query(user.tenant_id, names))
+    to_dict = partial(row_to_note, names=names)
+    if format == "json.gz":
+        return StreamingResponse(
+            gzip_json_array(rows, to_dict),
+            media_type="application/gzip",
+            headers={"Content-Disposition": 'attachment; filename="notes.json.gz"'},
+        )
+    return StreamingResponse(
+        ndjson_lines(rows, to_dict),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="notes.ndjson"'},
+    )
+
+@router.post("/bulk")
+async def bulk_create_notes(request: Request, user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_tenant_db)):
+    if user.tenant_plan is None:
+        raise HTTPException(404, "Tenant not found")
+
+    # NDJSON is parsed as it arrives; anything else must be a JSON array
+    if "ndjson" in request.headers.get("content-type", ""):
+        items = iter_ndjson(request.stream())
+    else:
+        items = iter_json_array(await request.body())
+
+    try:
+        inserted = await import_notes(db, items, user, enforce=user.role != "admin")
+    except BulkImportError as exc:
+        raise HTTPException(exc.status_code, {"message": exc.message, "inserted": exc.inserted, "line": exc.line})
+    return {"inserted": inserted}
+
+@router.post("/batch-get")
+async def batch_get_notes(batch: BatchGetRequest, user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_tenant_db)):
+    return {"results": await batch_get(db, user.tenant_id, batch.ids, parse_fields(batch.fields))}
+
+@router.post("/batch-update")
+async def batch_update_notes(batch: BatchUpdateRequest, user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_tenant_db)):
+    try:
+        return {"results": await update_notes(db, user.tenant_id, batch.notes, user.id, user.tenant_plan)}
+    except StaleDataError:
+        await db.rollback()
+        raise HTTPException(409, "Notes were changed while the batch was applied; retry")
+
+@router.post("/batch-delete")
+async def batch_delete_notes(batch: BatchDeleteRequest, user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_tenant_db)):
+    return {"results": await delete_notes(db, user.tenant_id, batch.ids)}
+
 @router.post("/")
-async def create_note(note: NoteCreate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    tenant = db.query(Tenant).filter_by(id=user.tenant_id).first()
-    if not tenant:
+async def create_note(note: NoteCreate, user: Principal = Depends(get_current_user)):
+    if user.tenant_plan is None:
         raise HTTPException(404, "Tenant not found")
+    # The quota checked is the caller's plan's, so notes can only be created in the caller's tenant
+    if note.tenant_id != user.tenant_id:
+        raise HTTPException(403, "Notes can only be created in your own tenant")
 
-    # Only limit for members on free plan, admins have unlimited
-    if tenant.plan == "free" and user.role != "admin":
-        count = db.query(Note).filter_by(tenant_id=user.tenant_id).count()
-        if count >= 3:
-            raise HTTPException(403, "Free plan tenant note limit reached (3 notes).")
+    # Before the session writes anything (see NoteIds)
+    ids = await note_ids.take()
+    async with tenant_session(user.tenant_id) as db:
+        # Only limit for members, admins have unlimited
+        size = note_size(note.title, note.content)
+        await ensure_usage(db, user.tenant_id)
+        if not await reserve_notes(db, user.tenant_id, 1, size, enforce=user.role != "admin"):
+            raise HTTPException(403, "Plan note limit reached. Upgrade to Pro.")
 
-    db_note = Note(**note.dict())
-    db.add(db_note)
-    db.commit()
-    db.refresh(db_note)
-    return {"id": db_note.id}
+        now = datetime.utcnow()
+        db_note = Note(**{**note.dict(), "content": encode_content(db, note.tenant_id, note.content)},
+                       id=ids[0] if ids else None, createdAt=now, updatedAt=now)
+        db.add(db_note)
+        await db.flush()
+        await index_note(db, db_note.id, db_note.tenant_id, db_note.title, note.content)
+        await record_activity(db, note.tenant_id, user.id, at=now, created=1, storage=size)
+        version = await record_changes(db, db_note.tenant_id, [db_note.id])
+        await db.commit()
+        await note_events.publish(db_note.tenant_id, [{"id": db_note.id, "deleted": False, "version": version}])
+        await db.refresh(db_note)
+        return {"id": db_note.id}
 
-@router.put("/{note_id}")
-async def update_note(note_id: int, note: NoteCreate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    db_note = db.query(Note).filter_by(id=note_id).first()
-    if not db_note:
-        raise HTTPException(404, "Note not found")
+def parse_if_match(value: Optional[str]) -> Optional[int]:
+    # The note's version, as "3", W/"3" or 3; "*" only requires the note to exist
+    if value is None or value.strip() == "*":
+        return None
+    tag = value.strip().removeprefix("W/").strip('"')
+    try:
+        return int(tag)
+    except ValueError:
+        raise HTTPException(400, "If-Match must be a note version")
 
-    # Allow all users to edit any note (remove ownership check)
-    db_note.title = note.title
-    db_note.content = note.content
-    db_note.tenant_id = note.tenant_id
-    db_note.owner = note.owner
+def version_conflict(current):
+    return HTTPException(409, {
+        "message": "Note was changed by someone else",
+        "note": NoteOut.model_validate(current).model_dump(mode="json"),
+    })
+
+async def apply_note_update(db, note_id: int, note: NoteCreate, user: Principal, expected: Optional[int] = None):
+    # SELECT, then UPDATE conditional on the version read, rather than one UPDATE ... RETURNING:
+    # SQLite's RETURNING only yields the new row, and the usage delta, the revision snapshot and
+    # a tenant move all need the row as it was before the write
+    for _ in range(NOTE_UPDATE_ATTEMPTS):
+        current = (await db.execute(select(*NOTE_STATE).where(Note.id == note_id))).first()
+        if not current:
+            raise HTTPException(404, "Note not found")
+        if expected is not None and current.version != expected:
+            raise version_conflict(current)
+        if note.tenant_id != current.tenant_id and (
+            await shard_router.shard_for(note.tenant_id) != await shard_router.shard_for(current.tenant_id)
+        ):
+            raise HTTPException(400, "Notes can't move to a tenant stored on another shard")
+        # Counters are seeded before the write below, or their scan would already include it
+        for tenant_id in {current.tenant_id, note.tenant_id}:
+            await ensure_usage(db, tenant_id)
+        # The only write to the note row, conditional on the version just read
+        written = (await db.execute(
+            update(Note)
+            .where(Note.id == note_id, Note.version == current.version)
+            .values(title=note.title, content=encode_content(db, note.tenant_id, note.content), tenant_id=note.tenant_id, owner=note.owner,
+                    updatedAt=datetime.utcnow(), version=current.version + 1)
+            .returning(Note.version)
+            .execution_options(synchronize_session=False)
+        )).scalar()
+        if written is not None:
+            break
+        # Another writer got in between; re-read (and report 409 if the client pinned a version)
+        await db.rollback()
+    else:
+        raise HTTPException(409, "Note is being changed by others; retry")
 
-    db.commit()
-    db.refresh(db_note)
-    return {"id": db_note.id}
+    # Keep usage counters in step, including notes moved to another tenant
+    old_size = note_size(current.title, current.content)
+    new_size = note_size(note.title, note.content)
+    moved_from = None
+    if note.tenant_id != current.tenant_id:
+        await release_notes(db, current.tenant_id, 1, old_size)
+        await reserve_notes(db, note.tenant_id, 1, new_size, enforce=False)
+        await record_activity(db, current.tenant_id, deleted=1, storage=-old_size)
+        await record_activity(db, note.tenant_id, user.id, created=1, storage=new_size)
+        moved_from = (current.tenant_id, await record_changes(db, current.tenant_id, [note_id], deleted=True))
+    else:
+        await adjust_storage(db, current.tenant_id, new_size - old_size)
+        await record_activity(db, current.tenant_id, user.id, updated=1, storage=new_size - old_size)
+    version = await record_changes(db, note.tenant_id, [note_id])
+    plan_id = user.tenant_plan if note.tenant_id == user.tenant_id else None
+    await record_revisions(db, note.tenant_id, plan_id, [(current, note.title, note.content)], user.id)
+    await index_note(db, note_id, note.tenant_id, note.title, note.content)
+
+    await db.commit()
+    if moved_from:
+        await note_events.publish(moved_from[0], [{"id": note_id, "deleted": True, "version": moved_from[1]}])
+    await note_events.publish(note.tenant_id, [{"id": note_id, "deleted": False, "version": version}])
+    return written
+
+@router.put("/{note_id}")
+async def update_note(note_id: int, note: NoteUpdate, request: Request,
+                      user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_tenant_db)):
+    # Allow all users to edit any note (remove ownership check)
+    expected = parse_if_match(request.headers.get("if-match"))
+    if expected is None:
+        expected = note.version
+    version = await apply_note_update(db, note_id, note, user, expected)
+    return {"id": note_id, "version": version}
 
 @router.delete("/{note_id}")
-async def delete_note(note_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    db_note = db.query(Note).filter_by(id=note_id).first()
+async def delete_note(note_id: int, user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_tenant_db)):
+    db_note = await db.get(Note, note_id)
     if not db_note:
         raise HTTPException(404, "Note not found")
 
     # Allow all users to delete any note
-    db.delete(db_note)
-    db.commit()
+    size = note_size(db_note.title, db_note.content)
+    await ensure_usage(db, db_note.tenant_id)
+    await release_notes(db, db_note.tenant_id, 1, size)
+    await record_activity(db, db_note.tenant_id, deleted=1, storage=-size)
+    await unindex_note(db, db_note.id)
+    await delete_revisions(db, [db_note.id])
+    version = await record_changes(db, db_note.tenant_id, [db_note.id], deleted=True)
+    await db.delete(db_note)
+    await db.commit()
+    await note_events.publish(db_note.tenant_id, [{"id": note_id, "deleted": True, "version": version}])
     return {"id": note_id}
 
-@router.get("/{note_id}")
-async def get_note(note_id: int = Path(..., description="The ID of the note to retrieve"),
-                   user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    db_note = db.query(Note).filter_by(id=note_id).first()
-    if not db_note:
+async def tenant_note(db, note_id: int, user: Principal):
+    db_note = await db.get(Note, note_id)
+    if not db_note or db_note.tenant_id != user.tenant_id:
         raise HTTPException(404, "Note not found")
+    return db_note
+
+@router.get("/{note_id}/revisions")
+async def get_note_revisions(note_id: int, limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE), before: Optional[int] = None,
+                             user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_tenant_db)):
+    await tenant_note(db, note_id, user)
+    return await list_revisions(db, note_id, limit, before)
+
+@router.get("/{note_id}/revisions/{revision}")
+async def get_note_revision(note_id: int, revision: int,
+                            user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_tenant_db)):
+    await tenant_note(db, note_id, user)
+    found = await get_revision(db, note_id, revision)
+    if not found:
+        raise HTTPException(404, "Revision not found")
+    row, content = found
+    return {"revision": row.revision, "title": row.title, "body": content,
+            "editor": row.editor, "createdAt": row.createdAt}
+
+@router.post("/{note_id}/revisions/{revision}/restore")
+async def restore_note_revision(note_id: int, revision: int,
+                                user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_tenant_db)):
+    db_note = await tenant_note(db, note_id, user)
+    found = await get_revision(db, note_id, revision)
+    if not found:
+        raise HTTPException(404, "Revision not found")
+    row, content = found
+    # An ordinary edit, so the restore itself becomes the newest revision
+    restored = NoteCreate(title=row.title, content=content, tenant_id=db_note.tenant_id, owner=db_note.owner)
+    version = await apply_note_update(db, note_id, restored, user)
+    return {"id": note_id, "restored": revision, "version": version}
+
+@router.get("/{note_id}", response_model=NoteOut)
+async def get_note(request: Request, note_id: int = Path(..., description="The ID of the note to retrieve"),
+                   user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_tenant_db)):
+    async def build(version):
+        db_note = await db.get(Note, note_id)
+        if not db_note:
+            raise HTTPException(404, "Note not found")
+        # Allow all users to view any note; other tenants' notes aren't covered by our version
+        if db_note.tenant_id != user.tenant_id:
+            return FastJSONResponse(NoteOut.model_validate(db_note))
+        return NoteOut.model_validate(db_note), {}
 
-    # Allow all users to view any note
-    return {
-        "id": db_note.id,
-        "title": db_note.title,
-        "body": db_note.content,
-        "owner": db_note.owner,
-        "tenant_id": db_note.tenant_id,
-        "createdAt": db_note.createdAt,
-        "updatedAt": db_note.updatedAt,
-        "createdBy": db_note.owner
-    }
+    return await cached_json(request, db, user.tenant_id, f"note:{note_id}", build)
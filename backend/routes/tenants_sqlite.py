@@ -1,9 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
-from core.database_sqlite import SessionLocal
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.database_sqlite import get_db
+from models.job_sqlite import Job
+from models.schemas_sqlite import JobOut, TenantOut, TenantStatsOut
 from models.tenant_sqlite import Tenant
 from core.deps_sqlite import get_current_user
+from core.jobs import enqueue, queue_stats
+from core.principal_cache import principal_cache
+from core.response_cache import ALL_TENANTS, announce_version, cached_json
+from core.shards import tenant_session
+from core.tokens import token_stamps
+from services.changes_sqlite import next_version
+from services.stats_sqlite import tenant_stats
+from services import jobs_sqlite  # noqa: F401 (registers the job handlers)
 
 router = APIRouter()
 
@@ -11,42 +23,96 @@ class TenantCreate(BaseModel):
     name: str
     plan: str = "free"
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-@router.get("/")
-async def get_tenants(db: Session = Depends(get_db)):
-    tenants = db.query(Tenant).all()
-    return [
-        {
-            "id": tenant.id,
-            "name": tenant.name,
-            "plan": tenant.plan
-        }
-        for tenant in tenants
-    ]
+@router.get("/", response_model=List[TenantOut])
+async def get_tenants(request: Request, db: AsyncSession = Depends(get_db)):
+    async def build(version):
+        tenants = (await db.execute(select(Tenant))).scalars().all()
+        return [TenantOut.model_validate(tenant) for tenant in tenants], {}
+
+    return await cached_json(request, db, ALL_TENANTS, "tenants", build)
 
 @router.post("/")
-async def create_tenant(tenant: TenantCreate, db: Session = Depends(get_db)):
+async def create_tenant(tenant: TenantCreate, db: AsyncSession = Depends(get_db)):
     db_tenant = Tenant(**tenant.dict())
     db.add(db_tenant)
-    db.commit()
-    db.refresh(db_tenant)
+    version = await next_version(db, ALL_TENANTS)
+    await db.commit()
+    await db.refresh(db_tenant)
+    await announce_version(ALL_TENANTS, version)
     return {"id": db_tenant.id}
 
 @router.post("/upgrade")
-async def upgrade_plan(user=Depends(get_current_user), db: Session = Depends(get_db)):
+async def upgrade_plan(user=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     if user.role != "admin":
         raise HTTPException(status.HTTP_403_FORBIDDEN, "Only admin can upgrade tenant plan")
-    tenant = db.query(Tenant).filter(Tenant.id == user.tenant_id).first()
+    tenant = await db.get(Tenant, user.tenant_id)
     if not tenant:
         raise HTTPException(404, "Tenant not found")
     if tenant.plan == "pro":
         return {"plan": "pro", "message": "Tenant is already on Pro plan"}
     tenant.plan = "pro"
-    db.commit()
+    directory_version = await next_version(db, ALL_TENANTS)
+    await token_stamps.share(db, tenants=[tenant.id])
+    await db.commit()
+    async with tenant_session(tenant.id) as tenant_db:
+        version = await next_version(tenant_db, tenant.id)
+        await tenant_db.commit()
+    token_stamps.tenant_changed(tenant.id)
+    principal_cache.invalidate_tenant(tenant.id)
+    await announce_version(tenant.id, version)
+    await announce_version(ALL_TENANTS, directory_version)
     return {"plan": "pro", "message": "Tenant upgraded to Pro plan successfully"}
+
+def _require_admin(user):
+    if user.role != "admin":
+        raise HTTPException(status.HTTP_403_FORBIDDEN, "Only admins can manage background jobs")
+
+async def _enqueue_for_tenant(request: Request, db, user, kind: str, lane: str):
+    # A retried request with the same Idempotency-Key gets the job it already queued
+    key = request.headers.get("idempotency-key")
+    job_id = await enqueue(
+        db, kind, {"tenant_id": user.tenant_id}, lane=lane, tenant_id=user.tenant_id,
+        key=f"{user.tenant_id}:{kind}:{key}" if key else None,
+    )
+    await db.commit()
+    return await db.get(Job, job_id)
+
+@router.post("/reindex", response_model=JobOut, status_code=status.HTTP_202_ACCEPTED)
+async def reindex_tenant(request: Request, user=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    _require_admin(user)
+    return await _enqueue_for_tenant(request, db, user, "search.reindex", "low")
+
+@router.post("/usage/recompute", response_model=JobOut, status_code=status.HTTP_202_ACCEPTED)
+async def recompute_usage(request: Request, user=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    _require_admin(user)
+    return await _enqueue_for_tenant(request, db, user, "usage.recompute", "default")
+
+@router.post("/stats/backfill", response_model=JobOut, status_code=status.HTTP_202_ACCEPTED)
+async def backfill_stats(request: Request, user=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    _require_admin(user)
+    return await _enqueue_for_tenant(request, db, user, "stats.backfill", "low")
+
+# Activity and usage from the rollups: a fixed number of rows however big the tenant is
+@router.get("/{tenant_id}/stats", response_model=TenantStatsOut)
+async def get_tenant_stats(tenant_id: str, days: int = Query(30, ge=1, le=366), hours: int = Query(24, ge=1, le=168),
+                           user=Depends(get_current_user)):
+    if user.role != "admin":
+        raise HTTPException(status.HTTP_403_FORBIDDEN, "Only admins can view tenant stats")
+    if tenant_id != user.tenant_id:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Tenant not found")
+    async with tenant_session(tenant_id) as db:
+        return await tenant_stats(db, tenant_id, days, hours)
+
+# Queue depth per lane and latency of recently finished jobs
+@router.get("/jobs")
+async def job_queue(user=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    _require_admin(user)
+    return await queue_stats(db)
+
+@router.get("/jobs/{job_id}", response_model=JobOut)
+async def get_job(job_id: int, user=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    _require_admin(user)
+    job = await db.get(Job, job_id)
+    if not job or job.tenant_id != user.tenant_id:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Job not found")
+    return job
@@ -1,9 +1,19 @@
+from typing import List
 from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.schemas_sqlite import MemberOut
 from models.user_sqlite import User
-from core.database_sqlite import SessionLocal
+from core.database_sqlite import get_db
 from core.deps_sqlite import get_current_user
+from core.jobs import enqueue
+from core.principal_cache import principal_cache
+from core.shards import shard_router, tenant_session
+from core.response_cache import announce_version
+from core.tokens import token_stamps
+from services.changes_sqlite import next_version
+from services import jobs_sqlite  # noqa: F401 (registers the job handlers)
 
 router = APIRouter()
 
@@ -15,65 +25,55 @@ class UserInvite(BaseModel):
 class PlanChangeRequest(BaseModel):
     new_plan: str
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-@router.post("/invite")
-async def invite_user(invite: UserInvite, user=Depends(get_current_user), db: Session = Depends(get_db)):
+# Creating the user (bcrypt) and mailing the invitation run in the invite.deliver job
+@router.post("/invite", status_code=status.HTTP_202_ACCEPTED)
+async def invite_user(invite: UserInvite, user=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     if user.role != "admin":
         raise HTTPException(status.HTTP_403_FORBIDDEN, "Only Admins can invite users")
+    if not await shard_router.exists(invite.tenant_id):
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Tenant not found")
 
-    existing_user = db.query(User).filter(User.email == invite.email).first()
+    existing_user = (await db.execute(select(User.id).where(User.username == invite.email))).first()
     if existing_user:
         raise HTTPException(status.HTTP_400_BAD_REQUEST, "User with this email already exists")
 
-    new_user = User(
-        username=invite.email,
-        password="defaultpassword",  # Please hash in real app
-        role=invite.role,
-        tenant_id=invite.tenant_id,
-        name="",
-        plan="free"
+    # The job re-checks the address and takes the member seat, so a repeated invite is harmless
+    job_id = await enqueue(
+        db, "invite.deliver",
+        {"email": invite.email, "role": invite.role, "tenant_id": invite.tenant_id},
+        lane="high", tenant_id=invite.tenant_id, key=f"invite:{invite.email}",
     )
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
-
-    return {"message": f"User invited successfully with email {invite.email}"}
+    await db.commit()
+    return {"message": f"Invitation for {invite.email} queued", "job_id": job_id}
 
 @router.get("/count-members")
-async def count_members(user=Depends(get_current_user), db: Session=Depends(get_db)):
+async def count_members(user=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     if user.role != "admin":
         raise HTTPException(status.HTTP_403_FORBIDDEN, "Only admins can view member count")
-    count = db.query(User).filter(User.tenant_id == user.tenant_id, User.role == "member").count()
+    count = await db.scalar(
+        select(func.count()).select_from(User).where(User.tenant_id == user.tenant_id, User.role == "member")
+    )
     return {"member_count": count}
 
-@router.get("/list-members")
-async def list_members(user=Depends(get_current_user), db: Session = Depends(get_db)):
+@router.get("/list-members", response_model=List[MemberOut])
+async def list_members(user=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     if user.role != "admin":
         raise HTTPException(403, "Only admin can list members")
-    members = db.query(User).filter(User.tenant_id == user.tenant_id, User.role == "member").all()
-    return [
-        {"id": member.id, "username": member.username, "name": member.name, "plan": member.plan}
-        for member in members
-    ]
+    members = (await db.execute(select(User).where(User.tenant_id == user.tenant_id, User.role == "member"))).scalars().all()
+    return members
 
 @router.post("/change-plan/{user_id}")
 async def change_member_plan(
     user_id: int,
     request: PlanChangeRequest,
     user=Depends(get_current_user),
-    db: Session=Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     new_plan = request.new_plan
     if user.role != "admin":
         raise HTTPException(status.HTTP_403_FORBIDDEN, "Only admins can change member plans")
 
-    member = db.query(User).filter(User.id == user_id).first()
+    member = await db.get(User, user_id)
     if not member:
         raise HTTPException(status.HTTP_404_NOT_FOUND, "Member not found")
     if member.role != "member":
@@ -82,5 +82,13 @@ async def change_member_plan(
         raise HTTPException(status.HTTP_400_BAD_REQUEST, "Invalid plan")
 
     member.plan = new_plan
-    db.commit()
+    await token_stamps.share(db, users=[member.username])
+    await db.commit()
+    # Versions live with the tenant's notes, which may be on another shard
+    async with tenant_session(member.tenant_id) as tenant_db:
+        version = await next_version(tenant_db, member.tenant_id)
+        await tenant_db.commit()
+    token_stamps.user_changed(member.username)
+    principal_cache.invalidate_user(member.username)
+    await announce_version(member.tenant_id, version)
     return {"message": f"Plan changed to {new_plan} for user {member.username}"}
@@ -0,0 +1,44 @@
+"""
+Server entry point.
+
+    python server.py [--migrate] [--seed] [--workers N] [--host HOST] [--port PORT]
+
+Migrations (and the demo seed) run once, here, before any worker starts, so
+workers never race each other on DDL. With several workers uvicorn spawns
+fresh processes that each import the app and run its lifespan; nothing is
+shared between them but the database files.
+
+For a pre-fork server that imports the app once in the master:
+
+    gunicorn -c gunicorn.conf.py main:app
+"""
+import argparse
+import uvicorn
+from core.config import settings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the notes API")
+    parser.add_argument("--host", default=settings.HOST)
+    parser.add_argument("--port", type=int, default=settings.PORT)
+    parser.add_argument("--workers", type=int, default=settings.WEB_CONCURRENCY)
+    parser.add_argument("--migrate", action="store_true", help="apply pending migrations first")
+    parser.add_argument("--seed", action="store_true", help="migrate, then add the demo tenants and users")
+    args = parser.parse_args()
+
+    if args.migrate or args.seed:
+        from core.database_sqlite import engine
+        from core.migrate_sqlite import upgrade
+
+        upgrade(engine)
+        if args.seed:
+            from core.seed_sqlite import seed
+
+            seed()
+        # Workers open their own connections
+        engine.dispose()
+
+    uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers, proxy_headers=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Batch update/delete of a selection of notes.
+
+Each call loads the whole selection with one IN query and applies it in one
+transaction: one quota adjustment, one change-log version and one event
+publish for all of it. Ids that don't exist or belong to another tenant get a
+per-id 404 and are skipped; the rest are still applied.
+"""
+from datetime import datetime
+from sqlalchemy import delete, select
+from core.events import note_events
+from models.note_sqlite import Note
+from services.changes_sqlite import record_changes
+from services.quota_sqlite import adjust_storage, ensure_usage, note_size, release_notes
+from services.stats_sqlite import record_activity
+from services.revisions_sqlite import delete_revisions, record_revisions
+from services.search_sqlite import index_notes, unindex_notes
+
+NOT_FOUND = {"status": 404, "detail": "Note not found"}
+CONFLICT = {"status": 409, "detail": "Note was changed by someone else"}
+DUPLICATE = {"status": 400, "detail": "Duplicate id in batch"}
+
+
+async def load_tenant_notes(db, tenant_id: str, ids):
+    """Notes among `ids` that belong to the tenant, by id; others are simply absent."""
+    if not ids:
+        return {}
+    result = await db.execute(select(Note).where(Note.id.in_(set(ids)), Note.tenant_id == tenant_id))
+    return {note.id: note for note in result.scalars()}
+
+def _results(ids, applied, conflicts=None):
+    seen = set()
+    results = []
+    for note_id in ids:
+        if note_id in seen:
+            results.append({"id": note_id, **DUPLICATE})
+        elif note_id in applied:
+            results.append({"id": note_id, "status": 200, "version": applied[note_id].version})
+        elif conflicts and note_id in conflicts:
+            results.append({"id": note_id, **CONFLICT, "version": conflicts[note_id]})
+        else:
+            results.append({"id": note_id, **NOT_FOUND})
+        seen.add(note_id)
+    return results
+
+async def update_notes(db, tenant_id: str, updates, editor=None, plan_id=None):
+    """Apply {id, title, content[, owner, version]} updates within one tenant; per-id results in request order.
+
+    Items whose version doesn't match get a per-id 409. The flush is conditional
+    on the versions loaded here, so a concurrent write raises StaleDataError.
+    """
+    ids = [update.id for update in updates]
+    # Before the notes change: a later autoflush would put the new sizes in its scan
+    await ensure_usage(db, tenant_id)
+    notes = await load_tenant_notes(db, tenant_id, ids)
+    now = datetime.utcnow()
+    applied = {}
+    delta = 0
+    firsts = {}
+    conflicts = {}
+    for update in updates:
+        if update.id in notes and update.id not in firsts:
+            if update.version is not None and update.version != notes[update.id].version:
+                conflicts[update.id] = notes[update.id].version
+                notes.pop(update.id)
+            else:
+                firsts[update.id] = update
+    await record_revisions(db, tenant_id, plan_id, [
+        (notes[note_id], update.title, update.content) for note_id, update in firsts.items()
+    ], editor)
+    for update in updates:
+        db_note = notes.get(update.id)
+        if db_note is None or update.id in applied:
+            continue
+        delta += note_size(update.title, update.content) - note_size(db_note.title, db_note.content)
+        db_note.title = update.title
+        db_note.content = update.content
+        if update.owner is not None:
+            db_note.owner = update.owner
+        db_note.updatedAt = now
+        applied[update.id] = db_note
+
+    if applied:
+        await adjust_storage(db, tenant_id, delta)
+        await record_activity(db, tenant_id, editor, at=now, updated=len(applied), storage=delta)
+        await unindex_notes(db, list(applied))
+        await index_notes(db, [
+            {"id": note.id, "title": note.title, "content": note.content, "tenant_id": note.tenant_id}
+            for note in applied.values()
+        ])
+        version = await record_changes(db, tenant_id, list(applied))
+        await db.commit()
+        await note_events.publish(tenant_id, [
+            {"id": note_id, "deleted": False, "version": version} for note_id in applied
+        ])
+    return _results(ids, applied, conflicts)
+
+async def delete_notes(db, tenant_id: str, ids):
+    """Delete the tenant's notes among `ids`; per-id results in request order."""
+    notes = await load_tenant_notes(db, tenant_id, ids)
+    if notes:
+        size = sum(note_size(note.title, note.content) for note in notes.values())
+        await ensure_usage(db, tenant_id)
+        await release_notes(db, tenant_id, len(notes), size)
+        await record_activity(db, tenant_id, deleted=len(notes), storage=-size)
+        await unindex_notes(db, list(notes))
+        await delete_revisions(db, notes)
+        version = await record_changes(db, tenant_id, list(notes), deleted=True)
+        await db.execute(
+            delete(Note).where(Note.id.in_(list(notes))).execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        await note_events.publish(tenant_id, [
+            {"id": note_id, "deleted": True, "version": version} for note_id in notes
+        ])
+    return _results(ids, notes)
@@ -0,0 +1,145 @@
+import json
+import zlib
+from datetime import datetime
+from typing import Optional
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import insert
+from core.content_codec import encode_content
+from core.events import note_events
+from core.serialization import dumps
+from core.shards import note_ids
+from models.note_sqlite import Note
+from services.changes_sqlite import record_changes
+from services.quota_sqlite import ensure_usage, note_size, reserve_notes
+from services.stats_sqlite import apply_activity, tally
+from services.search_sqlite import index_notes
+
+BULK_BATCH_SIZE = 1000
+
+
+class NoteImport(BaseModel):
+    title: str
+    content: str
+    owner: Optional[int] = None
+    createdAt: Optional[datetime] = None
+    updatedAt: Optional[datetime] = None
+
+
+class BulkImportError(Exception):
+    def __init__(self, status_code: int, message: str, inserted: int, line: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+        self.inserted = inserted
+        self.line = line
+
+
+async def iter_ndjson(chunks):
+    # Split an async byte stream into (line number, object) without buffering the body
+    buffer = b""
+    line_no = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_no += 1
+            if line.strip():
+                yield line_no, line
+    if buffer.strip():
+        yield line_no + 1, buffer
+
+async def iter_json_array(body: bytes):
+    try:
+        items = json.loads(body)
+    except ValueError:
+        raise BulkImportError(400, "Body is not valid JSON", 0)
+    if not isinstance(items, list):
+        raise BulkImportError(400, "Expected a JSON array of notes", 0)
+    for index, item in enumerate(items, start=1):
+        yield index, item
+
+def _validate(line_no, raw, inserted):
+    try:
+        if isinstance(raw, (bytes, str)):
+            return NoteImport.model_validate_json(raw)
+        return NoteImport.model_validate(raw)
+    except ValidationError as exc:
+        raise BulkImportError(422, f"Invalid note: {exc.errors()[0]['msg']}", inserted, line_no)
+
+async def _insert_batch(db, batch, user, enforce: bool):
+    now = datetime.utcnow()
+    rows = [
+        {
+            "title": note.title,
+            "content": note.content,
+            "owner": note.owner if note.owner is not None else user.id,
+            "tenant_id": user.tenant_id,
+            "createdAt": note.createdAt or now,
+            "updatedAt": note.updatedAt or note.createdAt or now,
+        }
+        for note in batch
+    ]
+    # Before the batch's transaction writes (see NoteIds); None leaves numbering to the database
+    ids = await note_ids.take(len(rows))
+    if ids:
+        for row, note_id in zip(rows, ids):
+            row["id"] = note_id
+    # One quota check for the whole batch
+    size = sum(note_size(row["title"], row["content"]) for row in rows)
+    await ensure_usage(db, user.tenant_id)
+    if not await reserve_notes(db, user.tenant_id, len(rows), size, enforce=enforce):
+        return False
+    result = await db.execute(
+        insert(Note).returning(Note.id, sort_by_parameter_order=True),
+        [{**row, "content": encode_content(db, user.tenant_id, row["content"])} for row in rows],
+    )
+    for row, note_id in zip(rows, result.scalars()):
+        row["id"] = note_id
+    await index_notes(db, rows)
+    # Counted when the notes say they were written, as the stats backfill does
+    activity = {}
+    for row in rows:
+        tally(activity, row["createdAt"], row["owner"], created=1, storage=note_size(row["title"], row["content"]))
+    await apply_activity(db, user.tenant_id, activity)
+    version = await record_changes(db, user.tenant_id, [row["id"] for row in rows])
+    await db.commit()
+    await note_events.publish(user.tenant_id, [
+        {"id": row["id"], "deleted": False, "version": version} for row in rows
+    ])
+    return True
+
+async def import_notes(db, items, user, enforce: bool = True, batch_size: int = BULK_BATCH_SIZE):
+    """Validate and insert notes in batches, one transaction per batch."""
+    inserted = 0
+    batch = []
+    async for line_no, raw in items:
+        batch.append(_validate(line_no, raw, inserted))
+        if len(batch) >= batch_size:
+            if not await _insert_batch(db, batch, user, enforce):
+                await db.rollback()
+                raise BulkImportError(403, "Plan note limit reached. Upgrade to Pro.", inserted)
+            inserted += len(batch)
+            batch = []
+    if batch:
+        if not await _insert_batch(db, batch, user, enforce):
+            await db.rollback()
+            raise BulkImportError(403, "Plan note limit reached. Upgrade to Pro.", inserted)
+        inserted += len(batch)
+    return inserted
+
+async def ndjson_lines(rows, to_dict):
+    async for row in rows:
+        yield dumps(to_dict(row)) + b"\n"
+
+async def gzip_json_array(rows, to_dict):
+    # Streamed gzip of a JSON array; only one row is ever held in memory
+    compressor = zlib.compressobj(wbits=31)
+    yield compressor.compress(b"[")
+    first = True
+    async for row in rows:
+        prefix = b"" if first else b","
+        first = False
+        out = compressor.compress(prefix + dumps(to_dict(row)))
+        if out:
+            yield out
+    yield compressor.compress(b"]") + compressor.flush()
@@ -0,0 +1,116 @@
+"""
+Note change log for incremental sync.
+
+Every note-mutating transaction takes the next per-tenant version (an UPDATE
+on the tenant's tenant_versions row, so concurrent writers to one tenant
+commit in version order) and upserts one note_changes row per touched note.
+Clients hold a (version, note_id) cursor and ask for everything after it.
+
+    python -m services.changes_sqlite prune --days 30
+"""
+import argparse
+from datetime import datetime, timedelta
+from sqlalchemy import and_, delete, or_, select, update
+from core.shards import TenantMoved
+from models.note_change_sqlite import NoteChange
+from models.tenant_version_sqlite import TenantVersion
+from services.quota_sqlite import insert_for
+
+
+async def next_version(db, tenant_id: str) -> int:
+    # A tenant that moved to another shard leaves a fenced row behind; writes there must fail
+    stmt = (
+        update(TenantVersion)
+        .where(TenantVersion.tenant_id == tenant_id, TenantVersion.moved_to.is_(None))
+        .values(version=TenantVersion.version + 1)
+        .returning(TenantVersion.version)
+        .execution_options(synchronize_session=False)
+    )
+    version = (await db.execute(stmt)).scalar()
+    if version is None:
+        await db.execute(
+            insert_for(db)(TenantVersion)
+            .values(tenant_id=tenant_id, version=0, pruned_through=0)
+            .on_conflict_do_nothing(index_elements=["tenant_id"])
+        )
+        version = (await db.execute(stmt)).scalar()
+        if version is None:
+            moved_to = await db.scalar(select(TenantVersion.moved_to).where(TenantVersion.tenant_id == tenant_id))
+            raise TenantMoved(tenant_id, moved_to)
+    return version
+
+async def current_version(db, tenant_id: str) -> int:
+    version = await db.scalar(select(TenantVersion.version).where(TenantVersion.tenant_id == tenant_id))
+    return version or 0
+
+async def record_changes(db, tenant_id: str, note_ids, deleted: bool = False) -> int:
+    """Log notes as changed (or deleted) in the caller's transaction; returns the new version."""
+    version = await next_version(db, tenant_id)
+    now = datetime.utcnow()
+    insert = insert_for(db)(NoteChange)
+    await db.execute(
+        insert.on_conflict_do_update(
+            index_elements=["tenant_id", "note_id"],
+            set_={"version": insert.excluded.version, "deleted": insert.excluded.deleted,
+                  "changedAt": insert.excluded.changedAt},
+        ),
+        [
+            {"tenant_id": tenant_id, "note_id": note_id, "version": version,
+             "deleted": int(deleted), "changedAt": now}
+            for note_id in note_ids
+        ],
+    )
+    return version
+
+async def pruned_through(db, tenant_id: str) -> int:
+    value = await db.scalar(select(TenantVersion.pruned_through).where(TenantVersion.tenant_id == tenant_id))
+    return value or 0
+
+def changes_query(tenant_id: str, version: int, note_id: int):
+    return (
+        select(NoteChange.version, NoteChange.note_id, NoteChange.deleted)
+        .where(
+            NoteChange.tenant_id == tenant_id,
+            or_(
+                NoteChange.version > version,
+                and_(NoteChange.version == version, NoteChange.note_id > note_id),
+            ),
+        )
+        .order_by(NoteChange.version, NoteChange.note_id)
+    )
+
+async def prune_tombstones(db, older_than: datetime):
+    """Drop delete markers older than `older_than`; cursors from before them must resync."""
+    tombstones = and_(NoteChange.deleted == 1, NoteChange.changedAt < older_than)
+    horizons = await db.execute(
+        select(NoteChange.tenant_id, NoteChange.version).where(tombstones)
+    )
+    latest = {}
+    for tenant_id, version in horizons:
+        latest[tenant_id] = max(version, latest.get(tenant_id, 0))
+    for tenant_id, version in latest.items():
+        await db.execute(
+            update(TenantVersion)
+            .where(TenantVersion.tenant_id == tenant_id, TenantVersion.pruned_through < version)
+            .values(pruned_through=version)
+        )
+    result = await db.execute(delete(NoteChange).where(tombstones))
+    await db.commit()
+    return result.rowcount
+
+if __name__ == "__main__":
+    import asyncio
+    from core.shards import shard_sessions
+
+    parser = argparse.ArgumentParser(description="Note change log maintenance")
+    parser.add_argument("command", choices=["prune"])
+    parser.add_argument("--days", type=int, default=30, help="keep tombstones this many days")
+    args = parser.parse_args()
+
+    async def main():
+        removed = 0
+        async for db in shard_sessions():
+            removed += await prune_tombstones(db, datetime.utcnow() - timedelta(days=args.days))
+        print(f"Pruned {removed} tombstones")
+
+    asyncio.run(main())
@@ -0,0 +1,115 @@
+"""
+Note body compression maintenance (see core.content_codec).
+
+    python -m services.compression_sqlite train TENANT [--size BYTES] [--samples N]
+    python -m services.compression_sqlite compress [--tenant TENANT]
+
+`train` builds a zstd dictionary from a sample of the tenant's notes; new
+writes of that tenant use it from then on. `compress` rewrites existing rows
+into the current NOTE_COMPRESSION form (compressing, recompressing with the
+tenant's newest dictionary, or decompressing when compression is off). It
+commits per batch and skips rows edited meanwhile, so it can run next to the
+app; it changes neither a note's version nor its updatedAt.
+"""
+import argparse
+from sqlalchemy import Text, insert, select, type_coerce, update
+from core import content_codec
+from core.content_codec import compress, decompress, dictionaries
+from models.compression_dict_sqlite import CompressionDict
+from models.note_sqlite import Note
+
+DICT_SIZE = 16 * 1024
+DICT_SAMPLES = 2000
+COMPRESS_BATCH_SIZE = 500
+
+# The stored value as-is, bypassing the column's decoding
+_raw_content = type_coerce(Note.content, Text)
+
+
+def _stored_size(value) -> int:
+    return len(value) if isinstance(value, bytes) else len(value.encode())
+
+def train_dictionary(db, tenant_id: str, size: int = DICT_SIZE, samples: int = DICT_SAMPLES) -> int:
+    """Train and store a dictionary from the tenant's most recent notes; returns its id."""
+    if content_codec.zstandard is None:
+        raise RuntimeError("Training a dictionary needs the zstandard package")
+    bodies = [
+        body.encode() for body in db.execute(
+            select(Note.content).where(Note.tenant_id == tenant_id).order_by(Note.updatedAt.desc()).limit(samples)
+        ).scalars()
+    ]
+    if len(bodies) < 10:
+        raise ValueError(f"Tenant {tenant_id} has too few notes to train a dictionary ({len(bodies)})")
+    data = content_codec.zstandard.train_dictionary(size, bodies).as_bytes()
+    dict_id = db.execute(
+        insert(CompressionDict).values(tenant_id=tenant_id, data=data, sample_count=len(bodies))
+        .returning(CompressionDict.id)
+    ).scalar()
+    db.commit()
+    return dict_id
+
+def compress_notes(db, tenant_id: str = None, batch_size: int = COMPRESS_BATCH_SIZE, log=print):
+    """Rewrite note bodies whose stored form differs from what a write would store now."""
+    scanned = rewritten = before = after = 0
+    last_id = 0
+    while True:
+        stmt = (
+            select(Note.id, Note.tenant_id, Note.version, _raw_content.label("stored"))
+            .where(Note.id > last_id)
+            .order_by(Note.id)
+            .limit(batch_size)
+        )
+        if tenant_id is not None:
+            stmt = stmt.where(Note.tenant_id == tenant_id)
+        rows = db.execute(stmt).all()
+        if not rows:
+            break
+        for row in rows:
+            dict_id = dictionaries.current(row.tenant_id) if content_codec.NOTE_COMPRESSION == "zstd" else 0
+            target = compress(decompress(row.stored), dict_id)
+            before += _stored_size(row.stored)
+            if target == row.stored:
+                after += _stored_size(row.stored)
+                continue
+            # Conditional on the version read, so a concurrent edit wins
+            result = db.execute(
+                update(Note.__table__)
+                .where(Note.id == row.id, Note.version == row.version)
+                .values(content=target)
+            )
+            if result.rowcount:
+                rewritten += 1
+                after += _stored_size(target)
+            else:
+                after += _stored_size(row.stored)
+        db.commit()
+        scanned += len(rows)
+        last_id = rows[-1].id
+        log(f"{scanned} notes scanned, {rewritten} rewritten")
+    return {"scanned": scanned, "rewritten": rewritten, "bytes_before": before, "bytes_after": after}
+
+if __name__ == "__main__":
+    from core.shards import current_shard, shard_names, shard_sync_session
+
+    parser = argparse.ArgumentParser(description="Note body compression maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+    train = commands.add_parser("train", help="train a zstd dictionary for a tenant")
+    train.add_argument("tenant")
+    train.add_argument("--size", type=int, default=DICT_SIZE, help="dictionary size in bytes")
+    train.add_argument("--samples", type=int, default=DICT_SAMPLES, help="notes to sample")
+    backfill = commands.add_parser("compress", help="rewrite stored bodies in the current form")
+    backfill.add_argument("--tenant", help="only this tenant's notes")
+    args = parser.parse_args()
+
+    if args.command == "train":
+        # The tenant's shard, which sees the catalog's compression_dicts through the attachment
+        with shard_sync_session(current_shard(args.tenant)) as session:
+            dict_id = train_dictionary(session, args.tenant, args.size, args.samples)
+        print(f"Stored dictionary {dict_id}; run `compress --tenant {args.tenant}` to apply it to existing notes")
+    else:
+        names = [current_shard(args.tenant)] if args.tenant else shard_names()
+        for name in names:
+            with shard_sync_session(name) as session:
+                stats = compress_notes(session, args.tenant)
+            print(f"{name}: {stats['rewritten']} of {stats['scanned']} notes rewritten, "
+                  f"{stats['bytes_before']} -> {stats['bytes_after']} bytes")
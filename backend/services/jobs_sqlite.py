@@ -0,0 +1,92 @@
+"""
+Background job handlers (see core.jobs). Importing this module registers them.
+
+    invite.deliver   high     create an invited user and mail them a one-time password
+    usage.recompute  default  rebuild a tenant's quota counters from its rows
+    search.reindex   low      rebuild a tenant's full-text index rows
+    stats.backfill   low      count a tenant's notes from before the stats rollups into them
+"""
+import logging
+import secrets
+import time
+from sqlalchemy import select
+from core.database_sqlite import AsyncSessionLocal
+from core.jobs import JobFailed, enqueue, handler
+from core.mailer import send_mail
+from core.passwords import hash_password
+from core.principal_cache import principal_cache
+from core.response_cache import announce_version
+from core.shards import UnknownTenant, tenant_session
+from models.user_sqlite import User
+from services.changes_sqlite import next_version
+from services.quota_sqlite import ensure_usage, recompute_usage, reserve_member
+from services.search_sqlite import reindex_tenant
+from services.stats_sqlite import STATS_BACKFILL_SLICE, backfill_chunk
+
+logger = logging.getLogger(__name__)
+
+
+@handler("invite.deliver")
+async def deliver_invite(payload: dict):
+    email, role, tenant_id = payload.get("email"), payload.get("role"), payload.get("tenant_id")
+    if not email:
+        raise JobFailed("Invitation without an email address")
+    # The one-time password only exists here and in the mail, never in the queue
+    temporary_password = secrets.token_urlsafe(12)
+    hashed_password = await hash_password(temporary_password)
+    try:
+        async with tenant_session(tenant_id) as db:
+            if (await db.execute(select(User.id).where(User.username == email))).first():
+                raise JobFailed("User with this email already exists")
+            # Member seats count against the plan, admins are not limited
+            await ensure_usage(db, tenant_id)
+            if role == "member" and not await reserve_member(db, tenant_id):
+                raise JobFailed("Plan member limit reached")
+            db.add(User(username=email, password=hashed_password, role=role, tenant_id=tenant_id,
+                        name="", plan="free"))
+            version = await next_version(db, tenant_id)
+            await db.flush()
+            # Sent before the commit: a failed send is retried with a new password and no user
+            # left behind, a failed commit at worst leaves a mail that a retry supersedes
+            await send_mail(email, "You have been invited to Notes",
+                            f"You have been added to {tenant_id} as {role}.\n\n"
+                            f"Sign in as {email} with the one-time password {temporary_password}\n")
+            await db.commit()
+    except UnknownTenant:
+        raise JobFailed(f"Tenant {tenant_id} not found")
+    principal_cache.invalidate_user(email)
+    await announce_version(tenant_id, version)
+
+@handler("usage.recompute")
+async def recompute_tenant_usage(payload: dict):
+    tenant_id = payload["tenant_id"]
+    async with tenant_session(tenant_id) as db:
+        await recompute_usage(db, tenant_id)
+        await db.commit()
+
+@handler("search.reindex")
+async def reindex_tenant_notes(payload: dict):
+    tenant_id = payload["tenant_id"]
+    async with tenant_session(tenant_id) as db:
+        indexed = await reindex_tenant(db, tenant_id)
+        await db.commit()
+    logger.info("Reindexed %s notes of tenant %s", indexed, tenant_id)
+
+@handler("stats.backfill")
+async def backfill_tenant_stats(payload: dict):
+    tenant_id = payload["tenant_id"]
+    deadline = time.monotonic() + STATS_BACKFILL_SLICE
+    counted = 0
+    async with tenant_session(tenant_id) as db:
+        # Each chunk commits with its cursor, so a cancelled or failed run loses at most one chunk of work
+        while time.monotonic() < deadline:
+            chunk = await backfill_chunk(db, tenant_id)
+            if not chunk:
+                logger.info("Stats backfill of tenant %s finished (%s notes in this run)", tenant_id, counted)
+                return
+            counted += chunk
+    # Out of time: hand over to a new job rather than run into JOB_TIMEOUT
+    async with AsyncSessionLocal() as db:
+        await enqueue(db, "stats.backfill", payload, lane="low", tenant_id=tenant_id)
+        await db.commit()
+    logger.info("Stats backfill of tenant %s counted %s notes, continuing", tenant_id, counted)
@@ -0,0 +1,118 @@
+from sqlalchemy import LargeBinary, cast, func, literal, or_, select, update
+from sqlalchemy.dialects import sqlite
+from models.note_sqlite import Note
+from models.plan_sqlite import Plan
+from models.tenant_sqlite import Tenant
+from models.tenant_usage_sqlite import TenantUsage
+from models.user_sqlite import User
+
+# Compressed notes decoded per query while counting a tenant's storage
+USAGE_SCAN_BATCH_SIZE = 1000
+
+
+def note_size(title: str, content: str) -> int:
+    return len(title.encode()) + len(content.encode())
+
+def insert_for(db):
+    # INSERT ... ON CONFLICT needs the dialect-specific construct
+    if db.get_bind().dialect.name == "postgresql":
+        # Imported here: the Postgres dialect is a noticeable share of cold start
+        from sqlalchemy.dialects import postgresql
+
+        return postgresql.insert
+    return sqlite.insert
+
+def _plan_limit(column):
+    # Limit of the tenant's current plan, correlated to the tenant_usage row
+    return (
+        select(column)
+        .select_from(Plan)
+        .join(Tenant, Tenant.plan == Plan.id)
+        .where(Tenant.id == TenantUsage.tenant_id)
+        .scalar_subquery()
+    )
+
+def _byte_length(column):
+    return func.coalesce(func.sum(func.length(cast(column, LargeBinary))), 0)
+
+async def text_storage(db, tenant_id: str) -> int:
+    """The tenant's note storage by note_size, so at text size even where bodies are stored compressed."""
+    notes = Note.tenant_id == tenant_id
+    if db.get_bind().dialect.name != "sqlite":
+        return await db.scalar(select(_byte_length(Note.title) + _byte_length(Note.content)).where(notes))
+    # Plain TEXT rows are summed in SQL; only compressed BLOBs (core.content_codec) are decoded
+    compressed = func.typeof(Note.content) == "blob"
+    total = await db.scalar(select(_byte_length(Note.title) + _byte_length(Note.content)).where(notes, ~compressed))
+    last_id = 0
+    while True:
+        rows = (await db.execute(
+            select(Note.id, Note.title, Note.content)
+            .where(notes, compressed, Note.id > last_id)
+            .order_by(Note.id)
+            .limit(USAGE_SCAN_BATCH_SIZE)
+        )).all()
+        if not rows:
+            return total
+        total += sum(note_size(row.title, row.content) for row in rows)
+        last_id = rows[-1].id
+
+async def ensure_usage(db, tenant_id: str):
+    """Build the tenant's counters from one scan if it has none yet.
+
+    Call it before the transaction writes the tenant's notes or users: the scan
+    sees that transaction's own writes, which _bump would then count again.
+    """
+    if await db.scalar(select(TenantUsage.tenant_id).where(TenantUsage.tenant_id == tenant_id)) is not None:
+        return
+    values = select(
+        literal(tenant_id, TenantUsage.tenant_id.type),
+        select(func.count()).select_from(Note).where(Note.tenant_id == tenant_id).scalar_subquery(),
+        literal(await text_storage(db, tenant_id)),
+        select(func.count()).select_from(User).where(User.tenant_id == tenant_id, User.role == "member").scalar_subquery(),
+    )
+    stmt = insert_for(db)(TenantUsage).from_select(
+        ["tenant_id", "note_count", "storage_bytes", "member_count"], values
+    ).on_conflict_do_nothing(index_elements=["tenant_id"])
+    await db.execute(stmt)
+
+async def _bump(db, tenant_id: str, notes=0, storage=0, members=0, enforce=False):
+    # A pure increment: False if a limit was hit, or if the counters weren't seeded
+    # (ensure_usage), in which case the write is counted by the later scan instead
+    stmt = update(TenantUsage).where(TenantUsage.tenant_id == tenant_id)
+    if enforce:
+        if notes > 0:
+            limit = _plan_limit(Plan.max_notes)
+            stmt = stmt.where(or_(limit.is_(None), TenantUsage.note_count + notes <= limit))
+        if storage > 0:
+            limit = _plan_limit(Plan.max_storage_bytes)
+            stmt = stmt.where(or_(limit.is_(None), TenantUsage.storage_bytes + storage <= limit))
+        if members > 0:
+            limit = _plan_limit(Plan.max_members)
+            stmt = stmt.where(or_(limit.is_(None), TenantUsage.member_count + members <= limit))
+    stmt = stmt.values(
+        note_count=TenantUsage.note_count + notes,
+        storage_bytes=TenantUsage.storage_bytes + storage,
+        member_count=TenantUsage.member_count + members,
+    ).execution_options(synchronize_session=False)
+
+    result = await db.execute(stmt)
+    return bool(result.rowcount)
+
+async def reserve_notes(db, tenant_id: str, count: int, size: int, enforce: bool = True) -> bool:
+    """Atomically count new notes against the tenant's plan; False if over quota."""
+    return await _bump(db, tenant_id, notes=count, storage=size, enforce=enforce)
+
+async def release_notes(db, tenant_id: str, count: int, size: int):
+    await _bump(db, tenant_id, notes=-count, storage=-size)
+
+async def adjust_storage(db, tenant_id: str, delta: int):
+    if delta:
+        await _bump(db, tenant_id, storage=delta)
+
+async def reserve_member(db, tenant_id: str, enforce: bool = True) -> bool:
+    return await _bump(db, tenant_id, members=1, enforce=enforce)
+
+async def recompute_usage(db, tenant_id: str):
+    # Reconciliation: rebuild the counters from the source tables
+    await db.execute(TenantUsage.__table__.delete().where(TenantUsage.tenant_id == tenant_id))
+    await ensure_usage(db, tenant_id)
@@ -0,0 +1,211 @@
+"""
+Note revision history.
+
+Every edit of a note's title or content appends a revision. Revisions form
+chains: a chain starts with a "snapshot" holding the full content, and each
+later revision is a "delta" against the one before it (a line diff stored as
+copy ranges plus inserted text). A new chain starts once the tenant plan's
+revision_snapshot_every is reached, or when a delta would be over half the
+size of the note. Reading revision r is one range query over its chain.
+Large snapshots are stored compressed, as note bodies are (NOTE_COMPRESSION).
+
+A note has no history until its first edit; that edit also records the
+pre-edit state as revision 1. Deltas are computed against the note's current
+content, so every content write must go through record_revisions.
+
+Retention (revision_limit, revision_retention_days on the plan) only drops
+whole chains, so no row is ever rewritten; up to one chain of revisions past
+the limit may be kept.
+
+    python -m services.revisions_sqlite prune
+"""
+import argparse
+import json
+from collections import namedtuple
+from datetime import datetime, timedelta
+from difflib import SequenceMatcher
+from itertools import accumulate
+from sqlalchemy import and_, delete, func, insert, select
+from core.content_codec import encode_content
+from core.serialization import dumps
+from models.note_revision_sqlite import NoteRevision
+from models.note_sqlite import Note
+from models.plan_sqlite import Plan
+from models.tenant_sqlite import Tenant
+
+RevisionPolicy = namedtuple("RevisionPolicy", "limit retention_days snapshot_every")
+DEFAULT_POLICY = RevisionPolicy(limit=None, retention_days=None, snapshot_every=20)
+
+# Plans are reference data with no write endpoint; read them once per process
+_policies = {}
+
+
+def make_delta(old: str, new: str):
+    """Edit script turning `old` into `new`: [start, end] copies from old, strings are inserted."""
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    offsets = [0, *accumulate(len(line) for line in old_lines)]
+    ops = []
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, old_lines, new_lines).get_opcodes():
+        if tag == "equal":
+            ops.append([offsets[i1], offsets[i2]])
+        elif j2 > j1:
+            ops.append("".join(new_lines[j1:j2]))
+    return ops
+
+def apply_delta(old: str, ops) -> str:
+    return "".join(old[op[0]:op[1]] if isinstance(op, list) else op for op in ops)
+
+async def plan_policy(db, plan_id) -> RevisionPolicy:
+    if plan_id not in _policies:
+        for plan in (await db.execute(select(Plan))).scalars():
+            _policies[plan.id] = RevisionPolicy(
+                plan.revision_limit, plan.revision_retention_days, plan.revision_snapshot_every or 1
+            )
+    return _policies.get(plan_id, DEFAULT_POLICY)
+
+async def _latest(db, note_ids):
+    """(revision, base_revision) of each note's newest revision."""
+    newest = (
+        select(NoteRevision.note_id, func.max(NoteRevision.revision).label("revision"))
+        .where(NoteRevision.note_id.in_(note_ids))
+        .group_by(NoteRevision.note_id)
+        .subquery()
+    )
+    rows = await db.execute(
+        select(NoteRevision.note_id, NoteRevision.revision, NoteRevision.base_revision)
+        .join(newest, and_(NoteRevision.note_id == newest.c.note_id, NoteRevision.revision == newest.c.revision))
+    )
+    return {note_id: (revision, base) for note_id, revision, base in rows}
+
+async def _drop_chains_before(db, note_id: int, keep_from: int):
+    # Everything before the snapshot that starts keep_from's chain is unreachable from it
+    base = await db.scalar(
+        select(func.max(NoteRevision.revision))
+        .where(NoteRevision.note_id == note_id, NoteRevision.kind == "snapshot", NoteRevision.revision <= keep_from)
+    )
+    if base:
+        await db.execute(delete(NoteRevision).where(NoteRevision.note_id == note_id, NoteRevision.revision < base))
+
+async def record_revisions(db, tenant_id: str, plan_id, edits, editor=None):
+    """Append a revision per (note, new_title, new_content) in the caller's transaction.
+
+    Call before the note is modified. Edits that change nothing are skipped.
+    """
+    edits = [(note, title, content) for note, title, content in edits
+             if title != note.title or content != note.content]
+    if not edits:
+        return
+    if plan_id is None:
+        plan_id = await db.scalar(select(Tenant.plan).where(Tenant.id == tenant_id))
+    policy = await plan_policy(db, plan_id)
+    latest = await _latest(db, [note.id for note, _, _ in edits])
+
+    now = datetime.utcnow()
+    rows = []
+    snapshotted = []
+    for note, title, content in edits:
+        revision, base = latest.get(note.id, (0, 0))
+        if not revision:
+            # First edit: keep the state being replaced
+            rows.append({"note_id": note.id, "revision": 1, "base_revision": 1, "kind": "snapshot",
+                         "title": note.title, "data": encode_content(db, tenant_id, note.content),
+                         "size": len(note.content), "editor": note.owner, "createdAt": note.updatedAt})
+            revision = base = 1
+        revision += 1
+        # A chain that is long enough closes without diffing; the delta is only computed to be stored
+        data = None
+        if revision - base < policy.snapshot_every:
+            data = dumps(make_delta(note.content, content)).decode()
+        if data is None or len(data) * 2 > len(content):
+            rows.append({"note_id": note.id, "revision": revision, "base_revision": revision, "kind": "snapshot",
+                         "title": title, "data": encode_content(db, tenant_id, content), "size": len(content),
+                         "editor": editor, "createdAt": now})
+            snapshotted.append((note.id, revision))
+        else:
+            rows.append({"note_id": note.id, "revision": revision, "base_revision": base, "kind": "delta",
+                         "title": title, "data": data, "size": len(content), "editor": editor, "createdAt": now})
+    await db.execute(insert(NoteRevision), rows)
+
+    # Enforce the count limit when a chain closes, so it costs nothing on other edits
+    if policy.limit:
+        for note_id, revision in snapshotted:
+            await _drop_chains_before(db, note_id, revision - policy.limit + 1)
+
+async def list_revisions(db, note_id: int, limit: int, before=None):
+    stmt = (
+        select(NoteRevision.revision, NoteRevision.title, NoteRevision.size, NoteRevision.kind,
+               NoteRevision.editor, NoteRevision.createdAt)
+        .where(NoteRevision.note_id == note_id)
+        .order_by(NoteRevision.revision.desc())
+        .limit(limit)
+    )
+    if before is not None:
+        stmt = stmt.where(NoteRevision.revision < before)
+    return [row._asdict() for row in await db.execute(stmt)]
+
+async def get_revision(db, note_id: int, revision: int):
+    """(revision row, reconstructed content), or None if it doesn't exist or was pruned."""
+    base = (
+        select(NoteRevision.base_revision)
+        .where(NoteRevision.note_id == note_id, NoteRevision.revision == revision)
+        .scalar_subquery()
+    )
+    chain = (await db.execute(
+        select(NoteRevision)
+        .where(NoteRevision.note_id == note_id, NoteRevision.revision >= base, NoteRevision.revision <= revision)
+        .order_by(NoteRevision.revision)
+    )).scalars().all()
+    if not chain or chain[-1].revision != revision or chain[0].kind != "snapshot":
+        return None
+    content = chain[0].data
+    for row in chain[1:]:
+        content = apply_delta(content, json.loads(row.data))
+    return chain[-1], content
+
+async def delete_revisions(db, note_ids):
+    await db.execute(delete(NoteRevision).where(NoteRevision.note_id.in_(list(note_ids))))
+
+async def prune_revisions(db, now: datetime = None):
+    """Apply every plan's revision limit and age retention; returns revisions removed."""
+    now = now or datetime.utcnow()
+    before = await db.scalar(select(func.count()).select_from(NoteRevision))
+    for plan in (await db.execute(select(Plan))).scalars():
+        if not plan.revision_limit and not plan.revision_retention_days:
+            continue
+        cutoff = now - timedelta(days=plan.revision_retention_days or 0)
+        oldest_kept = func.min(NoteRevision.revision).filter(NoteRevision.createdAt >= cutoff)
+        stmt = (
+            select(NoteRevision.note_id, func.max(NoteRevision.revision), oldest_kept)
+            .join(Note, Note.id == NoteRevision.note_id)
+            .join(Tenant, Tenant.id == Note.tenant_id)
+            .where(Tenant.plan == plan.id)
+            .group_by(NoteRevision.note_id)
+        )
+        for note_id, latest, recent in (await db.execute(stmt)).all():
+            keep_from = 1
+            if plan.revision_retention_days:
+                # The latest revision is kept however old it is
+                keep_from = recent or latest
+            if plan.revision_limit:
+                keep_from = max(keep_from, latest - plan.revision_limit + 1)
+            if keep_from > 1:
+                await _drop_chains_before(db, note_id, keep_from)
+    await db.commit()
+    return before - await db.scalar(select(func.count()).select_from(NoteRevision))
+
+if __name__ == "__main__":
+    import asyncio
+    from core.shards import shard_sessions
+
+    parser = argparse.ArgumentParser(description="Note revision maintenance")
+    parser.add_argument("command", choices=["prune"])
+    args = parser.parse_args()
+
+    async def main():
+        removed = 0
+        async for db in shard_sessions():
+            removed += await prune_revisions(db)
+        print(f"Pruned {removed} revisions")
+
+    asyncio.run(main())
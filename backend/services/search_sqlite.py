@@ -0,0 +1,212 @@
+import html
+import re
+import sys
+from sqlalchemy import select, text
+from models.note_sqlite import Note
+
+# Notes are copied into a regular FTS5 table (rowid = note id) rather than an
+# external-content one, so snippets never depend on how notes store content.
+# tenant_key is an indexed single-token column, so a search only walks the
+# postings that are in the caller's tenant as well as matching the query.
+# Prefix indexes keep the last, prefix term (fts_query) from merging the
+# doclists of every word that starts with it.
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5("
+    "tenant_key, title, content, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+]
+POSTGRES_DDL = [
+    "CREATE INDEX IF NOT EXISTS ix_notes_search ON notes USING GIN "
+    "(to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(content, '')))",
+]
+REBUILD_BATCH_SIZE = 5000
+
+_token_re = re.compile(r"\w+", re.UNICODE)
+
+# Highlight markers from the database, private-use characters that become <mark> once the text is escaped
+MARK_START, MARK_END = "\ue000", "\ue001"
+
+_FTS_INSERT = text(
+    "INSERT INTO notes_fts (rowid, tenant_key, title, content) VALUES (:id, :tenant_key, :title, :content)"
+)
+# By tenant through the index; a plain WHERE on an FTS column scans the whole table
+FTS_DELETE_TENANT = text(
+    "DELETE FROM notes_fts WHERE rowid IN (SELECT rowid FROM notes_fts WHERE notes_fts MATCH :match)"
+)
+
+
+def tenant_key(tenant_id: str) -> str:
+    # One token whatever the id contains ("acme-eu" would be two), so no tenant's key matches another's
+    return "t" + tenant_id.encode().hex()
+
+def tenant_match(tenant_id: str) -> str:
+    return f'tenant_key : "{tenant_key(tenant_id)}"'
+
+def fts_row(note) -> dict:
+    """The index row of a note given as a mapping with id/tenant_id/title/content."""
+    return {"id": note["id"], "tenant_key": tenant_key(note["tenant_id"]),
+            "title": note["title"], "content": note["content"]}
+
+def search_ddl(dialect: str):
+    return POSTGRES_DDL if dialect == "postgresql" else SQLITE_DDL
+
+def fts_query(q: str):
+    # Quote every term so user input can't inject FTS5 syntax; last term is a prefix
+    terms = _token_re.findall(q)
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+def marked(value: str) -> str:
+    # Note text is escaped; only the markers the search put in become HTML
+    return html.escape(value).replace(MARK_START, "<mark>").replace(MARK_END, "</mark>")
+
+def _dialect(db):
+    return db.get_bind().dialect.name
+
+async def index_note(db, note_id: int, tenant_id: str, title: str, content: str):
+    if _dialect(db) == "postgresql":
+        return
+    await db.execute(text("DELETE FROM notes_fts WHERE rowid = :id"), {"id": note_id})
+    await db.execute(
+        _FTS_INSERT,
+        fts_row({"id": note_id, "tenant_id": tenant_id, "title": title, "content": content}),
+    )
+
+async def index_notes(db, notes):
+    # Batch variant for freshly inserted notes (dicts with id/tenant_id/title/content)
+    if _dialect(db) == "postgresql" or not notes:
+        return
+    await db.execute(_FTS_INSERT, [fts_row(note) for note in notes])
+
+async def unindex_note(db, note_id: int):
+    if _dialect(db) == "postgresql":
+        return
+    await db.execute(text("DELETE FROM notes_fts WHERE rowid = :id"), {"id": note_id})
+
+async def unindex_notes(db, note_ids):
+    if _dialect(db) == "postgresql" or not note_ids:
+        return
+    await db.execute(text("DELETE FROM notes_fts WHERE rowid = :id"), [{"id": note_id} for note_id in note_ids])
+
+# Keyset paging on (rank, id): a page only ranks the tenant's matches, it never skips rows with OFFSET.
+# highlight/snippet run in the same statement; asked for by rowid afterwards, FTS5 re-reads the query's
+# doclists once per row.
+_BM25 = "bm25(notes_fts, 0.0, 5.0, 1.0)"
+_SQLITE_SEARCH = text(
+    f"SELECT rowid AS id, {_BM25} AS score, "
+    f"highlight(notes_fts, 1, '{MARK_START}', '{MARK_END}') AS title, "
+    f"snippet(notes_fts, 2, '{MARK_START}', '{MARK_END}', '…', 16) AS snippet "
+    "FROM notes_fts WHERE notes_fts MATCH :query "
+    f"AND (:after_rank IS NULL OR {_BM25} > :after_rank OR ({_BM25} = :after_rank AND rowid > :after_id)) "
+    "ORDER BY score, id LIMIT :limit"
+)
+
+_POSTGRES_DOCUMENT = "to_tsvector('simple', coalesce(notes.title, '') || ' ' || coalesce(notes.content, ''))"
+_POSTGRES_SEARCH = text(
+    "WITH q AS (SELECT websearch_to_tsquery('simple', :query) AS q), "
+    "page AS ("
+    "SELECT id, rank FROM ("
+    f"SELECT notes.id, -ts_rank({_POSTGRES_DOCUMENT}, q.q) AS rank FROM notes, q "
+    f"WHERE notes.tenant_id = :tenant_id AND {_POSTGRES_DOCUMENT} @@ q.q"
+    ") ranked "
+    "WHERE CAST(:after_rank AS double precision) IS NULL OR rank > :after_rank "
+    "OR (rank = :after_rank AND id > :after_id) "
+    "ORDER BY rank, id LIMIT :limit"
+    ") "
+    "SELECT notes.id, "
+    f"ts_headline('simple', notes.title, q.q, 'StartSel={MARK_START}, StopSel={MARK_END}, HighlightAll=true') AS title, "
+    f"ts_headline('simple', notes.content, q.q, 'StartSel={MARK_START}, StopSel={MARK_END}, MaxWords=16, MinWords=8') "
+    "AS snippet, page.rank "
+    "FROM page JOIN notes ON notes.id = page.id, q "
+    "ORDER BY page.rank, page.id"
+)
+
+async def search_notes(db, tenant_id: str, q: str, limit: int, after=None):
+    """Ranked matches for q within one tenant, after the (rank, id) of the previous page; lower rank is better."""
+    after_rank, after_id = after or (None, 0)
+    params = {"tenant_id": tenant_id, "limit": limit, "after_rank": after_rank, "after_id": after_id}
+    if _dialect(db) == "postgresql":
+        rows = [dict(row._mapping) for row in await db.execute(_POSTGRES_SEARCH, {**params, "query": q})]
+    else:
+        query = fts_query(q)
+        if query is None:
+            return []
+        # Only the caller's tenant's postings take part
+        params["query"] = f"{tenant_match(tenant_id)} AND {{title content}} : ({query})"
+        rows = [
+            {"id": row.id, "title": row.title, "snippet": row.snippet, "rank": row.score}
+            for row in await db.execute(_SQLITE_SEARCH, params)
+        ]
+    for row in rows:
+        row["title"], row["snippet"] = marked(row["title"]), marked(row["snippet"])
+    return rows
+
+async def reindex_tenant(db, tenant_id: str) -> int:
+    """Rebuild one tenant's index rows in the caller's transaction; returns the notes indexed."""
+    if _dialect(db) == "postgresql":
+        return 0
+    await db.execute(FTS_DELETE_TENANT, {"match": tenant_match(tenant_id)})
+    indexed = last_id = 0
+    while True:
+        rows = (await db.execute(
+            select(Note.id, Note.title, Note.content, Note.tenant_id)
+            .where(Note.tenant_id == tenant_id, Note.id > last_id)
+            .order_by(Note.id)
+            .limit(REBUILD_BATCH_SIZE)
+        )).all()
+        if not rows:
+            return indexed
+        await db.execute(_FTS_INSERT, [fts_row(row._mapping) for row in rows])
+        indexed += len(rows)
+        last_id = rows[-1].id
+
+def rebuild_index(db):
+    """Offline rebuild of the SQLite index from the notes table, in batches."""
+    if db.get_bind().dialect.name == "postgresql":
+        for ddl in POSTGRES_DDL:
+            db.execute(text(ddl))
+        db.commit()
+        return
+    for ddl in SQLITE_DDL:
+        db.execute(text(ddl))
+    db.execute(text("DELETE FROM notes_fts"))
+    db.commit()
+    last_id = 0
+    while True:
+        # Through the model so compressed bodies are indexed as text
+        rows = db.execute(
+            select(Note.id, Note.title, Note.content, Note.tenant_id)
+            .where(Note.id > last_id)
+            .order_by(Note.id)
+            .limit(REBUILD_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        db.execute(_FTS_INSERT, [fts_row(row._mapping) for row in rows])
+        db.commit()
+        last_id = rows[-1].id
+    db.execute(text("INSERT INTO notes_fts (notes_fts) VALUES ('optimize')"))
+    db.commit()
+
+def upgrade_index(db) -> bool:
+    """Replace an index from before tenant_key (tenant_id UNINDEXED) and refill it; False if already current."""
+    if db.get_bind().dialect.name == "postgresql":
+        return False
+    ddl = db.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'notes_fts'")).scalar()
+    if ddl is None or "tenant_key" in ddl:
+        return False
+    db.execute(text("DROP TABLE notes_fts"))
+    db.commit()
+    rebuild_index(db)
+    return True
+
+if __name__ == "__main__":
+    from core.shards import shard_names, shard_sync_session
+
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python -m services.search_sqlite rebuild")
+    for name in shard_names():
+        with shard_sync_session(name) as session:
+            rebuild_index(session)
@@ -0,0 +1,265 @@
+"""
+Tenant usage analytics, served from pre-aggregated rollups.
+
+Every note write calls record_activity in its own transaction. It bumps the
+tenant's row for the current hour (tenant_stats_hourly) and for the current
+day (tenant_stats_daily), and adds the writer to the day's authors. A stats
+request then reads at most `days` + `hours` rollup rows, however many notes
+the tenant has. Hourly rows are kept for STATS_HOURLY_RETENTION_DAYS and
+daily rows are kept for good.
+
+Notes written before the rollups existed are counted by the stats.backfill
+job. Migration 0011, or a shard file receiving the tables, records the newest
+note id of each tenant at that moment. The job walks the notes up to that id
+in chunks of STATS_BACKFILL_CHUNK and commits a cursor with each chunk, so a
+retried or continued job resumes where it stopped. Older edits come from the
+revision history, as far as its retention kept them.
+
+Notes deleted before the rollups existed left no row to count, so the
+backfilled history misses them: neither their creation, edits and storage,
+nor their deletion. Totals still agree with the usage counters, as both
+sides of those notes are missing, but created and deleted counts for days
+before the rollups are low by the notes deleted back then.
+
+    python -m services.stats_sqlite prune      # drop expired hourly rows
+    python -m services.stats_sqlite backfill   # queue the unfinished backfills of every shard
+"""
+import argparse
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, select, update
+from models.note_revision_sqlite import NoteRevision
+from models.note_sqlite import Note
+from models.tenant_stats_sqlite import TenantStatsAuthor, TenantStatsBackfill, TenantStatsDaily, TenantStatsHourly
+from models.tenant_usage_sqlite import TenantUsage
+from services.quota_sqlite import ensure_usage, insert_for, note_size
+
+STATS_HOURLY_RETENTION_DAYS = int(os.getenv("STATS_HOURLY_RETENTION_DAYS", "14"))
+STATS_BACKFILL_CHUNK = int(os.getenv("STATS_BACKFILL_CHUNK", "500"))
+# A backfill job hands over to a new job after this many seconds, well within JOB_TIMEOUT
+STATS_BACKFILL_SLICE = float(os.getenv("STATS_BACKFILL_SLICE", "30"))
+
+COUNTERS = ("notes_created", "notes_updated", "notes_deleted", "storage_delta")
+
+
+def tally(activity: dict, at: datetime, author=None, created=0, updated=0, deleted=0, storage=0):
+    """Add writes to `activity`, which maps (hour, author) to counts in COUNTERS order."""
+    counts = activity.setdefault((at.replace(minute=0, second=0, microsecond=0), author), [0, 0, 0, 0])
+    for index, value in enumerate((created, updated, deleted, storage)):
+        counts[index] += value
+
+async def _upsert(db, model, bucket: str, tenant_id: str, rows: dict, extra: dict = None):
+    table = model.__table__
+    stmt = insert_for(db)(table)
+    names = COUNTERS + tuple(extra or ())
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["tenant_id", bucket],
+        set_={name: table.c[name] + stmt.excluded[name] for name in names},
+    )
+    await db.execute(stmt, [
+        {"tenant_id": tenant_id, bucket: key, **dict(zip(COUNTERS, counts)),
+         **{name: values.get(key, 0) for name, values in (extra or {}).items()}}
+        for key, counts in rows.items()
+    ])
+
+async def apply_activity(db, tenant_id: str, activity: dict):
+    """Add tallied writes to the tenant's rollups in the caller's transaction."""
+    hourly, daily, authors = {}, {}, set()
+    for (hour, author), counts in activity.items():
+        if not any(counts):
+            continue
+        for rows, key in ((hourly, hour), (daily, hour.date())):
+            total = rows.setdefault(key, [0, 0, 0, 0])
+            for index, value in enumerate(counts):
+                total[index] += value
+        # Deleting doesn't make anyone an author
+        if author is not None and (counts[0] or counts[1]):
+            authors.add((hour.date(), author))
+    if not hourly:
+        return
+
+    new_authors = Counter()
+    insert = insert_for(db)
+    for day, user_id in sorted(authors):
+        added = await db.execute(
+            insert(TenantStatsAuthor.__table__)
+            .values(tenant_id=tenant_id, day=day, user_id=user_id)
+            .on_conflict_do_nothing(index_elements=["tenant_id", "day", "user_id"])
+        )
+        if added.rowcount:
+            new_authors[day] += 1
+    await _upsert(db, TenantStatsHourly, "hour", tenant_id, hourly)
+    await _upsert(db, TenantStatsDaily, "day", tenant_id, daily, {"active_authors": new_authors})
+
+async def record_activity(db, tenant_id: str, author=None, at: datetime = None, **counts):
+    """Count note writes (created/updated/deleted, storage delta) now, in the caller's transaction."""
+    activity = {}
+    tally(activity, at or datetime.utcnow(), author, **counts)
+    await apply_activity(db, tenant_id, activity)
+
+
+def _series(rows, keys, key_name: str, extra=()):
+    by_key = {getattr(row, key_name): row for row in rows}
+    names = COUNTERS + tuple(extra)
+    return [
+        {key_name: key, **{name: getattr(by_key[key], name) if key in by_key else 0 for name in names}}
+        for key in keys
+    ]
+
+async def tenant_stats(db, tenant_id: str, days: int = 30, hours: int = 24, now: datetime = None) -> dict:
+    """Usage totals plus the last `days` daily and `hours` hourly rollups, gaps filled with zeros."""
+    now = now or datetime.utcnow()
+    this_hour = now.replace(minute=0, second=0, microsecond=0)
+    hour_keys = [this_hour - timedelta(hours=offset) for offset in range(hours - 1, -1, -1)]
+    day_keys = [now.date() - timedelta(days=offset) for offset in range(days - 1, -1, -1)]
+
+    usage = await db.get(TenantUsage, tenant_id)
+    if usage is None:
+        # Counters are built once per tenant, then maintained (see quota_sqlite)
+        await ensure_usage(db, tenant_id)
+        await db.commit()
+        usage = await db.get(TenantUsage, tenant_id)
+    hourly = (await db.execute(
+        select(TenantStatsHourly)
+        .where(TenantStatsHourly.tenant_id == tenant_id, TenantStatsHourly.hour >= hour_keys[0])
+    )).scalars().all()
+    daily = (await db.execute(
+        select(TenantStatsDaily)
+        .where(TenantStatsDaily.tenant_id == tenant_id, TenantStatsDaily.day >= day_keys[0])
+    )).scalars().all()
+    # Bounded by members x days, not by notes
+    active_authors = await db.scalar(
+        select(func.count(func.distinct(TenantStatsAuthor.user_id)))
+        .where(TenantStatsAuthor.tenant_id == tenant_id, TenantStatsAuthor.day >= day_keys[0])
+    )
+    backfill = (await db.execute(
+        select(TenantStatsBackfill.finishedAt).where(TenantStatsBackfill.tenant_id == tenant_id)
+    )).first()
+
+    daily_series = _series(daily, day_keys, "day", ("active_authors",))
+    return {
+        "tenant_id": tenant_id,
+        "note_count": usage.note_count,
+        "storage_bytes": usage.storage_bytes,
+        "member_count": usage.member_count,
+        "active_authors": active_authors or 0,
+        "window": {name: sum(row[name] for row in daily_series) for name in COUNTERS},
+        "daily": daily_series,
+        "hourly": _series(hourly, hour_keys, "hour"),
+        # Whether days before the rollups existed are counted yet
+        "history_complete": backfill is None or backfill.finishedAt is not None,
+    }
+
+
+def _revision_size(revision) -> int:
+    # Revisions keep the content's length in characters, the same as note_size for ASCII
+    return len(revision.title.encode()) + revision.size
+
+async def backfill_chunk(db, tenant_id: str, limit: int = STATS_BACKFILL_CHUNK) -> int:
+    """Count the next `limit` pre-rollup notes into the rollups and commit; 0 once there are none left."""
+    state = (await db.execute(
+        select(TenantStatsBackfill).where(TenantStatsBackfill.tenant_id == tenant_id)
+    )).scalar_one_or_none()
+    if state is None or state.finishedAt is not None:
+        return 0
+    cursor, through_id, started = state.cursor, state.through_id, state.createdAt
+    notes = (await db.execute(
+        select(Note.id, Note.owner, Note.createdAt, Note.title, Note.content)
+        .where(Note.tenant_id == tenant_id, Note.id > cursor, Note.id <= through_id)
+        .order_by(Note.id)
+        .limit(limit)
+    )).all()
+
+    history = {}
+    if notes:
+        # Writes since `started` were counted as they happened, so each note is counted at its
+        # state then: its oldest kept revision from before (revision 1 is the state before the
+        # first edit), plus each older edit's change
+        revisions = await db.execute(
+            select(NoteRevision.note_id, NoteRevision.revision, NoteRevision.title, NoteRevision.size,
+                   NoteRevision.editor, NoteRevision.createdAt)
+            .where(NoteRevision.note_id.in_([note.id for note in notes]), NoteRevision.createdAt < started)
+            .order_by(NoteRevision.note_id, NoteRevision.revision)
+        )
+        for revision in revisions:
+            history.setdefault(revision.note_id, []).append(revision)
+
+    activity = {}
+    for note in notes:
+        revisions = history.get(note.id)
+        if not revisions:
+            # Never edited (or no history kept): its current size
+            tally(activity, note.createdAt, note.owner, created=1, storage=note_size(note.title, note.content))
+            continue
+        size = _revision_size(revisions[0])
+        tally(activity, note.createdAt, note.owner, created=1, storage=size)
+        if revisions[0].revision > 1:
+            # Retention dropped the revisions before this edit
+            tally(activity, revisions[0].createdAt, revisions[0].editor, updated=1)
+        for revision in revisions[1:]:
+            tally(activity, revision.createdAt, revision.editor, updated=1, storage=_revision_size(revision) - size)
+            size = _revision_size(revision)
+    if notes:
+        await apply_activity(db, tenant_id, activity)
+
+    values = {"cursor": notes[-1].id if notes else cursor}
+    if len(notes) < limit:
+        values["finishedAt"] = datetime.utcnow()
+    advanced = await db.execute(
+        update(TenantStatsBackfill)
+        .where(TenantStatsBackfill.tenant_id == tenant_id, TenantStatsBackfill.cursor == cursor)
+        .values(**values).execution_options(synchronize_session=False)
+    )
+    if not advanced.rowcount:
+        # Another job counted this chunk first
+        await db.rollback()
+        return 0
+    await db.commit()
+    return len(notes)
+
+def backfill_key(tenant_id: str, cursor: int) -> str:
+    # One job per tenant and starting point: queuing again only helps once it made progress
+    return f"stats.backfill:{tenant_id}:{cursor}"
+
+async def pending_backfills(db):
+    return (await db.execute(
+        select(TenantStatsBackfill.tenant_id, TenantStatsBackfill.cursor).where(TenantStatsBackfill.finishedAt.is_(None))
+    )).all()
+
+async def prune_hourly(db, now: datetime = None) -> int:
+    """Drop hourly rollups past STATS_HOURLY_RETENTION_DAYS; returns rows removed."""
+    cutoff = (now or datetime.utcnow()) - timedelta(days=STATS_HOURLY_RETENTION_DAYS)
+    result = await db.execute(delete(TenantStatsHourly).where(TenantStatsHourly.hour < cutoff))
+    await db.commit()
+    return result.rowcount
+
+if __name__ == "__main__":
+    import asyncio
+    from core.database_sqlite import AsyncSessionLocal
+    from core.jobs import enqueue
+    from core.shards import shard_sessions
+    from services import jobs_sqlite  # noqa: F401 (registers the job handlers)
+
+    parser = argparse.ArgumentParser(description="Tenant stats rollup maintenance")
+    parser.add_argument("command", choices=["prune", "backfill"])
+    args = parser.parse_args()
+
+    async def main():
+        if args.command == "prune":
+            removed = 0
+            async for db in shard_sessions():
+                removed += await prune_hourly(db)
+            print(f"Pruned {removed} hourly rollups")
+            return
+        tenants = []
+        async for db in shard_sessions():
+            tenants += await pending_backfills(db)
+        async with AsyncSessionLocal() as db:
+            for tenant_id, cursor in tenants:
+                await enqueue(db, "stats.backfill", {"tenant_id": tenant_id}, lane="low", tenant_id=tenant_id,
+                              key=backfill_key(tenant_id, cursor))
+            await db.commit()
+        print(f"Queued stats backfill for {len(tenants)} tenants")
+
+    asyncio.run(main())
@@ -1,16 +1,56 @@
 const API_URL = import.meta.env.VITE_API_URL;
 
 export const fetchNotes = async (token, tenant_id) => {
-  const res = await fetch(`${API_URL}/notes?tenant_id=${tenant_id}`, {
-    headers: {
-      Authorization: `Bearer ${token}`,
-      "Content-Type": "application/json",
-    },
-  });
-  if (!res.ok) throw new Error("Failed to fetch notes");
-  return res.json();
+  // Notes are paginated; follow X-Next-Cursor until the last page. The first
+  // page's X-Sync-Cursor is where fetchNoteChanges picks up from.
+  const notes = [];
+  let cursor = null;
+  let syncCursor = null;
+  do {
+    const params = new URLSearchParams({ tenant_id });
+    if (cursor) params.set("cursor", cursor);
+    const res = await fetch(`${API_URL}/notes?${params}`, {
+      headers: {
+        Authorization: `Bearer ${token}`,
+        "Content-Type": "application/json",
+      },
+    });
+    if (!res.ok) throw new Error("Failed to fetch notes");
+    notes.push(...(await res.json()));
+    syncCursor = syncCursor || res.headers.get("X-Sync-Cursor");
+    cursor = res.headers.get("X-Next-Cursor");
+  } while (cursor);
+  return { notes, syncCursor };
 };
 
+export const fetchNoteChanges = async (token, since) => {
+  // Only notes changed since the cursor; deleted ones come back as { id, deleted: true }.
+  // Resolves to null when the cursor is too old and the list must be reloaded.
+  const changes = [];
+  let cursor = since;
+  let hasMore = true;
+  while (hasMore) {
+    const params = new URLSearchParams({ since: cursor });
+    const res = await fetch(`${API_URL}/notes/changes?${params}`, {
+      headers: {
+        Authorization: `Bearer ${token}`,
+        "Content-Type": "application/json",
+      },
+    });
+    if (res.status === 410) return null;
+    if (!res.ok) throw new Error("Failed to fetch note changes");
+    const data = await res.json();
+    changes.push(...data.changes);
+    cursor = data.cursor;
+    hasMore = data.has_more;
+  }
+  return { changes, syncCursor: cursor };
+};
+
+export const openNoteEvents = (token) =>
+  // EventSource can't send headers, so the token goes in the query string
+  new EventSource(`${API_URL}/notes/stream?${new URLSearchParams({ token })}`);
+
 export const createNote = async (token, note) => {
   const res = await fetch(`${API_URL}/notes`, {
     method: "POST",
@@ -33,6 +73,13 @@ export const updateNote = async (token, noteId, note) => {
     },
     body: JSON.stringify(note),
   });
+  if (res.status === 409) {
+    // Edited by someone else since note.version; carry their copy to the caller
+    const { detail } = await res.json();
+    const err = new Error("This note was changed by someone else. Review and save again.");
+    err.current = detail.note;
+    throw err;
+  }
   if (!res.ok) throw new Error("Failed to update note");
   return res.json();
 };
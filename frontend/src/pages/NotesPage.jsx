@@ -1,9 +1,11 @@
-import React, { useState, useEffect } from "react";
+import React, { useState, useEffect, useRef } from "react";
 import Navbar from "../components/Layout/Navbar.jsx";
 import { useAuth } from "../context/AuthContext.jsx";
 import { useTenant } from "../context/TenantContext.jsx";
 import {
   fetchNotes,
+  fetchNoteChanges,
+  openNoteEvents,
   createNote,
   updateNote,
   deleteNote,
@@ -17,23 +19,65 @@ export default function NotesPage() {
   const [title, setTitle] = useState("");
   const [body, setBody] = useState("");
   const [editingId, setEditingId] = useState(null);
+  const [editingVersion, setEditingVersion] = useState(null);
   const [error, setError] = useState("");
+  const syncCursor = useRef(null);
 
   // Admins no note limit, members limited on free plan
   const canAddNote = user.role === "admin" || tenant?.plan === "pro" || notes.length < 3;
 
-  useEffect(() => {
-    if (!token || !tenant?.id) return;
+  async function loadNotes() {
+    try {
+      const data = await fetchNotes(token, tenant.id);
+      syncCursor.current = data.syncCursor;
+      setNotes(data.notes);
+    } catch {
+      setError("Failed to load notes from backend");
+    }
+  }
 
-    async function loadNotes() {
-      try {
-        const data = await fetchNotes(token, tenant.id);
-        setNotes(data);
-      } catch {
-        setError("Failed to load notes from backend");
-      }
+  // Pull only what changed since the last sync and merge it in
+  async function syncNotes() {
+    if (!syncCursor.current) return loadNotes();
+    try {
+      const data = await fetchNoteChanges(token, syncCursor.current);
+      if (!data) return loadNotes();
+      syncCursor.current = data.syncCursor;
+      if (data.changes.length === 0) return;
+      setNotes((prev) => {
+        const byId = new Map(prev.map((n) => [n.id, n]));
+        for (const change of data.changes) {
+          if (change.deleted) byId.delete(change.id);
+          else byId.set(change.id, { ...byId.get(change.id), ...change });
+        }
+        return [...byId.values()].sort(
+          (a, b) => new Date(b.updatedAt || 0) - new Date(a.updatedAt || 0) || b.id - a.id
+        );
+      });
+    } catch {
+      setError("Failed to sync notes from backend");
     }
+  }
+
+  useEffect(() => {
+    if (!token || !tenant?.id) return;
+    syncCursor.current = null;
     loadNotes();
+    // Edits by other members of the tenant are pushed as hints; the poll is a fallback
+    const events = openNoteEvents(token);
+    let pending = null;
+    const onEvent = () => {
+      clearTimeout(pending);
+      pending = setTimeout(syncNotes, 250);
+    };
+    events.addEventListener("note", onEvent);
+    events.addEventListener("resync", onEvent);
+    const timer = setInterval(syncNotes, 60000);
+    return () => {
+      events.close();
+      clearTimeout(pending);
+      clearInterval(timer);
+    };
   }, [token, tenant?.id]);
 
   async function handleAddOrUpdate(e) {
@@ -54,23 +98,23 @@ export default function NotesPage() {
           content: body,
           tenant_id: tenant.id,
           owner: user.id,
+          version: editingVersion,
         });
-        setNotes((prev) =>
-          prev.map((n) => (n.id === editingId ? { ...n, title, body } : n))
-        );
         setEditingId(null);
       } else {
-        const created = await createNote(token, {
+        await createNote(token, {
           title,
           content: body,
           tenant_id: tenant.id,
           owner: user.id,
         });
-        setNotes([{ id: created.id, title, body }, ...notes]);
       }
+      await syncNotes();
       setTitle("");
       setBody("");
     } catch (err) {
+      // Keep the user's text; saving again overwrites the newer version
+      if (err.current) setEditingVersion(err.current.version);
       setError(err.message);
     }
   }
@@ -78,7 +122,7 @@ export default function NotesPage() {
   async function handleDelete(id) {
     try {
       await deleteNote(token, id);
-      setNotes(notes.filter((n) => n.id !== id));
+      await syncNotes();
     } catch (err) {
       setError(err.message);
     }
@@ -86,6 +130,7 @@ export default function NotesPage() {
 
   function handleEdit(note) {
     setEditingId(note.id);
+    setEditingVersion(note.version);
     setTitle(note.title);
     setBody(note.body);
   }